@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Sage Benchmark - Offline latency, throughput and memory measurements against a mock LLM
+
+Usage: python benchmark.py [--sizes 10,1000,10000] [--scenarios chat,tiny_agent] [--output results.json]
+                           [--compare previous.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from mock_openai_server import MockOpenAIServer, default_responder
+
+SCENARIOS = ("index_refresh", "search", "store_search", "file_tools", "chat", "chat_concurrent", "tiny_agent")
+
+INGREDIENTS = """
+cashews garlic lemon nutritional-yeast chickpeas tofu tempeh rice quinoa lentils black-beans spinach kale
+tomatoes onion ginger coconut-milk soy-sauce miso sesame-oil olive-oil basil cilantro mint cumin paprika
+turmeric oats almond-milk maple-syrup peanut-butter bananas blueberries mushrooms zucchini eggplant
+sweet-potato carrots celery broccoli cauliflower avocado lime tahini pasta noodles bread flour
+""".split()
+DISHES = "Bowl Curry Stew Salad Pasta Soup Tacos Stir-Fry Pancakes Smoothie Wrap Bake Risotto Chili Burger".split()
+TAGS = "vegan quick lunch dinner breakfast high-protein gluten-free meal-prep comfort spicy".split()
+VERBS = "Chop Soak Blend Simmer Roast Saute Whisk Fold Toast Season Stir Serve".split()
+
+QUERIES = [
+    "quick high protein lunch with chickpeas",
+    "what can I cook with spinach and garlic",
+    "a comforting soup for dinner",
+    "gluten free breakfast with oats",
+    "spicy curry with coconut milk",
+    "something with tofu and ginger",
+]
+MARKER_NAME = ".sage-bench.json"
+
+
+def generate_vault(vault_dir: str, count: int, seed: int = 0) -> str:
+    """Write count synthetic markdown recipes, reusing the vault if it was already generated"""
+    marker = os.path.join(vault_dir, MARKER_NAME)
+    try:
+        with open(marker) as f:
+            if json.load(f) == {"count": count, "seed": seed}:
+                return vault_dir
+    except (OSError, ValueError):
+        pass
+
+    os.makedirs(vault_dir, exist_ok=True)
+    rng = random.Random(seed)
+    for i in range(count):
+        items = rng.sample(INGREDIENTS, rng.randint(4, 12))
+        title = f"{items[0].replace('-', ' ').title()} {rng.choice(DISHES)} {i}"
+        lines = [f"# {title}", "", " ".join(f"#{tag}" for tag in rng.sample(TAGS, 2)), "", "## Ingredients"]
+        lines.extend(f"- {rng.randint(1, 4)} cup {item.replace('-', ' ')}" for item in items)
+        lines.extend(["", "## Instructions"])
+        lines.extend(f"{step + 1}. {rng.choice(VERBS)} the {rng.choice(items).replace('-', ' ')} for "
+                     f"{rng.randint(2, 30)} minutes" for step in range(rng.randint(3, 8)))
+        lines.extend(["", "## Notes", f"Serves {rng.randint(1, 6)}. Keeps for {rng.randint(1, 5)} days."])
+        with open(os.path.join(vault_dir, f"recipe-{i:06d}.md"), "w") as f:
+            f.write("\n".join(lines))
+    with open(marker, "w") as f:
+        json.dump({"count": count, "seed": seed}, f)
+    return vault_dir
+
+
+def percentile(values: list, q: float) -> float:
+    """Linear-interpolated percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def tool_call_responder(messages: list) -> str:
+    """Have the tiny agent read a few recipes first, then answer from the tool results"""
+    system = messages[0].get("content") or "" if messages else ""
+    last = messages[-1].get("content") or "" if messages else ""
+    if "file access tools" in system and not last.startswith("Tool results"):
+        paths = [f"recipe-{i:06d}.md" for i in range(3)]
+        return json.dumps({"name": "read_multiple_files", "parameters": {"paths": paths}})
+    return default_responder(messages)
+
+
+async def run_scenario(name: str, vault_dir: str, base_url: str, iterations: int, concurrency: int) -> dict:
+    """Run one scenario and return per-operation latencies (seconds) and wall time"""
+    from recipe_index import RecipeIndex
+    from recipe_search import RecipeSearch
+    latencies = []
+    started = time.perf_counter()
+
+    if name == "index_refresh":
+        index = RecipeIndex(vault_dir)
+        t = time.perf_counter()
+        index.refresh()
+        cold = time.perf_counter() - t
+        started = time.perf_counter()
+        for _ in range(iterations):
+            t = time.perf_counter()
+            index.refresh()
+            latencies.append(time.perf_counter() - t)
+        return {"latencies": latencies, "wall": time.perf_counter() - started, "cold_seconds": cold}
+
+    if name == "search":
+        index = RecipeIndex(vault_dir)
+        index.refresh()
+        search = RecipeSearch(index)
+        t = time.perf_counter()
+        search.top_k(QUERIES[0])
+        build = time.perf_counter() - t
+        started = time.perf_counter()
+        for i in range(iterations):
+            t = time.perf_counter()
+            search.top_k(QUERIES[i % len(QUERIES)], 10)
+            latencies.append(time.perf_counter() - t)
+        return {"latencies": latencies, "wall": time.perf_counter() - started, "build_seconds": build}
+
+    if name == "store_search":
+        from recipe_store import RecipeStore
+        db_path = os.path.join(os.path.dirname(vault_dir), os.path.basename(vault_dir) + ".db")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.unlink(db_path + suffix)
+        store = RecipeStore(vault_dir, db_path)
+        try:
+            t = time.perf_counter()
+            store.refresh()
+            build = time.perf_counter() - t
+            t = time.perf_counter()
+            store.refresh()
+            warm = time.perf_counter() - t
+            started = time.perf_counter()
+            for i in range(iterations):
+                t = time.perf_counter()
+                store.top_k(QUERIES[i % len(QUERIES)], 10)
+                latencies.append(time.perf_counter() - t)
+            return {"latencies": latencies, "wall": time.perf_counter() - started, "build_seconds": build,
+                    "warm_refresh_seconds": warm}
+        finally:
+            store.close()
+
+    if name == "file_tools":
+        from sage_agent_tiny import SageAgent as TinyAgent
+        agent = TinyAgent()
+        agent.recipes_dir = vault_dir
+        names = sorted(name for name in os.listdir(vault_dir) if name.endswith(".md"))
+        calls = [
+            ("list_directory", {"path": vault_dir}),
+            ("read_file", {"path": os.path.join(vault_dir, names[0])}),
+            ("read_multiple_files", {"paths": names[:5]}),
+        ]
+        started = time.perf_counter()
+        for i in range(iterations):
+            tool, parameters = calls[i % len(calls)]
+            t = time.perf_counter()
+            await agent.execute_tool(tool, parameters)
+            latencies.append(time.perf_counter() - t)
+        return {"latencies": latencies, "wall": time.perf_counter() - started}
+
+    if name in ("chat", "chat_concurrent"):
+        from sage_agent import SageAgent
+        # Cache and fast path off so every query pays retrieval, packing and the model round-trip
+        agent = SageAgent(recipes_dir=vault_dir, base_url=base_url, cache_size=0, fast_path=False,
+                          max_concurrency=concurrency)
+        try:
+            await agent.chat(QUERIES[0])
+            first_tokens = []
+
+            async def one(i):
+                t = time.perf_counter()
+                timing = {}
+                await agent.chat(QUERIES[i % len(QUERIES)], timing=timing)
+                latencies.append(time.perf_counter() - t)
+                if timing.get("first_token") is not None:
+                    first_tokens.append(timing["first_token"])
+
+            started = time.perf_counter()
+            if name == "chat":
+                for i in range(iterations):
+                    await one(i)
+            else:
+                await asyncio.gather(*[one(i) for i in range(iterations)])
+            result = {"latencies": latencies, "wall": time.perf_counter() - started}
+            if name == "chat" and first_tokens:
+                result["first_token_p50_ms"] = percentile(first_tokens, 0.5) * 1000
+            return result
+        finally:
+            await agent.cleanup()
+
+    if name == "tiny_agent":
+        from sage_agent_tiny import SageAgent as TinyAgent
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            json.dump({"model": "local-model", "base_url": base_url, "api_key": "lm-studio",
+                       "recipes_dir": vault_dir, "servers": []}, f)
+        agent = TinyAgent(f.name)
+        try:
+            await agent.initialize()
+            started = time.perf_counter()
+            for i in range(iterations):
+                t = time.perf_counter()
+                await agent.chat(QUERIES[i % len(QUERIES)])
+                latencies.append(time.perf_counter() - t)
+            return {"latencies": latencies, "wall": time.perf_counter() - started}
+        finally:
+            await agent.cleanup()
+            os.unlink(f.name)
+
+    raise ValueError(f"Unknown scenario: {name}")
+
+
+def summarize(name: str, size: int, run: dict, rss_before: float, heap_peak: int = None) -> dict:
+    """Reduce a scenario run to the numbers worth comparing between runs"""
+    latencies = run.pop("latencies")
+    wall = run.pop("wall")
+    result = {
+        "scenario": name,
+        "recipes": size,
+        "operations": len(latencies),
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "mean_ms": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+        "throughput_per_s": len(latencies) / wall if wall else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_growth_mb": peak_rss_mb() - rss_before,
+    }
+    if heap_peak is not None:
+        result["heap_peak_mb"] = heap_peak / (1024 * 1024)
+    result.update(run)
+    return result
+
+
+def compare(results: list, baseline_path: str, threshold: float) -> list:
+    """Return (scenario, recipes, metric, old, new) for every latency that regressed beyond threshold"""
+    with open(baseline_path) as f:
+        baseline = {(item["scenario"], item["recipes"]): item for item in json.load(f)["results"]}
+    regressions = []
+    for item in results:
+        old = baseline.get((item["scenario"], item["recipes"]))
+        if not old:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            if old.get(metric) and item[metric] > old[metric] * (1 + threshold):
+                regressions.append((item["scenario"], item["recipes"], metric, old[metric], item[metric]))
+    return regressions
+
+
+async def run_benchmarks(args) -> list:
+    """Run every requested scenario for every vault size"""
+    server = MockOpenAIServer(latency=args.latency, tokens_per_second=args.tps,
+                              responder=tool_call_responder).start()
+    results = []
+    try:
+        for size in args.sizes:
+            vault_dir = generate_vault(os.path.join(args.vault_root, f"vault-{size}"), size)
+            for name in args.scenarios:
+                rss_before = peak_rss_mb()
+                if args.tracemalloc:
+                    tracemalloc.start()
+                run = await run_scenario(name, vault_dir, server.base_url, args.iterations, args.concurrency)
+                heap_peak = None
+                if args.tracemalloc:
+                    heap_peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                result = summarize(name, size, run, rss_before, heap_peak)
+                results.append(result)
+                print(f"  {name:<16} {size:>7} recipes  p50 {result['p50_ms']:8.2f}ms  p95 {result['p95_ms']:8.2f}ms  "
+                      f"{result['throughput_per_s']:8.1f}/s  rss {result['peak_rss_mb']:.0f}MB")
+    finally:
+        server.stop()
+    return results
+
+
+def main():
+    """Run the benchmark suite from the command line"""
+    parser = argparse.ArgumentParser(description="Benchmark Sage offline with a mock OpenAI-compatible server")
+    parser.add_argument("--sizes", default="10,1000,10000", help="Comma-separated vault sizes (10 to 100000)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--iterations", type=int, default=20, help="Operations per scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="LLM slots for chat_concurrent")
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock time to first token in seconds")
+    parser.add_argument("--tps", type=float, default=200.0, help="Mock tokens per second")
+    parser.add_argument("--vault-root", default=os.path.join(tempfile.gettempdir(), "sage-bench"),
+                        help="Where synthetic vaults are generated and reused")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also report Python heap peak (slows timings)")
+    parser.add_argument("--output", default="benchmark-results.json", help="Where to save results")
+    parser.add_argument("--compare", default=None, help="Previous results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed latency increase before flagging")
+    args = parser.parse_args()
+
+    args.sizes = [int(size) for size in args.sizes.split(",") if size]
+    args.scenarios = [name for name in args.scenarios.split(",") if name]
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        print(f"❌ Unknown scenarios: {', '.join(unknown)}")
+        sys.exit(1)
+
+    print(f"🌿 Sage benchmark: sizes {args.sizes}, {args.iterations} operations per scenario")
+    results = asyncio.run(run_benchmarks(args))
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "settings": {"iterations": args.iterations, "concurrency": args.concurrency,
+                         "latency": args.latency, "tps": args.tps},
+            "results": results,
+        }, f, indent=2)
+    print(f"💾 Results saved to {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        for scenario, size, metric, old, new in regressions:
+            print(f"⚠️  {scenario} @ {size}: {metric} {old:.2f}ms → {new:.2f}ms")
+        if not regressions:
+            print(f"✅ No regressions beyond {args.threshold:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Sage Budgets - Per-request deadlines, cancellation and per-query-class generation budgets
+"""
+import asyncio
+import re
+import time
+
+# Generation limits by query class. Local LM Studio answers take 5-10 minutes, so no class times out
+# before the PRD's 10 minutes; callers and config may set shorter deadlines.
+DEFAULT_BUDGETS = {
+    "lookup": {"max_tokens": 384, "max_steps": 2, "deadline": 600.0},
+    "chat": {"max_tokens": 1024, "max_steps": 4, "deadline": 600.0},
+    "plan": {"max_tokens": 2048, "max_steps": 6, "deadline": 900.0},
+}
+
+PLAN_PATTERN = re.compile(
+    r"\b(?:meal plans?|meal planning|meal prep|weekly (?:menu|plan|meals?|dinners?)|menus? for the week"
+    r"|plan (?:my|our|the|a) (?:meals?|dinners?|lunches|week|menu)|shopping list|grocery list|batch cook(?:ing)?)\b"
+)
+# Asking for suggestions needs room to compare recipes, however short the question
+SUGGEST_PATTERN = re.compile(r"^(?:what|which) (?:can|could|should) (?:i|we)\b|\b(?:suggest|recommend)")
+LOOKUP_PATTERN = re.compile(r"^(?:what|which|how many|how much|how long|does|do|is|are|list|show|find)\b")
+LOOKUP_MAX_WORDS = 12
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request ran out of time"""
+
+
+class RequestCancelled(Exception):
+    """The caller gave up on the request"""
+
+
+class Deadline:
+    """A point in time a request must finish by (None: no limit)"""
+
+    def __init__(self, seconds: float = None):
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds if seconds is not None else None
+
+    def remaining(self):
+        """Seconds left, never negative, or None without a limit"""
+        if self.expires is None:
+            return None
+        return max(self.expires - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return self.expires is not None and time.monotonic() >= self.expires
+
+    def error(self) -> DeadlineExceeded:
+        return DeadlineExceeded(f"No answer within {self.seconds:g}s")
+
+
+class Budget:
+    """Limits for one request"""
+
+    __slots__ = ("query_class", "max_tokens", "max_steps", "deadline")
+
+    def __init__(self, query_class: str, max_tokens: int, max_steps: int, deadline: float):
+        self.query_class = query_class
+        self.max_tokens = max_tokens
+        self.max_steps = max_steps
+        self.deadline = deadline
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def classify_query(message: str) -> str:
+    """Short factual questions are "lookup", planning requests are "plan", everything else is "chat" """
+    text = " ".join(message.lower().split())
+    if PLAN_PATTERN.search(text):
+        return "plan"
+    if SUGGEST_PATTERN.search(text):
+        return "chat"
+    if LOOKUP_PATTERN.match(text) and len(text.split()) <= LOOKUP_MAX_WORDS:
+        return "lookup"
+    return "chat"
+
+
+class BudgetPolicy:
+    """Maps messages to budgets; overrides are merged per class ({"plan": {"max_tokens": 4096}})"""
+
+    def __init__(self, overrides: dict = None):
+        self.budgets = {name: dict(limits) for name, limits in DEFAULT_BUDGETS.items()}
+        for name, limits in (overrides or {}).items():
+            self.budgets.setdefault(name, dict(DEFAULT_BUDGETS["chat"])).update(limits)
+
+    def for_message(self, message: str) -> Budget:
+        query_class = classify_query(message)
+        return Budget(query_class, **self.budgets.get(query_class, self.budgets["chat"]))
+
+    def longest_deadline(self) -> float:
+        """The longest any query class may run"""
+        return max(limits["deadline"] for limits in self.budgets.values())
+
+
+async def stream_until(source, deadline: Deadline = None, cancel_event: asyncio.Event = None):
+    """Yield from an async iterator until it ends, the deadline passes or cancel_event is set
+
+    The next item is always being read by its own task, so stopping early (including the caller closing
+    this generator) cancels that read wherever it is waiting. The cancellation unwinds every nested stream,
+    down to the HTTP response, instead of leaving the backend decoding for nobody.
+    """
+    source = source.__aiter__()
+    cancelled = asyncio.ensure_future(cancel_event.wait()) if cancel_event is not None else None
+    read = asyncio.ensure_future(source.__anext__())
+    try:
+        while True:
+            waiting = {read} if cancelled is None else {read, cancelled}
+            done, _ = await asyncio.wait(waiting, timeout=deadline.remaining() if deadline else None,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if read not in done:
+                if cancelled is not None and cancelled in done:
+                    raise RequestCancelled("Request cancelled")
+                raise deadline.error()
+            try:
+                item = read.result()
+            except StopAsyncIteration:
+                return
+            # Read ahead while the caller handles this item
+            read = asyncio.ensure_future(source.__anext__())
+            yield item
+    finally:
+        for task in (read, cancelled):
+            if task is None:
+                continue
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, StopAsyncIteration, Exception):
+                pass
+        # A source parked at a yield (its read finished first) still gets its cleanup now rather than at GC
+        aclose = getattr(source, "aclose", None)
+        if aclose is not None:
+            try:
+                await aclose()
+            except Exception:
+                pass
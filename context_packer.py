@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Sage Context Packer - Fits ranked recipe snippets into a prompt token budget
+"""
+
+SECTION_HINTS = {
+    "ingredients": ("ingredient", "make with", "contain", "using", "need", "shopping", "pantry", "allerg"),
+    "instructions": ("how do", "how to", "step", "instruction", "method", "cook", "prepare", "make it", "time", "long"),
+    "notes": ("note", "tip", "variation", "substitut", "store", "serve"),
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate (~4 characters per token, never fewer than the word count)"""
+    if not text:
+        return 0
+    return max((len(text) + 3) // 4, len(text.split()))
+
+
+def sections_for_query(query: str) -> tuple:
+    """Return the recipe sections a query needs (all sections when unsure)"""
+    query = query.lower()
+    needed = tuple(section for section, hints in SECTION_HINTS.items() if any(h in query for h in hints))
+    return needed or ("ingredients", "instructions", "notes")
+
+
+class ContextPacker:
+    """Builds the Tool Results block from ranked recipes within a token budget"""
+
+    def __init__(self, budget: int = 3000, listing_share: float = 0.2):
+        self.budget = budget
+        self.listing_share = listing_share
+
+    def pack_listing(self, label: str, names: list, budget: int) -> str:
+        """List file names until the budget runs out, summarizing the rest"""
+        header = f"Directory listing: Files in {label}: "
+        used = estimate_tokens(header)
+        shown = []
+        for name in names:
+            cost = estimate_tokens(name) + 1
+            if used + cost > budget:
+                break
+            shown.append(name)
+            used += cost
+        listing = header + ", ".join(shown)
+        if len(shown) < len(names):
+            listing += f" ... (+{len(names) - len(shown)} more)"
+        return listing
+
+    def pack(self, query: str, label: str, names: list, recipes: list) -> str:
+        """Return the Tool Results block for a query, ranked recipes first-come within the budget"""
+        sections = sections_for_query(query)
+        listing = self.pack_listing(label, names, int(self.budget * self.listing_share))
+        parts = [listing]
+        remaining = self.budget - estimate_tokens(listing)
+
+        for recipe in recipes:
+            snippet = f"Recipe {recipe.name}:\n{recipe.format(sections)}"
+            cost = estimate_tokens(snippet)
+            if cost > remaining:
+                # Only the top-ranked recipe is ever truncated; anything after it stops the packing
+                if len(parts) == 1:
+                    snippet = self.truncate(snippet, remaining)
+                    if snippet:
+                        parts.append(snippet)
+                break
+            parts.append(snippet)
+            remaining -= cost
+
+        return "\n\nTool Results:\n" + "\n".join(parts)
+
+    def truncate(self, text: str, budget: int) -> str:
+        """Cut text at a line boundary so it fits the budget"""
+        kept = []
+        used = estimate_tokens("[truncated]") + 1
+        for line in text.splitlines():
+            cost = estimate_tokens(line) + 1
+            if used + cost > budget:
+                break
+            kept.append(line)
+            used += cost
+        if len(kept) <= 1:
+            return ""
+        return "\n".join(kept + ["[truncated]"])
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Sage Vault Ingestion - Parallel, checkpointed parsing of a whole recipe vault
+
+Usage: python ingest_vault.py <vault_dir> [--workers N] [--checkpoint PATH]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from recipe_index import RECIPE_EXTENSIONS, parse_recipe
+from recipe_paths import cache_path
+
+CHECKPOINT_VERSION = 2
+# Logs shorter than this are never compacted
+COMPACT_MIN_LINES = 1000
+
+
+def ingest_file(path: str, rel_path: str, known_hash: str = None) -> dict:
+    """Read, hash and parse one recipe (runs in a worker process)"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        return {"path": rel_path, "status": "error", "error": f"Read failed: {e}"}
+
+    content_hash = hashlib.sha256(data).hexdigest()
+    if content_hash == known_hash:
+        return {"path": rel_path, "status": "unchanged", "hash": content_hash}
+
+    try:
+        recipe = parse_recipe(os.path.basename(rel_path), data.decode("utf-8", errors="replace"))
+    except Exception as e:
+        return {"path": rel_path, "status": "error", "hash": content_hash, "error": f"Parse failed: {e}"}
+    return {"path": rel_path, "status": "processed", "hash": content_hash, "components": recipe.to_dict()}
+
+
+def walk_vault(vault_dir: str):
+    """Yield (relative path, absolute path, stat) for every recipe file, skipping hidden entries"""
+    for root, dirs, files in os.walk(vault_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(files):
+            if name.startswith(".") or not name.endswith(RECIPE_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            yield os.path.relpath(path, vault_dir), path, stat
+
+
+def default_checkpoint_path(vault_dir: str) -> str:
+    """Per-user cache location for a vault's checkpoint"""
+    return cache_path(vault_dir, "-ingest.jsonl")
+
+
+class IngestCheckpoint:
+    """Per-file processing metadata (content hash, stat, status, components) in an append-only JSONL log
+
+    A save appends one line per file changed since the last save, so flushing costs what changed rather than
+    the whole vault. The log is rewritten once superseded lines make it over twice the number of files.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files = {}
+        self.dirty = set()
+        self.lines = 0
+        # A missing, old-format or crash-truncated log is rewritten on the next save
+        self._rewrite = True
+        try:
+            with open(path, "r") as f:
+                header = json.loads(f.readline() or "{}")
+                if header.get("version") == CHECKPOINT_VERSION:
+                    self._rewrite = False
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                            rel_path = entry.pop("path")
+                        except (ValueError, KeyError):
+                            self._rewrite = True
+                            break
+                        self.lines += 1
+                        if entry.get("removed"):
+                            self.files.pop(rel_path, None)
+                        else:
+                            self.files[rel_path] = entry
+        except (OSError, ValueError):
+            pass
+
+    def is_current(self, rel_path: str, stat) -> bool:
+        """True if the file was processed and its size and mtime are unchanged"""
+        entry = self.files.get(rel_path)
+        return (entry is not None and entry.get("status") == "processed"
+                and entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns)
+
+    def known_hash(self, rel_path: str):
+        """Content hash recorded for the file, if any"""
+        entry = self.files.get(rel_path)
+        return entry.get("hash") if entry else None
+
+    def record(self, result: dict, stat):
+        """Update the metadata for one ingested file"""
+        entry = self.files.setdefault(result["path"], {})
+        entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns, processed_at=time.time())
+        entry["status"] = "processed" if result["status"] == "unchanged" else result["status"]
+        for key in ("hash", "components", "error"):
+            if key in result:
+                entry[key] = result[key]
+        if result["status"] != "error":
+            entry.pop("error", None)
+        self.dirty.add(result["path"])
+
+    def remove_missing(self, present: set) -> int:
+        """Forget files that no longer exist in the vault"""
+        missing = [rel_path for rel_path in self.files if rel_path not in present]
+        for rel_path in missing:
+            del self.files[rel_path]
+        self.dirty.update(missing)
+        return len(missing)
+
+    def save(self):
+        """Append the changed entries, or rewrite the log when it is mostly superseded lines"""
+        if self._rewrite or self.lines + len(self.dirty) > max(2 * len(self.files), COMPACT_MIN_LINES):
+            self.compact()
+            return
+        with open(self.path, "a") as f:
+            f.writelines(self._line(rel_path) for rel_path in self.dirty)
+        self.lines += len(self.dirty)
+        self.dirty.clear()
+
+    def compact(self):
+        """Atomically rewrite the log with one line per file"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(json.dumps({"version": CHECKPOINT_VERSION}) + "\n")
+            f.writelines(self._line(rel_path) for rel_path in self.files)
+        os.replace(tmp_path, self.path)
+        self.lines = len(self.files)
+        self.dirty.clear()
+        self._rewrite = False
+
+    def _line(self, rel_path: str) -> str:
+        """One log line: the file's entry, or a removal marker"""
+        entry = self.files.get(rel_path)
+        record = {"path": rel_path, **entry} if entry is not None else {"path": rel_path, "removed": True}
+        return json.dumps(record) + "\n"
+
+
+def ingest_vault(vault_dir: str, checkpoint_path: str = None, workers: int = None,
+                 flush_every: int = 500, chunksize: int = 16) -> dict:
+    """Ingest every changed recipe in a vault, checkpointing progress so a crash can resume"""
+    started = time.perf_counter()
+    checkpoint = IngestCheckpoint(checkpoint_path or default_checkpoint_path(vault_dir))
+
+    present = set()
+    todo = []
+    for rel_path, path, stat in walk_vault(vault_dir):
+        present.add(rel_path)
+        if not checkpoint.is_current(rel_path, stat):
+            todo.append((rel_path, path, stat))
+
+    stats = {"scanned": len(present), "skipped": len(present) - len(todo),
+             "processed": 0, "unchanged": 0, "errors": 0, "removed": checkpoint.remove_missing(present)}
+
+    paths = [path for _, path, _ in todo]
+    rel_paths = [rel_path for rel_path, _, _ in todo]
+    hashes = [checkpoint.known_hash(rel_path) for rel_path in rel_paths]
+
+    executor = ProcessPoolExecutor(workers) if todo and workers != 1 else None
+    try:
+        if executor:
+            results = executor.map(ingest_file, paths, rel_paths, hashes, chunksize=chunksize)
+        else:
+            results = map(ingest_file, paths, rel_paths, hashes)
+        for (_, _, stat), result in zip(todo, results):
+            checkpoint.record(result, stat)
+            stats["errors" if result["status"] == "error" else result["status"]] += 1
+            if len(checkpoint.dirty) >= flush_every:
+                checkpoint.save()
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+        if checkpoint.dirty:
+            checkpoint.save()
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = elapsed
+    stats["files_per_second"] = stats["scanned"] / elapsed if elapsed else 0.0
+    stats["parsed_per_second"] = stats["processed"] / elapsed if elapsed else 0.0
+    return stats
+
+
+def main():
+    """Run ingestion from the command line"""
+    parser = argparse.ArgumentParser(description="Parse every recipe in a vault, skipping unchanged files")
+    parser.add_argument("vault", help="Recipe vault directory")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--checkpoint", default=None,
+                        help="Checkpoint log (default: under $XDG_CACHE_HOME/sage, outside the vault)")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.vault):
+        print(f"❌ Vault {args.vault} not found")
+        sys.exit(1)
+
+    print(f"🌿 Ingesting {args.vault}")
+    stats = ingest_vault(args.vault, args.checkpoint, args.workers)
+    print(f"✅ Scanned {stats['scanned']} files in {stats['seconds']:.2f}s "
+          f"({stats['files_per_second']:.0f} files/s)")
+    print(f"   Parsed {stats['processed']} ({stats['parsed_per_second']:.0f}/s), "
+          f"unchanged {stats['unchanged'] + stats['skipped']}, removed {stats['removed']}, errors {stats['errors']}")
+
+
+if __name__ == "__main__":
+    main()
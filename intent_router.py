@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Sage Intent Router - Answers simple recipe queries directly from parsed recipe data
+"""
+import re
+from collections import Counter
+from pantry_matcher import PantryMatcher, normalize_ingredient
+
+MAX_LISTED = 50
+
+LIST_PATTERNS = [
+    re.compile(r"^(?:please )?(?:list|show)(?: me)?(?: all)?(?: of)?(?: the| my| your)? recipe(?:s| files)?(?: available| you have)?$"),
+    re.compile(r"^(?:what|which) recipe(?:s| files)? (?:are|is) (?:there|available)$"),
+    re.compile(r"^(?:what|which) recipe(?:s| files)? (?:do you have|are there|exist)$"),
+    re.compile(r"^what(?:'s| is) available$"),
+]
+INGREDIENT_PATTERNS = [
+    re.compile(r"^(?:what are |show(?: me)? |list |give me )?(?:the )?ingredients (?:for|in|of) (?:the |my )?(?P<name>.+)$"),
+    re.compile(r"^(?:what are |show(?: me)? |list )?(?:the )?(?P<name>.+?)(?: recipe)? ingredients$"),
+    re.compile(r"^what(?:'s| is| goes) in (?:the |my )?(?P<name>.+?)(?: recipe)?$"),
+]
+CONTAINS_PATTERNS = [
+    re.compile(r"^(?:which|what) recipes? (?:contain|contains|use|uses|include|includes|call for|calls for|have|has) (?P<items>.+)$"),
+    re.compile(r"^(?:find|show me|list) recipes (?:with|containing|using) (?P<items>.+)$"),
+]
+PANTRY_PATTERNS = [
+    re.compile(r"^what can i (?:make|cook) (?:with|using|from) (?P<items>.+)$"),
+    re.compile(r"^(?:i have|i've got|i got) (?P<items>.+?),? (?:what|which recipes?) can i (?:make|cook)$"),
+    re.compile(r"^(?:what|which) recipes? can i (?:make|cook) (?:with|using|from) (?P<items>.+)$"),
+]
+MAX_PANTRY_MATCHES = 5
+ITEM_SPLIT = re.compile(r"\s*(?:,|\band\b|&)\s*")
+# Leading words that quantify an item rather than name it ("both garlic and lemon")
+QUANTIFIER = re.compile(r"^(?:(?:both|either|any|all|some|the|of)\s+)+")
+# Exclusions need the model ("no nuts", "nut-free")
+NEGATION = re.compile(r"\b(?:no|not|without|free of|free from|except|excluding)\b|\w-free\b")
+# Relative clauses, comparisons and constraints mean the item list was not fully parsed
+CONSTRAINT = re.compile(
+    r"\b(?:that|which|who|for|under|over|less|more|than|within|in|quick|quickly|fast|easy|healthy|high|low"
+    r"|cheap|light|minutes?|mins?|hours?|calories|protein|vegan|vegetarian|gluten|dairy|tonight|today|but)\b"
+)
+MAX_ITEM_WORDS = 4
+
+
+def _normalize(message: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return re.sub(r"\s+", " ", message.strip().lower()).rstrip("?!. ")
+
+
+def _singular(word: str) -> str:
+    """Very light plural strip used for ingredient matching"""
+    if len(word) > 3 and word.endswith("es") and word[-3] in "sxz":
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _terms(text: str) -> list:
+    """Singular lowercase words of a text"""
+    return [_singular(word) for word in re.findall(r"[a-z0-9]+", text.lower())]
+
+
+def _split_items(items_text: str):
+    """Ingredient items of a query, or None when they carry negation or constraints the fast path can't honour"""
+    if NEGATION.search(items_text):
+        return None
+    items = [QUANTIFIER.sub("", item) for item in ITEM_SPLIT.split(items_text)]
+    items = [item for item in items if item]
+    if not items or any(CONSTRAINT.search(item) or len(item.split()) > MAX_ITEM_WORDS for item in items):
+        return None
+    return items
+
+
+def _ingredient_words(text: str) -> list:
+    """Words of the canonical ingredient names in a line, as the pantry matcher normalizes them"""
+    return [word for name in normalize_ingredient(text) for word in name.split()]
+
+
+class IntentRouter:
+    """Routes list, ingredient, contains and pantry queries to exact answers; everything else goes to the LLM"""
+
+    def __init__(self, index):
+        self.index = index
+        # The disk-backed store ranks pantries in SQL; an in-memory matrix would load every recipe
+        self.pantry = None if hasattr(index, "pantry_matches") else PantryMatcher(index)
+        self.counts = Counter()
+        self._version = None
+        self._catalog = []
+
+    def route(self, message: str):
+        """Return a direct answer, or None if the query needs the model"""
+        intent, answer = self.classify(message)
+        self.counts[intent if answer is not None else "llm"] += 1
+        return answer
+
+    def classify(self, message: str):
+        """Return (intent, answer) for a message; answer is None when it must fall through"""
+        text = _normalize(message)
+
+        if any(pattern.match(text) for pattern in LIST_PATTERNS):
+            return "list", self.answer_list()
+
+        for pattern in PANTRY_PATTERNS:
+            match = pattern.match(text)
+            if match:
+                return "pantry", self.answer_pantry(match.group("items"))
+
+        for pattern in CONTAINS_PATTERNS:
+            match = pattern.match(text)
+            if match:
+                return "contains", self.answer_contains(match.group("items"))
+
+        for pattern in INGREDIENT_PATTERNS:
+            match = pattern.match(text)
+            if match:
+                recipe = self.find_recipe(match.group("name"))
+                if recipe is not None:
+                    return "ingredients", self.answer_ingredients(recipe)
+
+        return "llm", None
+
+    def stats(self) -> dict:
+        """How many queries each path handled"""
+        return dict(self.counts)
+
+    def find_recipe(self, name: str):
+        """Find a recipe by title or file name, requiring every word of the name to match"""
+        if hasattr(self.index, "find_recipe"):
+            # The disk-backed store answers from its full-text index instead of an in-memory catalog
+            return self.index.find_recipe(name)
+        wanted = _terms(name)
+        if not wanted:
+            return None
+        wanted_set = set(wanted)
+        best = None
+        for recipe_name, title_terms, stem_terms, _ in self.catalog():
+            if wanted == title_terms or wanted == stem_terms:
+                return self.index.get(recipe_name)
+            if best is None and (wanted_set <= set(title_terms) or wanted_set <= set(stem_terms)):
+                best = recipe_name
+        return self.index.get(best) if best else None
+
+    def answer_list(self) -> str:
+        """List the recipes in the collection"""
+        names = self.index.names()
+        if not names:
+            return "There are no recipes in the collection yet."
+        lines = [f"I have {len(names)} recipe{'s' if len(names) != 1 else ''} available:"]
+        for name in names[:MAX_LISTED]:
+            lines.append(f"- {self.index.get(name).title} ({name})")
+        if len(names) > MAX_LISTED:
+            lines.append(f"...and {len(names) - MAX_LISTED} more.")
+        return "\n".join(lines)
+
+    def answer_ingredients(self, recipe) -> str:
+        """Show a recipe's ingredients exactly as written"""
+        if not recipe.ingredients:
+            return f"{recipe.title} ({recipe.name}) has no ingredients section."
+        lines = [f"Ingredients for {recipe.title} ({recipe.name}):"]
+        lines.extend(f"- {item}" for item in recipe.ingredients)
+        return "\n".join(lines)
+
+    def answer_contains(self, items_text: str) -> str:
+        """List recipes whose ingredients mention every requested item"""
+        items = _split_items(items_text)
+        if items is None:
+            return None
+        wanted = [_ingredient_words(item) for item in items]
+        if not all(wanted):
+            return None
+
+        if hasattr(self.index, "containing"):
+            matches = self.index.containing(wanted)
+        else:
+            matches = [name for name, _, _, terms in self.catalog()
+                       if all(all(term in terms for term in item) for item in wanted)]
+
+        label = " and ".join(items)
+        if not matches:
+            return f"None of the recipes in the collection contain {label}."
+        lines = [f"Recipes containing {label}:"]
+        for name in matches[:MAX_LISTED]:
+            lines.append(f"- {self.index.get(name).title} ({name})")
+        if len(matches) > MAX_LISTED:
+            lines.append(f"...and {len(matches) - MAX_LISTED} more.")
+        return "\n".join(lines)
+
+    def answer_pantry(self, items_text: str) -> str:
+        """Rank recipes by how much of their ingredient list the pantry covers"""
+        items = _split_items(items_text)
+        if items is None:
+            return None
+        if self.pantry is None:
+            matches = self.index.pantry_matches(items, MAX_PANTRY_MATCHES)
+        else:
+            matches = self.pantry.best_matches(items, MAX_PANTRY_MATCHES)
+        if not matches:
+            return f"None of the recipes in the collection use {' and '.join(items)}."
+        lines = [f"Best matches for {', '.join(items)}:"]
+        for match in matches:
+            title = self.index.get(match["name"]).title
+            line = f"- {title} ({match['name']}): {match['have']}/{match['have'] + match['missing']} ingredients"
+            if match["missing_ingredients"]:
+                line += f", missing {', '.join(match['missing_ingredients'])}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def catalog(self) -> list:
+        """(name, title terms, file-name terms, ingredient terms) per recipe, rebuilt when the index changes"""
+        if self._version != self.index.version:
+            catalog = []
+            for name in self.index.names():
+                recipe = self.index.get(name)
+                catalog.append((
+                    name,
+                    _terms(recipe.title),
+                    _terms(name.rsplit(".", 1)[0]),
+                    frozenset(word for line in recipe.ingredients for word in _ingredient_words(line))
+                ))
+            self._catalog = catalog
+            self._version = self.index.version
+        return self._catalog
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Sage LLM Router - Spreads chat completions over several OpenAI-compatible backends
+
+Least-outstanding-requests routing, background health probes, failover before the first token
+and optional hedging of short prompts.
+"""
+import asyncio
+import time
+
+DEFAULT_BASE_URL = "http://localhost:1234/v1"
+
+
+def failover_errors() -> tuple:
+    """Errors that mean "try another backend"; anything else (bad request, auth) is returned to the caller"""
+    import openai
+    return (openai.APIConnectionError, openai.InternalServerError, openai.RateLimitError)
+
+
+class LLMUnavailable(Exception):
+    """No backend could serve the request"""
+
+
+class Backend:
+    """One OpenAI-compatible server and its load and health state"""
+
+    def __init__(self, base_url: str, api_key: str = "lm-studio", timeout: float = 900.0, name: str = None):
+        self.base_url = base_url
+        self.name = name or base_url
+        self.api_key = api_key
+        self.timeout = timeout
+        self._client = None
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.healthy = True
+        self.failures = 0
+        self.down_until = 0.0
+
+    @property
+    def client(self):
+        """AsyncOpenAI client, created (and openai imported) on first use"""
+        if self._client is None:
+            from openai import AsyncOpenAI
+            # Retries are the router's job: fail fast here so another backend can be tried
+            self._client = AsyncOpenAI(base_url=self.base_url, api_key=self.api_key, timeout=self.timeout,
+                                       max_retries=0)
+        return self._client
+
+    def mark_up(self):
+        self.healthy = True
+        self.failures = 0
+        self.down_until = 0.0
+
+    def mark_down(self, cooldown: float):
+        """Take the backend out of rotation, backing off further on repeated failures"""
+        self.healthy = False
+        self.failures += 1
+        self.errors += 1
+        self.down_until = time.monotonic() + cooldown * min(2 ** (self.failures - 1), 8)
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "base_url": self.base_url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+        }
+
+
+def prompt_chars(kwargs: dict) -> int:
+    """Size of the messages in a completion request"""
+    return sum(len(message.get("content") or "") for message in kwargs.get("messages", []))
+
+
+class LLMRouter:
+    """Routes each completion to the healthy backend with the fewest requests in flight"""
+
+    def __init__(self, backends: list, api_key: str = "lm-studio", timeout: float = 900.0,
+                 probe_interval: float = 15.0, probe_timeout: float = 3.0, cooldown: float = 5.0,
+                 hedge_after: float = None, hedge_max_chars: int = 2000):
+        self.backends = []
+        for backend in backends or [DEFAULT_BASE_URL]:
+            if isinstance(backend, str):
+                backend = {"base_url": backend}
+            self.backends.append(Backend(backend["base_url"], backend.get("api_key", api_key), timeout,
+                                         backend.get("name")))
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.cooldown = cooldown
+        # Hedging: if a short prompt has no first token after hedge_after seconds, also try a second backend
+        self.hedge_after = hedge_after
+        self.hedge_max_chars = hedge_max_chars
+        self.hedges = 0
+        self.failovers = 0
+        self._probe_task = None
+
+    @classmethod
+    def from_config(cls, config: dict, **kwargs):
+        """Build from a config with "backends" (URLs or {"base_url", "api_key", "name"}) or a single "base_url" """
+        backends = config.get("backends") or [config.get("base_url", DEFAULT_BASE_URL)]
+        options = {key: config[key] for key in ("hedge_after", "hedge_max_chars", "probe_interval") if key in config}
+        options.update(kwargs)
+        return cls(backends, api_key=config.get("api_key", "lm-studio"), **options)
+
+    def pick(self, exclude=()):
+        """Healthy (or cooled-down) backend with the fewest outstanding requests"""
+        now = time.monotonic()
+        candidates = [b for b in self.backends if b not in exclude and (b.healthy or b.down_until <= now)]
+        if not candidates:
+            # Everything is marked down: trying one beats failing outright
+            candidates = [b for b in self.backends if b not in exclude]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda b: (b.outstanding, b.requests))
+
+    async def create(self, **kwargs):
+        """chat.completions.create with routing and failover; streams come back as an async iterator of chunks"""
+        self._ensure_probing()
+        backend, result = await self._dispatch(kwargs)
+        if not kwargs.get("stream"):
+            backend.outstanding -= 1
+            return result
+        return self._relay(backend, *result)
+
+    async def _relay(self, backend: Backend, stream, first):
+        """Yield a stream's chunks, releasing the backend when the caller finishes or stops reading"""
+        try:
+            if first is not None:
+                yield first
+            async for chunk in stream:
+                yield chunk
+        finally:
+            backend.outstanding -= 1
+            await stream.close()
+
+    def _start(self, backend: Backend, kwargs: dict):
+        """Count the request against the backend now, so concurrent picks see it, and start it
+
+        The caller owns the count from here: it is given back when the attempt fails or loses, or when the
+        winning response is consumed.
+        """
+        backend.outstanding += 1
+        backend.requests += 1
+        return asyncio.create_task(self._attempt(backend, kwargs))
+
+    async def _attempt(self, backend: Backend, kwargs: dict):
+        """One request to one backend; a stream counts as started once its first chunk arrives"""
+        stream = None
+        try:
+            result = await backend.client.chat.completions.create(**kwargs)
+            if kwargs.get("stream"):
+                stream = result
+                try:
+                    first = await stream.__anext__()
+                except StopAsyncIteration:
+                    first = None
+                result = (stream, first)
+            backend.mark_up()
+            return result
+        except BaseException as e:
+            if stream is not None:
+                await stream.close()
+            if isinstance(e, failover_errors()):
+                backend.mark_down(self.cooldown)
+            raise
+
+    async def _release(self, backend: Backend, result, stream: bool):
+        """Give back a hedged attempt that lost the race"""
+        backend.outstanding -= 1
+        if stream:
+            await result[0].close()
+
+    async def _dispatch(self, kwargs: dict):
+        """Return (backend, result), failing over on connection errors and hedging short prompts"""
+        stream = bool(kwargs.get("stream"))
+        hedge = self.hedge_after is not None and len(self.backends) > 1 and prompt_chars(kwargs) <= self.hedge_max_chars
+        tried = set()
+        last_error = None
+
+        while True:
+            backend = self.pick(tried)
+            if backend is None:
+                raise last_error or LLMUnavailable("No LLM backends configured")
+            if tried:
+                self.failovers += 1
+            tried.add(backend)
+            attempts = {self._start(backend, kwargs): backend}
+            try:
+                if hedge:
+                    done, _ = await asyncio.wait(attempts, timeout=self.hedge_after)
+                    second = self.pick(tried) if not done else None
+                    if second is not None:
+                        tried.add(second)
+                        self.hedges += 1
+                        attempts[self._start(second, kwargs)] = second
+
+                while attempts:
+                    done, _ = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+                    winner = next((task for task in done if task.exception() is None), None)
+                    if winner is not None:
+                        return attempts.pop(winner), winner.result()
+                    for task in done:
+                        attempts.pop(task).outstanding -= 1
+                        last_error = task.exception()
+                        if not isinstance(last_error, failover_errors()):
+                            raise last_error
+            finally:
+                # Cancel losers; one may have completed in the meantime and must be released
+                for task in attempts:
+                    task.cancel()
+                for task, loser in attempts.items():
+                    try:
+                        result = await task
+                    except BaseException:
+                        loser.outstanding -= 1
+                        continue
+                    await self._release(loser, result, stream)
+
+    def _ensure_probing(self):
+        if self._probe_task is None and self.probe_interval and len(self.backends) > 1:
+            self._probe_task = asyncio.get_running_loop().create_task(self._probe_loop())
+
+    async def probe(self):
+        """Check every backend's /models endpoint and update its health"""
+        async def check(backend):
+            try:
+                await asyncio.wait_for(backend.client.models.list(), self.probe_timeout)
+                backend.mark_up()
+            except Exception:
+                if backend.healthy or backend.down_until <= time.monotonic():
+                    backend.mark_down(self.cooldown)
+        await asyncio.gather(*[check(backend) for backend in self.backends])
+
+    async def _probe_loop(self):
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            await self.probe()
+
+    def stats(self) -> dict:
+        return {
+            "backends": [backend.stats() for backend in self.backends],
+            "hedges": self.hedges,
+            "failovers": self.failovers,
+        }
+
+    async def close(self):
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
+        for backend in self.backends:
+            if backend._client is not None:
+                await backend._client.close()
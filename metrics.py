@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Sage Metrics - Per-stage timing spans for chat turns, exported as JSONL traces or Prometheus text
+"""
+import json
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+_NO_SPAN = nullcontext()
+
+
+class Trace:
+    """Timing spans and attributes for one chat turn"""
+
+    __slots__ = ("trace_id", "agent", "started", "wall_started", "spans", "attributes", "_recorder")
+
+    def __init__(self, recorder, agent: str, **attributes):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.agent = agent
+        self.started = time.perf_counter()
+        self.wall_started = time.time()
+        self.spans = []
+        self.attributes = attributes
+        self._recorder = recorder
+
+    @contextmanager
+    def span(self, stage: str, **attributes):
+        """Time a stage; overlapping spans of the same stage (parallel tool calls) are each recorded"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = {"stage": stage, "start": start - self.started, "seconds": time.perf_counter() - start}
+            if attributes:
+                record.update(attributes)
+            self.spans.append(record)
+
+    def add_span(self, stage: str, start: float, end: float, **attributes):
+        """Record a stage measured elsewhere from perf_counter timestamps"""
+        record = {"stage": stage, "start": start - self.started, "seconds": end - start}
+        if attributes:
+            record.update(attributes)
+        self.spans.append(record)
+
+    def set(self, **attributes):
+        """Attach attributes such as token counts or cache flags"""
+        self.attributes.update(attributes)
+
+    def finish(self, **attributes):
+        """Close the trace and hand it to the recorder's sinks"""
+        self.attributes.update(attributes)
+        self._recorder.emit(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "agent": self.agent,
+            "timestamp": self.wall_started,
+            "total_seconds": time.perf_counter() - self.started,
+            "spans": self.spans,
+            **self.attributes,
+        }
+
+
+class NullTrace:
+    """Trace that records nothing, so instrumented code costs a method call when metrics are off"""
+
+    __slots__ = ()
+
+    def span(self, stage: str, **attributes):
+        return _NO_SPAN
+
+    def add_span(self, stage: str, start: float, end: float, **attributes):
+        pass
+
+    def set(self, **attributes):
+        pass
+
+    def finish(self, **attributes):
+        pass
+
+
+NULL_TRACE = NullTrace()
+
+
+class NullRecorder:
+    """Disabled recorder"""
+
+    enabled = False
+
+    def start_trace(self, agent: str, **attributes):
+        return NULL_TRACE
+
+    def close(self):
+        pass
+
+
+class MetricsRecorder:
+    """Fans finished traces out to pluggable sinks (anything with emit(trace_dict) and close())"""
+
+    enabled = True
+
+    def __init__(self, sinks: list):
+        self.sinks = list(sinks)
+
+    def start_trace(self, agent: str, **attributes) -> Trace:
+        return Trace(self, agent, **attributes)
+
+    def emit(self, trace: Trace):
+        record = trace.to_dict()
+        for sink in self.sinks:
+            try:
+                sink.emit(record)
+            except Exception as e:
+                print(f"⚠️ Metrics sink {type(sink).__name__} failed: {e}")
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+class JsonlSink:
+    """Appends one JSON line per chat turn"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", buffering=1)
+
+    def emit(self, record: dict):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class PrometheusSink:
+    """Aggregates traces into counters and histograms and serves them as Prometheus text"""
+
+    def __init__(self, port: int = None, host: str = "127.0.0.1"):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._server = None
+        if port is not None:
+            self.serve(port, host)
+
+    def _observe(self, name: str, labels: tuple, value: float):
+        buckets = self._histograms.get((name, labels))
+        if buckets is None:
+            buckets = self._histograms[(name, labels)] = [[0] * len(STAGE_BUCKETS), 0, 0.0]
+        for i, bound in enumerate(STAGE_BUCKETS):
+            if value <= bound:
+                buckets[0][i] += 1
+        buckets[1] += 1
+        buckets[2] += value
+
+    def emit(self, record: dict):
+        agent = record["agent"]
+        with self._lock:
+            self._counters[("sage_turns_total", (("agent", agent),))] += 1
+            self._observe("sage_turn_seconds", (("agent", agent),), record["total_seconds"])
+            for span in record["spans"]:
+                self._observe("sage_stage_seconds", (("agent", agent), ("stage", span["stage"])), span["seconds"])
+            for kind in ("prompt", "completion"):
+                tokens = record.get(f"{kind}_tokens")
+                if tokens:
+                    self._counters[("sage_tokens_total", (("agent", agent), ("kind", kind)))] += tokens
+            if record.get("first_token") is not None:
+                self._observe("sage_first_token_seconds", (("agent", agent),), record["first_token"])
+            if record.get("tokens_per_second"):
+                self._counters[("sage_decode_tokens_per_second", (("agent", agent),))] = record["tokens_per_second"]
+            if "cache_hit" in record:
+                result = "hit" if record["cache_hit"] else "miss"
+                self._counters[("sage_cache_lookups_total", (("agent", agent), ("result", result)))] += 1
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        def fmt(labels):
+            return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}" if labels else ""
+
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    kind = "gauge" if name == "sage_decode_tokens_per_second" else "counter"
+                    lines.append(f"# TYPE {name} {kind}")
+                    typed.add(name)
+                lines.append(f"{name}{fmt(labels)} {value:g}")
+            for (name, labels), (counts, count, total) in sorted(self._histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                for bound, bucket in zip(STAGE_BUCKETS, counts):
+                    lines.append(f"{name}_bucket{fmt(labels + (('le', f'{bound:g}'),))} {bucket}")
+                lines.append(f"{name}_bucket{fmt(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{fmt(labels)} {total:g}")
+                lines.append(f"{name}_count{fmt(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """Serve /metrics from a daemon thread"""
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = sink.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="sage-metrics", daemon=True).start()
+        return self._server.server_address[1]
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def build_recorder(jsonl_path: str = None, prometheus_port: int = None):
+    """Recorder for the configured sinks, or a no-op recorder when none are configured"""
+    sinks = []
+    if jsonl_path:
+        sinks.append(JsonlSink(jsonl_path))
+    if prometheus_port is not None:
+        sinks.append(PrometheusSink(prometheus_port))
+    return MetricsRecorder(sinks) if sinks else NullRecorder()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Sage Mock OpenAI Server - Local stand-in for LM Studio with configurable latency and speed
+
+Usage: python mock_openai_server.py [--port 1234] [--latency 0.2] [--tps 50]
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+
+
+def default_responder(messages: list) -> str:
+    """Reply with a fixed recommendation that mentions how much context was sent"""
+    prompt_chars = sum(len(message.get("content") or "") for message in messages)
+    return (f"Based on the recipes provided ({prompt_chars} characters of context), "
+            "I recommend Cashew Alfredo because it is quick, creamy and uses pantry staples.")
+
+
+def split_tokens(text: str) -> list:
+    """Split a reply into word-sized streaming tokens"""
+    tokens = []
+    start = 0
+    for i, char in enumerate(text):
+        if char == " " and i > start:
+            tokens.append(text[start:i])
+            start = i
+    if start < len(text):
+        tokens.append(text[start:])
+    return tokens
+
+
+class MockOpenAIServer:
+    """OpenAI-compatible /v1/chat/completions and /v1/models over plain asyncio streams"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.2,
+                 tokens_per_second: float = 50.0, responder=None, model: str = "local-model"):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.responder = responder or default_responder
+        self.model = model
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        # Streams the client hung up on before the last token
+        self.aborted = 0
+        self._server = None
+        self._connections = set()
+        self._loop = None
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def serve(self):
+        """Start listening on the current event loop"""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    def start(self):
+        """Run the server on its own event loop in a daemon thread so it never competes with the client"""
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.serve())
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="mock-openai-server", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        """Stop the background server"""
+        if self._loop is None:
+            return
+
+        async def shutdown():
+            self._server.close()
+            for task in self._connections:
+                task.cancel()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop = None
+
+    async def _handle(self, reader, writer):
+        """Serve keep-alive HTTP/1.1 requests on one connection"""
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    return
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+
+                if method == "GET" and path.rstrip("/").endswith("/models"):
+                    await self._send_json(writer, {"object": "list", "data": [{"id": self.model, "object": "model"}]})
+                elif method == "POST" and path.rstrip("/").endswith("/chat/completions"):
+                    await self._chat(writer, json.loads(body or b"{}"))
+                else:
+                    await self._send_json(writer, {"error": {"message": f"Unknown route {path}"}}, status="404 Not Found")
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _send_json(self, writer, payload: dict, status: str = "200 OK"):
+        """Write a complete JSON response"""
+        data = json.dumps(payload).encode()
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+        await writer.drain()
+
+    async def _chat(self, writer, body: dict):
+        """Wait out the prefill latency, then return or stream the reply at the configured rate"""
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            reply = self.responder(body.get("messages", []))
+            tokens = split_tokens(reply)
+            finish_reason = "stop"
+            if body.get("max_tokens") is not None and len(tokens) > body["max_tokens"]:
+                tokens = tokens[:body["max_tokens"]]
+                reply = "".join(tokens)
+                finish_reason = "length"
+            delay = 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+            created = int(time.time())
+            usage = {
+                "prompt_tokens": sum(len(message.get("content") or "") for message in body.get("messages", [])) // 4,
+                "completion_tokens": len(tokens),
+            }
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            await asyncio.sleep(self.latency)
+
+            if not body.get("stream"):
+                await asyncio.sleep(delay * len(tokens))
+                await self._send_json(writer, {
+                    "id": f"chatcmpl-{self.requests}", "object": "chat.completion", "created": created,
+                    "model": self.model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": finish_reason}],
+                    "usage": usage,
+                })
+                return
+
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                         b"Cache-Control: no-cache\r\nTransfer-Encoding: chunked\r\n\r\n")
+            deltas = [{"role": "assistant", "content": ""}] + [{"content": token} for token in tokens]
+            for i, delta in enumerate(deltas):
+                chunk = {
+                    "id": f"chatcmpl-{self.requests}", "object": "chat.completion.chunk", "created": created,
+                    "model": self.model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+                }
+                self._write_chunk(writer, f"data: {json.dumps(chunk)}\n\n".encode())
+                await writer.drain()
+                if i:
+                    await asyncio.sleep(delay)
+            final = {
+                "id": f"chatcmpl-{self.requests}", "object": "chat.completion.chunk", "created": created,
+                "model": self.model, "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}],
+            }
+            self._write_chunk(writer, f"data: {json.dumps(final)}\n\n".encode())
+            if (body.get("stream_options") or {}).get("include_usage"):
+                usage_chunk = {
+                    "id": f"chatcmpl-{self.requests}", "object": "chat.completion.chunk", "created": created,
+                    "model": self.model, "choices": [], "usage": usage,
+                }
+                self._write_chunk(writer, f"data: {json.dumps(usage_chunk)}\n\n".encode())
+            self._write_chunk(writer, b"data: [DONE]\n\n")
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        except ConnectionError:
+            self.aborted += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    @staticmethod
+    def _write_chunk(writer, data: bytes):
+        """Write one HTTP chunked-encoding frame"""
+        writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+
+def main():
+    """Run the mock server in the foreground"""
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stand-in for benchmarks and offline tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--tps", type=float, default=50.0, help="Tokens per second while streaming")
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(args.host, args.port, args.latency, args.tps)
+
+    async def run():
+        await server.serve()
+        print(f"🌿 Mock OpenAI server on {server.base_url} (latency {args.latency}s, {args.tps} tokens/s)")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\n🌿 Mock server stopped")
+
+
+if __name__ == "__main__":
+    main()
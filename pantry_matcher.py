@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Sage Pantry Matcher - Vectorized recipe x ingredient coverage against a pantry list
+"""
+import re
+import numpy as np
+
+UNITS = frozenset("""
+cup cups c tbsp tablespoon tablespoons tbs tsp teaspoon teaspoons oz ounce ounces lb lbs pound pounds
+g gram grams kg ml l liter liters litre litres pinch pinches dash dashes clove cloves can cans
+package packages pkg block blocks bunch bunches handful handfuls slice slices piece pieces sprig sprigs
+stalk stalks head heads quart quarts pint pints inch inches large medium small whole
+""".split())
+
+DESCRIPTORS = frozenset("""
+raw fresh dried chopped minced diced sliced grated shredded soaked toasted roasted cooked
+finely roughly thinly peeled crushed ground packed heaping level optional organic frozen
+juiced zested melted softened rinsed drained of
+""".split())
+
+SYNONYMS = {
+    "nooch": "nutritional yeast",
+    "garbanzo bean": "chickpea",
+    "garbanzo": "chickpea",
+    "scallion": "green onion",
+    "spring onion": "green onion",
+    "cilantro": "coriander",
+    "courgette": "zucchini",
+    "aubergine": "eggplant",
+    "bell pepper": "pepper",
+    "capsicum": "pepper",
+    "black pepper": "pepper",
+    "sea salt": "salt",
+    "kosher salt": "salt",
+    "extra virgin olive oil": "olive oil",
+    "evoo": "olive oil",
+    "lemon juice": "lemon",
+    "lime juice": "lime",
+    "soy sauce": "tamari",
+    "shoyu": "tamari",
+}
+
+QUANTITY = re.compile(r"^[\d\s/.,\-–~½⅓⅔¼¾⅛]+")
+PARENTHETICAL = re.compile(r"\([^)]*\)")
+SPLIT_ITEMS = re.compile(r"\s+(?:and|or|&)\s+")
+
+
+def _singular(word: str) -> str:
+    """Light plural strip for ingredient words"""
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith(("oes", "ches", "shes", "sses")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def normalize_ingredient(line: str) -> list:
+    """Turn an ingredient line into canonical ingredient names (quantities, units and prep notes removed)"""
+    text = PARENTHETICAL.sub(" ", line.lower())
+    text = text.split(",")[0]
+    text = re.sub(r"\bto taste\b|\bas needed\b|\bfor serving\b", " ", text)
+    text = QUANTITY.sub("", text.strip())
+
+    names = []
+    for part in SPLIT_ITEMS.split(text):
+        words = [w for w in re.findall(r"[a-z]+", part) if w not in UNITS and w not in DESCRIPTORS]
+        if not words:
+            continue
+        name = " ".join(_singular(w) for w in words)
+        name = SYNONYMS.get(name, name)
+        names.append(name)
+    return names
+
+
+def normalize_pantry(items) -> list:
+    """Canonical names for a pantry list (strings or a comma-separated string)"""
+    if isinstance(items, str):
+        items = items.split(",")
+    names = []
+    for item in items:
+        names.extend(normalize_ingredient(item))
+    return names
+
+
+class PantryMatcher:
+    """Sparse recipe x ingredient matrix, kept row-major (CSR) and column-major (CSC), scored against pantries in bulk"""
+
+    def __init__(self, index):
+        self.index = index
+        self.version = None
+        self.names = []
+        self.vocabulary = {}
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.zeros(0, dtype=np.int32)
+        self._totals = np.zeros(0, dtype=np.int32)
+        self._col_ptr = np.zeros(1, dtype=np.int64)
+        self._col_docs = np.zeros(0, dtype=np.int32)
+        self._terms = []
+
+    def build(self, recipes: list):
+        """Build the vocabulary and CSR matrix from parsed ingredient sections"""
+        self.names = [recipe.name for recipe in recipes]
+        self.vocabulary = {}
+        indptr = [0]
+        indices = []
+        for recipe in recipes:
+            row = set()
+            for line in recipe.ingredients:
+                for name in normalize_ingredient(line):
+                    row.add(self.vocabulary.setdefault(name, len(self.vocabulary)))
+            indices.extend(sorted(row))
+            indptr.append(len(indices))
+        self._indptr = np.asarray(indptr, dtype=np.int64)
+        self._indices = np.asarray(indices, dtype=np.int32)
+        self._totals = np.diff(self._indptr).astype(np.int32)
+        # Column-major copy: for each ingredient, the recipes that use it
+        doc_ids = np.repeat(np.arange(len(recipes), dtype=np.int32), self._totals)
+        order = np.argsort(self._indices, kind="stable")
+        self._col_docs = doc_ids[order]
+        self._col_ptr = np.concatenate(([0], np.cumsum(np.bincount(self._indices, minlength=len(self.vocabulary)))))
+        self._terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        self.version = self.index.version
+
+    def _ensure_built(self):
+        """Rebuild when the recipe index has changed"""
+        if self.version != self.index.version:
+            self.build([self.index.get(name) for name in self.index.names()])
+
+    def pantry_terms(self, pantry) -> list:
+        """Vocabulary ids of the ingredients a pantry holds"""
+        term_ids = {self.vocabulary.get(name) for name in normalize_pantry(pantry)}
+        term_ids.discard(None)
+        return sorted(term_ids)
+
+    def score(self, pantries: list) -> tuple:
+        """Return (have, total, coverage) arrays of shape (pantries x recipes)"""
+        self._ensure_built()
+        have = np.zeros((len(pantries), len(self.names)), dtype=np.int32)
+        for row, pantry in enumerate(pantries):
+            # Each pantry ingredient adds one to every recipe in its column (recipes appear once per column)
+            for term_id in self.pantry_terms(pantry):
+                have[row, self._col_docs[self._col_ptr[term_id]:self._col_ptr[term_id + 1]]] += 1
+        totals = np.broadcast_to(self._totals, have.shape)
+        coverage = np.divide(have, totals, out=np.zeros(have.shape, dtype=np.float32), where=totals > 0)
+        return have, totals, coverage
+
+    def best_matches(self, pantry, k: int = 5, min_coverage: float = 0.0) -> list:
+        """Top recipes for one pantry: highest coverage, then fewest missing, then file name"""
+        return self.best_matches_batch([pantry], k, min_coverage)[0]
+
+    def best_matches_batch(self, pantries: list, k: int = 5, min_coverage: float = 0.0) -> list:
+        """Top recipes for each pantry in a batch"""
+        have, totals, coverage = self.score(pantries)
+        missing = totals - have
+        results = []
+        for row in range(len(pantries)):
+            eligible = np.flatnonzero((have[row] > 0) & (coverage[row] >= min_coverage))
+            order = np.lexsort((missing[row, eligible], -coverage[row, eligible]))[:k]
+            matches = []
+            for doc_id in eligible[order]:
+                matches.append({
+                    "name": self.names[doc_id],
+                    "coverage": float(coverage[row, doc_id]),
+                    "have": int(have[row, doc_id]),
+                    "missing": int(missing[row, doc_id]),
+                    "missing_ingredients": self.missing_ingredients(doc_id, pantries[row]),
+                })
+            results.append(matches)
+        return results
+
+    def missing_ingredients(self, doc_id: int, pantry) -> list:
+        """Canonical ingredient names a recipe needs that the pantry lacks"""
+        have = set(normalize_pantry(pantry))
+        row = self._indices[self._indptr[doc_id]:self._indptr[doc_id + 1]]
+        return [self._terms[term_id] for term_id in row if self._terms[term_id] not in have]
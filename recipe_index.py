@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Sage Recipe Index - Parsed in-memory recipe store with incremental refresh
+"""
+import hashlib
+import os
+import re
+import threading
+import weakref
+from stat import S_ISREG
+from recipe_sections import SECTION_FIELDS, open_buffer, parse_text, read_section, scan_sections, section_names
+
+RECIPE_EXTENSIONS = (".md",)
+
+LIST_ITEM = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+")
+HASHTAG = re.compile(r"(?<![\w#])#([A-Za-z][\w/-]*)")
+
+
+class RecipeContent:
+    """Parsed fields of a recipe file, independent of its name (title is None when there is no heading)"""
+
+    __slots__ = ("title", "ingredients", "instructions", "notes", "tags", "__weakref__")
+
+    def __init__(self, title, ingredients, instructions, notes, tags):
+        self.title = title
+        self.ingredients = ingredients
+        self.instructions = instructions
+        self.notes = notes
+        self.tags = tags
+
+
+class Recipe:
+    """Structured recipe record parsed from a markdown file"""
+
+    # content: the RecipeContent the fields came from, when they are shared through a RecipePool
+    __slots__ = ("name", "title", "ingredients", "instructions", "notes", "tags", "content")
+
+    def __init__(self, name, title, ingredients, instructions, notes, tags, content=None):
+        self.name = name
+        self.title = title
+        self.ingredients = ingredients
+        self.instructions = instructions
+        self.notes = notes
+        self.tags = tags
+        self.content = content
+
+    @classmethod
+    def from_content(cls, name: str, content: RecipeContent):
+        """A Recipe for one file that references the (possibly shared) parsed fields"""
+        title = content.title or os.path.splitext(name)[0].replace("-", " ").replace("_", " ").title()
+        return cls(name, title, content.ingredients, content.instructions, content.notes, content.tags, content)
+
+    def to_dict(self) -> dict:
+        """Return the recipe as a plain dict"""
+        return {
+            "name": self.name,
+            "title": self.title,
+            "ingredients": list(self.ingredients),
+            "instructions": list(self.instructions),
+            "notes": self.notes,
+            "tags": list(self.tags),
+        }
+
+    def format(self, sections: tuple = ("ingredients", "instructions", "notes")) -> str:
+        """Render the recipe (or just the given sections) as compact markdown for prompts"""
+        lines = [f"# {self.title} ({self.name})"]
+        if self.tags:
+            lines.append("Tags: " + ", ".join(self.tags))
+        if self.ingredients and "ingredients" in sections:
+            lines.append("## Ingredients")
+            lines.extend(f"- {item}" for item in self.ingredients)
+        if self.instructions and "instructions" in sections:
+            lines.append("## Instructions")
+            lines.extend(f"{i}. {step}" for i, step in enumerate(self.instructions, 1))
+        if self.notes and "notes" in sections:
+            lines.append("## Notes")
+            lines.append(self.notes)
+        return "\n".join(lines)
+
+
+def _split_frontmatter(text: str):
+    """Split YAML frontmatter from the body, returning (frontmatter, body)"""
+    if not text.startswith("---"):
+        return "", text
+    end = text.find("\n---", 3)
+    if end == -1:
+        return "", text
+    body_start = text.find("\n", end + 4)
+    body = text[body_start + 1:] if body_start != -1 else ""
+    return text[3:end], body
+
+
+def _frontmatter_tags(frontmatter: str) -> list:
+    """Extract tags from simple YAML frontmatter (inline or block list)"""
+    tags = []
+    lines = frontmatter.splitlines()
+    for i, line in enumerate(lines):
+        key, _, value = line.partition(":")
+        if key.strip().lower() != "tags":
+            continue
+        value = value.strip()
+        if value:
+            tags.extend(t.strip(" '\"#") for t in value.strip("[]").split(","))
+        else:
+            for item in lines[i + 1:]:
+                if not item.strip().startswith("-"):
+                    break
+                tags.append(item.strip()[1:].strip(" '\"#"))
+        break
+    return [t for t in tags if t]
+
+
+def parse_recipe(name: str, text: str) -> Recipe:
+    """Parse markdown recipe text into a Recipe record"""
+    return Recipe.from_content(name, parse_content(text))
+
+
+def parse_content(text: str) -> RecipeContent:
+    """Parse markdown recipe text into its name-independent fields"""
+    frontmatter, body = _split_frontmatter(text)
+    tags = _frontmatter_tags(frontmatter)
+
+    title = None
+    sections = {"ingredients": [], "instructions": [], "notes": [], "tags": []}
+    current = None
+    current_level = 0
+
+    for line in body.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("# ") and title is None:
+            title = stripped[2:].strip()
+            current, current_level = None, 0
+            continue
+        if stripped.startswith("#") and stripped.lstrip("#").startswith(" "):
+            heading = stripped.lstrip("#").strip().lower()
+            level = len(stripped) - len(stripped.lstrip("#"))
+            if heading in SECTION_FIELDS:
+                current, current_level = SECTION_FIELDS[heading], level
+            elif level <= current_level:
+                # Deeper headings ("### For the sauce") stay in the section they are nested in
+                current, current_level = None, 0
+            continue
+        if current and stripped:
+            sections[current].append(stripped)
+
+    ingredients = tuple(LIST_ITEM.sub("", line) for line in sections["ingredients"])
+    instructions = tuple(LIST_ITEM.sub("", line) for line in sections["instructions"])
+    notes = "\n".join(sections["notes"])
+
+    for line in sections["tags"]:
+        tags.extend(t.strip(" #") for t in LIST_ITEM.sub("", line).split(","))
+    tags.extend(HASHTAG.findall(notes))
+
+    seen = set()
+    unique_tags = []
+    for tag in tags:
+        tag = tag.strip().lower()
+        if tag and tag not in seen:
+            seen.add(tag)
+            unique_tags.append(tag)
+
+    return RecipeContent(title or None, ingredients, instructions, notes, tuple(unique_tags))
+
+
+class RecipePool:
+    """Parsed recipe fields shared between indexes (one per tenant) by content hash
+
+    The same bytes saved under different file names in different vaults are parsed and held once; each
+    index keeps only a small per-file Recipe carrying the name. Entries are weak: content is dropped from
+    the pool once no index holds a recipe with it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contents = weakref.WeakValueDictionary()
+        self.parsed = 0
+        self.shared = 0
+
+    def __len__(self):
+        return len(self._contents)
+
+    def recipe(self, name: str, content_hash: str, text: str) -> Recipe:
+        """Return a Recipe for this file, parsing the text only if no index holds the same content yet"""
+        with self._lock:
+            content = self._contents.get(content_hash)
+            if content is not None:
+                self.shared += 1
+        if content is None:
+            content = parse_content(text)
+            with self._lock:
+                self.parsed += 1
+                content = self._contents.setdefault(content_hash, content)
+        return Recipe.from_content(name, content)
+
+    def stats(self) -> dict:
+        return {"recipes": len(self), "parsed": self.parsed, "shared": self.shared}
+
+
+class RecipeIndex:
+    """In-memory index of parsed recipes, refreshed incrementally by mtime and size"""
+
+    def __init__(self, recipes_dir: str, pool: RecipePool = None):
+        self.recipes_dir = recipes_dir
+        # Indexes over overlapping vaults can share one pool so identical files are parsed and held once
+        self.pool = pool
+        self.version = 0
+        # Guards updates, which may come from a background watcher thread
+        self._lock = threading.RLock()
+        self._recipes = {}
+        self._stats = {}
+        self._hashes = {}
+        # Byte offsets of each large file's sections, so single sections can be read without the rest
+        self._sections = {}
+        self._sorted_names = None
+        self._corpus_hash = None
+
+    def __len__(self):
+        return len(self._recipes)
+
+    def refresh(self) -> int:
+        """Re-parse new or changed files and drop deleted ones, returning the number of changes"""
+        try:
+            entries = [
+                entry for entry in os.scandir(self.recipes_dir)
+                if entry.name.endswith(RECIPE_EXTENSIONS) and entry.is_file()
+            ]
+        except OSError:
+            entries = []
+
+        with self._lock:
+            changes = 0
+            seen = set()
+            for entry in entries:
+                seen.add(entry.name)
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                signature = (stat.st_mtime_ns, stat.st_size)
+                if self._stats.get(entry.name) == signature:
+                    continue
+                if self._load(entry.name, entry.path, signature):
+                    changes += 1
+
+            for name in [name for name in self._recipes if name not in seen]:
+                self._drop(name)
+                changes += 1
+
+            self._commit(changes)
+        return changes
+
+    def apply_changes(self, names) -> int:
+        """Re-check only the given file names (added, modified, deleted or renamed), without a directory scan"""
+        with self._lock:
+            changes = 0
+            for name in set(names):
+                if not name.endswith(RECIPE_EXTENSIONS) or os.sep in name:
+                    continue
+                path = os.path.join(self.recipes_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    stat = None
+                if stat is None or not S_ISREG(stat.st_mode):
+                    if name in self._recipes:
+                        self._drop(name)
+                        changes += 1
+                    continue
+                signature = (stat.st_mtime_ns, stat.st_size)
+                if self._stats.get(name) != signature and self._load(name, path, signature):
+                    changes += 1
+            self._commit(changes)
+        return changes
+
+    def _commit(self, changes: int):
+        """Bump the version and reset derived data after changes"""
+        if changes:
+            self.version += 1
+            self._sorted_names = None
+            self._corpus_hash = None
+
+    def _load(self, name: str, path: str, signature: tuple) -> bool:
+        """Parse a single file into the index"""
+        try:
+            with open_buffer(path) as buf:
+                content_hash = hashlib.sha1(buf).hexdigest()
+                if isinstance(buf, bytes):
+                    # Small files are decoded whole and their sections found on demand
+                    sections, text = None, buf.decode("utf-8", errors="replace")
+                else:
+                    # Large files are mapped: only headings and the sections parse_recipe reads are decoded
+                    sections = scan_sections(buf)
+                    text = parse_text(buf, sections)
+        except (OSError, ValueError):
+            return False
+        self._drop(name)
+        if self.pool is not None:
+            self._recipes[name] = self.pool.recipe(name, content_hash, text)
+        else:
+            self._recipes[name] = parse_recipe(name, text)
+        self._stats[name] = signature
+        self._hashes[name] = content_hash
+        self._sections[name] = sections
+        return True
+
+    def _drop(self, name: str):
+        """Remove a file from the index"""
+        self._recipes.pop(name, None)
+        self._stats.pop(name, None)
+        self._hashes.pop(name, None)
+        self._sections.pop(name, None)
+
+    def get(self, name: str):
+        """Return the Recipe for a file name, or None"""
+        return self._recipes.get(name)
+
+    def sections(self, name: str) -> list:
+        """Return the headings of an indexed file, in order"""
+        if name not in self._sections:
+            return []
+        offsets = self._sections[name]
+        if offsets is None:
+            return section_names(os.path.join(self.recipes_dir, name))
+        return [section.heading for section in offsets]
+
+    def read_section(self, name: str, section: str):
+        """Return one section of an indexed file, reading only its bytes, or None"""
+        with self._lock:
+            if name not in self._sections:
+                return None
+            offsets = self._sections[name]
+            signature = self._stats.get(name)
+        path = os.path.join(self.recipes_dir, name)
+        try:
+            stat = os.stat(path)
+            # Offsets from the last refresh are only valid for the same file
+            if (stat.st_mtime_ns, stat.st_size) != signature:
+                offsets = None
+            return read_section(path, section, offsets)
+        except (OSError, ValueError):
+            return None
+
+    def names(self) -> list:
+        """Return indexed file names in sorted order"""
+        with self._lock:
+            if self._sorted_names is None:
+                self._sorted_names = sorted(self._recipes)
+            return self._sorted_names
+
+    def corpus_hash(self) -> str:
+        """Return a content hash of the whole indexed corpus"""
+        with self._lock:
+            if self._corpus_hash is None:
+                digest = hashlib.sha1()
+                for name in self.names():
+                    digest.update(f"{name}\0{self._hashes[name]}\n".encode("utf-8"))
+                self._corpus_hash = digest.hexdigest()
+            return self._corpus_hash
+
+    def recipes(self) -> list:
+        """Return all indexed recipes"""
+        with self._lock:
+            return list(self._recipes.values())
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Sage Recipe Paths - Keep file tool paths inside a recipes root and place per-vault cache files
+"""
+import hashlib
+import os
+
+
+def resolve_in_root(root: str, path: str):
+    """Real path of a tool path inside root, or None if it escapes (via "..", an absolute path or a symlink)
+
+    Relative paths are tried against root first, then as given, so "recipes/x.md" and "x.md" both work.
+    """
+    root = os.path.realpath(root)
+    candidates = [path] if os.path.isabs(path) else [os.path.join(root, path), path]
+    inside = []
+    for candidate in candidates:
+        real = os.path.realpath(candidate)
+        if real == root or real.startswith(root + os.sep):
+            if os.path.exists(real):
+                return real
+            inside.append(real)
+    return inside[0] if inside else None
+
+
+def cache_path(recipes_dir: str, suffix: str) -> str:
+    """Per-user cache file for a vault ($XDG_CACHE_HOME/sage/<vault>-<hash><suffix>)
+
+    Kept outside the vault, which may be read-only, shared or synced.
+    """
+    cache_dir = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "sage")
+    vault = os.path.realpath(recipes_dir)
+    key = hashlib.sha1(vault.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{os.path.basename(vault) or 'recipes'}-{key}{suffix}")
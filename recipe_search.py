@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Sage Recipe Search - Vectorized BM25 retrieval over parsed recipe fields
+"""
+import re
+from collections import Counter
+import numpy as np
+
+FIELD_WEIGHTS = {
+    "title": 3.0,
+    "tags": 2.0,
+    "ingredients": 2.0,
+    "instructions": 1.0,
+    "notes": 0.5,
+}
+
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from have how i in is it me my of on or recipe recipes
+show some tell that the this to use what which with you your any all available make made
+""".split())
+
+WORD = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list:
+    """Lowercase words without stopwords, with a light plural strip"""
+    tokens = []
+    for word in WORD.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def recipe_fields(recipe) -> dict:
+    """Text of each searchable field of a Recipe"""
+    return {
+        "title": recipe.title,
+        "tags": " ".join(recipe.tags),
+        "ingredients": " ".join(recipe.ingredients),
+        "instructions": " ".join(recipe.instructions),
+        "notes": recipe.notes,
+    }
+
+
+class RecipeSearch:
+    """BM25 over field-weighted term frequencies, stored as term-major posting arrays"""
+
+    def __init__(self, index, k1: float = 1.2, b: float = 0.75):
+        self.index = index
+        self.k1 = k1
+        self.b = b
+        self.version = None
+        self.names = []
+        self.vocabulary = {}
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._docs = np.zeros(0, dtype=np.int32)
+        self._weights = np.zeros(0, dtype=np.float32)
+        self._term_counts = {}
+
+    def _counts(self, recipe) -> Counter:
+        """Field-weighted term counts for a recipe, reused until the recipe is re-parsed"""
+        cached = self._term_counts.get(recipe.name)
+        if cached is not None and cached[0] is recipe:
+            return cached[1]
+        counts = Counter()
+        for field, text in recipe_fields(recipe).items():
+            weight = FIELD_WEIGHTS[field]
+            for token in tokenize(text):
+                counts[token] += weight
+        self._term_counts[recipe.name] = (recipe, counts)
+        return counts
+
+    def build(self, recipes: list):
+        """Build posting arrays with precomputed BM25 weights"""
+        self.names = [recipe.name for recipe in recipes]
+        self.vocabulary = {}
+        term_ids = []
+        doc_ids = []
+        freqs = []
+        lengths = np.zeros(len(recipes), dtype=np.float32)
+
+        vocabulary = self.vocabulary
+        for doc_id, recipe in enumerate(recipes):
+            counts = self._counts(recipe)
+            lengths[doc_id] = sum(counts.values())
+            term_ids.extend(vocabulary.setdefault(token, len(vocabulary)) for token in counts)
+            doc_ids.extend([doc_id] * len(counts))
+            freqs.extend(counts.values())
+
+        # Forget term counts of recipes that were removed or re-parsed
+        if len(self._term_counts) > len(recipes):
+            live = set(self.names)
+            self._term_counts = {name: item for name, item in self._term_counts.items() if name in live}
+
+        terms = np.asarray(term_ids, dtype=np.int32)
+        order = np.argsort(terms, kind="stable")
+        terms = terms[order]
+        docs = np.asarray(doc_ids, dtype=np.int32)[order]
+        tf = np.asarray(freqs, dtype=np.float32)[order]
+
+        n_docs = max(len(recipes), 1)
+        df = np.bincount(terms, minlength=len(self.vocabulary)).astype(np.float32)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+        avg_length = float(lengths.mean()) if len(recipes) else 1.0
+        norm = self.k1 * (1 - self.b + self.b * lengths[docs] / max(avg_length, 1e-6))
+
+        self._weights = (idf[terms] * tf * (self.k1 + 1) / (tf + norm)).astype(np.float32)
+        self._docs = docs
+        self._offsets = np.concatenate(([0], np.cumsum(df, dtype=np.int64)))
+        self.version = self.index.version
+
+    def top_k(self, query: str, k: int = 5) -> list:
+        """Return up to k (name, score) pairs ranked by BM25 score"""
+        if self.version != self.index.version:
+            self.build(self.index.recipes())
+        if not self.names:
+            return []
+
+        scores = np.zeros(len(self.names), dtype=np.float32)
+        matched = False
+        for token in set(tokenize(query)):
+            term_id = self.vocabulary.get(token)
+            if term_id is None:
+                continue
+            start, end = self._offsets[term_id], self._offsets[term_id + 1]
+            scores[self._docs[start:end]] += self._weights[start:end]
+            matched = True
+        if not matched:
+            return []
+
+        k = min(k, len(self.names))
+        kth_score = np.partition(scores, len(scores) - k)[len(scores) - k]
+        candidates = np.flatnonzero((scores >= kth_score) & (scores > 0))
+        # Ties break on name so results are deterministic
+        ranked = sorted(candidates, key=lambda doc_id: (-scores[doc_id], self.names[doc_id]))[:k]
+        return [(self.names[doc_id], float(scores[doc_id])) for doc_id in ranked]
+
+    def search(self, query: str, k: int = 5) -> list:
+        """Return up to k Recipes ranked by relevance to the query"""
+        return [self.index.get(name) for name, _ in self.top_k(query, k)]
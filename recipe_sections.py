@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Sage Recipe Sections - Byte-offset index of markdown sections and memory-mapped section reads
+
+Large recipes (long notes, base64 images) are memory-mapped and only the byte ranges a caller asks for are
+decoded, so the rest of the file is never copied into Python.
+"""
+import mmap
+import os
+import re
+from contextlib import contextmanager
+
+# Markdown section headings and the Recipe field each one fills
+SECTION_FIELDS = {
+    "ingredients": "ingredients",
+    "instructions": "instructions",
+    "directions": "instructions",
+    "method": "instructions",
+    "steps": "instructions",
+    "notes": "notes",
+    "tags": "tags",
+}
+
+# Below this size a plain read is cheaper than setting up a mapping
+MMAP_MIN_BYTES = 64 * 1024
+
+# Matched at a line start; the match stops before the newline
+HEADING = re.compile(rb"[ \t]*(#+) +(.*)")
+
+
+class Section:
+    """One heading and the byte range of its body (up to the next heading)"""
+
+    __slots__ = ("heading", "level", "start", "body_start", "end")
+
+    def __init__(self, heading: str, level: int, start: int, body_start: int, end: int):
+        self.heading = heading
+        self.level = level
+        self.start = start
+        self.body_start = body_start
+        self.end = end
+
+    @property
+    def key(self) -> str:
+        return self.heading.lower()
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+@contextmanager
+def open_buffer(path: str, min_mmap_bytes: int = MMAP_MIN_BYTES):
+    """Yield the file's bytes: a read-only memory map for large files, plain bytes for small ones"""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < max(min_mmap_bytes, 1):
+            yield f.read()
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            yield buf
+
+
+def body_offset(buf) -> int:
+    """Where the markdown body starts, after any YAML frontmatter"""
+    if not buf[:3] == b"---":
+        return 0
+    end = buf.find(b"\n---", 3)
+    if end == -1:
+        return 0
+    body_start = buf.find(b"\n", end + 4)
+    return body_start + 1 if body_start != -1 else len(buf)
+
+
+def scan_sections(buf) -> list:
+    """Every heading in the body with its byte range, in file order
+
+    Jumps between "#" characters, so long lines without one (base64 images) are skipped at memchr speed.
+    """
+    sections = []
+    size = len(buf)
+    position = body_offset(buf)
+    while True:
+        hash_at = buf.find(b"#", position)
+        if hash_at == -1:
+            break
+        line_start = buf.rfind(b"\n", position, hash_at) + 1 or position
+        match = None
+        if not buf[line_start:hash_at].strip(b" \t"):
+            match = HEADING.match(buf, line_start)
+        if match and match.group(2).strip():
+            if sections:
+                sections[-1].end = line_start
+            body_start = min(match.end() + 1, size)
+            sections.append(Section(match.group(2).decode("utf-8", errors="replace").strip(),
+                                    len(match.group(1)), line_start, body_start, size))
+        # Only the first "#" on a line can start a heading
+        line_end = buf.find(b"\n", hash_at)
+        if line_end == -1:
+            break
+        position = line_end + 1
+    return sections
+
+
+def find_sections(sections: list, name: str) -> list:
+    """(start, end) byte ranges of the sections matching a heading or field name, sub-sections included
+
+    "instructions" also finds "Method" and "Directions".
+    """
+    key = name.strip().lower()
+    field = SECTION_FIELDS.get(key, key)
+    ranges = []
+    for i, section in enumerate(sections):
+        if section.key != key and SECTION_FIELDS.get(section.key) != field:
+            continue
+        if ranges and section.start < ranges[-1][1]:
+            continue  # Nested in a section already matched
+        end = section.end
+        for deeper in sections[i + 1:]:
+            if deeper.level <= section.level:
+                break
+            end = deeper.end
+        ranges.append((section.start, end))
+    return ranges
+
+
+def decode(buf, start: int, end: int) -> str:
+    """Decode one byte range through a zero-copy view"""
+    with memoryview(buf) as view:
+        return str(view[start:end], "utf-8", "replace")
+
+
+def parse_text(buf, sections: list) -> str:
+    """The parts of a recipe parse_recipe uses: frontmatter, headings and the bodies of known sections
+
+    Bodies of other sections (photos, nutrition tables, ...) are skipped without being copied; sub-sections
+    of a known section are part of it.
+    """
+    body = body_offset(buf)
+    known_level = None
+    with memoryview(buf) as view:
+        parts = [view[:body]]
+        for section in sections:
+            parts.append(view[section.start:section.body_start])
+            if section.key in SECTION_FIELDS:
+                known_level = section.level
+            elif known_level is not None and section.level <= known_level:
+                known_level = None
+            if known_level is not None:
+                parts.append(view[section.body_start:section.end])
+        text = b"".join(parts)
+        for part in parts:
+            part.release()
+    return text.decode("utf-8", errors="replace")
+
+
+def read_section(path: str, name: str, sections: list = None):
+    """Text of a section (heading included), or None if the file has no such section
+
+    "title" returns the first top-level heading. Pass sections from an earlier scan to skip rescanning.
+    """
+    with open_buffer(path) as buf:
+        if sections is None:
+            sections = scan_sections(buf)
+        if name.strip().lower() == "title":
+            titles = [section for section in sections if section.level == 1]
+            return titles[0].heading if titles else None
+        matches = find_sections(sections, name)
+        if not matches:
+            return None
+        return "".join(decode(buf, start, end) for start, end in matches).rstrip("\n")
+
+
+def section_size(path: str, name: str) -> int:
+    """Bytes read_section would return for a section (0 if the file has none)"""
+    with open_buffer(path) as buf:
+        return sum(end - start for start, end in find_sections(scan_sections(buf), name))
+
+
+def section_names(path: str) -> list:
+    """Headings in a file, for error messages"""
+    try:
+        with open_buffer(path) as buf:
+            return [section.heading for section in scan_sections(buf)]
+    except OSError:
+        return []
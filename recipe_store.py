@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Sage Recipe Store - Disk-backed recipe index (SQLite + FTS5) for vaults too large to hold in memory
+
+Drop-in for RecipeIndex (refresh, apply_changes, get, names, corpus_hash, version) and RecipeSearch
+(top_k, search). Parsed fields live in the database (raw text stays in the files, so embedded images are
+never copied), a cold start only stats files and resident memory is bounded by SQLite's page cache.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from stat import S_ISREG
+from recipe_index import RECIPE_EXTENSIONS, Recipe, parse_recipe
+from pantry_matcher import normalize_ingredient, normalize_pantry
+from recipe_paths import cache_path
+from recipe_search import FIELD_WEIGHTS, tokenize
+
+SCHEMA_VERSION = "5"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS recipes (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha1 TEXT NOT NULL,
+    title TEXT NOT NULL,
+    ingredients TEXT NOT NULL,
+    instructions TEXT NOT NULL,
+    notes TEXT NOT NULL,
+    tags TEXT NOT NULL,
+    ingredient_count INTEGER NOT NULL
+);
+-- Canonical ingredient names per recipe (pantry_matcher.normalize_ingredient), for pantry ranking in SQL
+CREATE TABLE IF NOT EXISTS ingredients (
+    recipe INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    term TEXT NOT NULL,
+    PRIMARY KEY (recipe, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ingredients_term ON ingredients (term, recipe);
+CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts USING fts5(
+    title, tags, ingredients, instructions, notes, tokenize = "porter unicode61"
+);
+"""
+FTS_COLUMNS = ("title", "tags", "ingredients", "instructions", "notes")
+BM25_WEIGHTS = ", ".join(str(FIELD_WEIGHTS[column]) for column in FTS_COLUMNS)
+
+
+def default_db_path(recipes_dir: str) -> str:
+    """Per-user cache location for a vault's database, so read-only and shared vaults work"""
+    return cache_path(recipes_dir, ".db")
+
+
+def _fts_phrase(term: str) -> str:
+    """Quote a term for an FTS5 query"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+class RecipeStore:
+    """Recipes and their full-text index in a local SQLite database, synced incrementally by mtime and size"""
+
+    def __init__(self, recipes_dir: str, db_path: str = None, cache_mb: int = 16, batch_size: int = 500):
+        self.recipes_dir = recipes_dir
+        # Outside the vault by default: the vault may be read-only, shared or synced
+        self.db_path = db_path or default_db_path(recipes_dir)
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self.batch_size = batch_size
+        self.version = 0
+        # One connection shared with the watcher thread; every use holds the lock
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        self._db.execute(f"PRAGMA cache_size = {-cache_mb * 1024}")
+        self._db.executescript(SCHEMA)
+        if self._meta("schema_version") != SCHEMA_VERSION:
+            # Older layouts are rebuilt from the files
+            self._db.executescript("DROP TABLE IF EXISTS recipes; DROP TABLE IF EXISTS recipes_fts; "
+                                   "DROP TABLE IF EXISTS ingredients; DELETE FROM meta;")
+            self._db.executescript(SCHEMA)
+            self._set_meta("schema_version", SCHEMA_VERSION)
+            self._db.commit()
+        self._sorted_names = None
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM recipes").fetchone()[0]
+
+    def _meta(self, key: str):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value):
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def refresh(self) -> int:
+        """Sync the database with the directory: stat every file, parse only new or changed ones"""
+        try:
+            entries = [
+                entry for entry in os.scandir(self.recipes_dir)
+                if entry.name.endswith(RECIPE_EXTENSIONS) and entry.is_file()
+            ]
+        except OSError:
+            entries = []
+
+        with self._lock:
+            # The comparison happens inside SQLite so no per-recipe state is held in Python
+            self._db.execute("CREATE TEMP TABLE IF NOT EXISTS scan (name TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER)")
+            self._db.execute("DELETE FROM scan")
+            rows = []
+            for entry in entries:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                rows.append((entry.name, stat.st_size, stat.st_mtime_ns))
+            self._db.executemany("INSERT OR REPLACE INTO scan VALUES (?, ?, ?)", rows)
+            del rows
+
+            removed = [name for (name,) in self._db.execute(
+                "SELECT name FROM recipes WHERE name NOT IN (SELECT name FROM scan)")]
+            changed = [name for (name,) in self._db.execute(
+                "SELECT s.name FROM scan s LEFT JOIN recipes r ON r.name = s.name "
+                "WHERE r.name IS NULL OR r.size != s.size OR r.mtime_ns != s.mtime_ns")]
+            self._db.execute("DELETE FROM scan")
+
+            changes = 0
+            for name in removed:
+                changes += self._drop(name)
+            changes += self._load_batch(changed)
+            self._commit(changes)
+        return changes
+
+    def apply_changes(self, names) -> int:
+        """Re-check only the given file names (added, modified, deleted or renamed), without a directory scan"""
+        with self._lock:
+            changes = 0
+            candidates = []
+            for name in set(names):
+                if not name.endswith(RECIPE_EXTENSIONS) or os.sep in name:
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.recipes_dir, name))
+                except OSError:
+                    stat = None
+                if stat is None or not S_ISREG(stat.st_mode):
+                    changes += self._drop(name)
+                    continue
+                row = self._db.execute("SELECT size, mtime_ns FROM recipes WHERE name = ?", (name,)).fetchone()
+                if row != (stat.st_size, stat.st_mtime_ns):
+                    candidates.append(name)
+            changes += self._load_batch(candidates)
+            self._commit(changes)
+        return changes
+
+    def _load_batch(self, names: list) -> int:
+        """Parse files and upsert them, committing every batch_size files so progress survives a crash"""
+        changes = 0
+        for i, name in enumerate(names, 1):
+            changes += self._load(name)
+            if i % self.batch_size == 0:
+                self._set_meta("corpus_hash", None)
+                self._db.commit()
+        return changes
+
+    def _load(self, name: str) -> int:
+        """Parse one file into the store"""
+        path = os.path.join(self.recipes_dir, name)
+        try:
+            with open(path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                data = f.read()
+        except OSError:
+            return 0
+        text = data.decode("utf-8", errors="replace")
+        recipe = parse_recipe(name, text)
+        terms = list(dict.fromkeys(term for line in recipe.ingredients for term in normalize_ingredient(line)))
+        self._drop(name)
+        cursor = self._db.execute(
+            "INSERT INTO recipes (name, size, mtime_ns, sha1, title, ingredients, instructions, notes, tags, "
+            "ingredient_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (name, stat.st_size, stat.st_mtime_ns, hashlib.sha1(data).hexdigest(), recipe.title,
+             json.dumps(recipe.ingredients), json.dumps(recipe.instructions), recipe.notes,
+             json.dumps(recipe.tags), len(terms)))
+        self._db.executemany("INSERT INTO ingredients (recipe, position, term) VALUES (?, ?, ?)",
+                             [(cursor.lastrowid, position, term) for position, term in enumerate(terms)])
+        self._db.execute(
+            "INSERT INTO recipes_fts (rowid, title, tags, ingredients, instructions, notes) VALUES (?, ?, ?, ?, ?, ?)",
+            # Canonical names ride along with the raw lines so ingredient queries match "lemon juice" to "1 lemon, juiced"
+            (cursor.lastrowid, recipe.title, " ".join(recipe.tags), " ".join((*recipe.ingredients, *terms)),
+             " ".join(recipe.instructions), recipe.notes))
+        return 1
+
+    def _drop(self, name: str) -> int:
+        """Remove a file from the store"""
+        row = self._db.execute("SELECT id FROM recipes WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return 0
+        self._db.execute("DELETE FROM recipes_fts WHERE rowid = ?", row)
+        self._db.execute("DELETE FROM ingredients WHERE recipe = ?", row)
+        self._db.execute("DELETE FROM recipes WHERE id = ?", row)
+        return 1
+
+    def _commit(self, changes: int):
+        """Persist changes, bump the version and reset derived data"""
+        if changes:
+            self._set_meta("corpus_hash", None)
+            self.version += 1
+            self._sorted_names = None
+        self._db.commit()
+
+    @staticmethod
+    def _recipe(row) -> Recipe:
+        name, title, ingredients, instructions, notes, tags = row
+        return Recipe(name, title, tuple(json.loads(ingredients)), tuple(json.loads(instructions)), notes,
+                      tuple(json.loads(tags)))
+
+    def get(self, name: str):
+        """Return the Recipe for a file name, or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT name, title, ingredients, instructions, notes, tags FROM recipes WHERE name = ?",
+                (name,)).fetchone()
+        return self._recipe(row) if row else None
+
+    def read_text(self, name: str):
+        """Raw markdown of a stored recipe, read from its file, or None"""
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM recipes WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        try:
+            with open(os.path.join(self.recipes_dir, name), "rb") as f:
+                return f.read().decode("utf-8", errors="replace")
+        except OSError:
+            return None
+
+    def names(self) -> list:
+        """Return stored file names in sorted order"""
+        with self._lock:
+            if self._sorted_names is None:
+                self._sorted_names = [name for (name,) in self._db.execute("SELECT name FROM recipes ORDER BY name")]
+            return self._sorted_names
+
+    def corpus_hash(self) -> str:
+        """Content hash of the whole corpus (same value RecipeIndex gives), persisted across restarts"""
+        with self._lock:
+            cached = self._meta("corpus_hash")
+            if cached:
+                return cached
+            digest = hashlib.sha1()
+            for name, sha1 in self._db.execute("SELECT name, sha1 FROM recipes ORDER BY name"):
+                digest.update(f"{name}\0{sha1}\n".encode("utf-8"))
+            value = digest.hexdigest()
+            self._set_meta("corpus_hash", value)
+            self._db.commit()
+            return value
+
+    def recipes(self):
+        """Iterate over every stored recipe, in name order, without loading them all at once"""
+        last = ""
+        while True:
+            # Keyset paging: each page seeks on the name index instead of skipping every earlier row
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT name, title, ingredients, instructions, notes, tags FROM recipes "
+                    "WHERE name > ? ORDER BY name LIMIT ?", (last, self.batch_size)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._recipe(row)
+            last = rows[-1][0]
+
+    def top_k(self, query: str, k: int = 5) -> list:
+        """Return up to k (name, score) pairs ranked by field-weighted FTS5 BM25"""
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return []
+        match = " OR ".join(_fts_phrase(term) for term in terms)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT r.name, -bm25(recipes_fts, {BM25_WEIGHTS}) AS score "
+                "FROM recipes_fts JOIN recipes r ON r.id = recipes_fts.rowid "
+                "WHERE recipes_fts MATCH ? ORDER BY score DESC, r.name LIMIT ?", (match, k)).fetchall()
+        return [(name, float(score)) for name, score in rows]
+
+    def search(self, query: str, k: int = 5) -> list:
+        """Return up to k Recipes ranked by relevance to the query"""
+        return [self.get(name) for name, _ in self.top_k(query, k)]
+
+    def find_recipe(self, name: str):
+        """Find a recipe by title or file name, requiring every word of the name to appear in the title"""
+        terms = tokenize(name) or name.lower().split()
+        if not terms:
+            return None
+        stem = name.strip().lower()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT name FROM recipes WHERE lower(title) = ? OR lower(name) IN (?, ?) LIMIT 1",
+                (stem, stem, f"{stem}.md")).fetchone()
+            if row is None:
+                match = " AND ".join(f"title : {_fts_phrase(term)}" for term in terms)
+                row = self._db.execute(
+                    "SELECT r.name FROM recipes_fts JOIN recipes r ON r.id = recipes_fts.rowid "
+                    "WHERE recipes_fts MATCH ? ORDER BY length(r.title), r.name LIMIT 1", (match,)).fetchone()
+        return self.get(row[0]) if row else None
+
+    def containing(self, items: list, limit: int = None) -> list:
+        """Names of recipes whose ingredients mention every item (each a list of words)"""
+        clauses = []
+        for words in items:
+            phrase = " ".join(_fts_phrase(word) for word in words)
+            clauses.append(f"ingredients : ({phrase})" if len(words) > 1 else f"ingredients : {phrase}")
+        if not clauses:
+            return []
+        query = ("SELECT r.name FROM recipes_fts JOIN recipes r ON r.id = recipes_fts.rowid "
+                 "WHERE recipes_fts MATCH ? ORDER BY r.name")
+        params = [" AND ".join(clauses)]
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return [name for (name,) in self._db.execute(query, params)]
+
+    def pantry_matches(self, pantry, k: int = 5, min_coverage: float = 0.0) -> list:
+        """Top recipes for a pantry, ranked like PantryMatcher.best_matches but from the ingredient table"""
+        terms = sorted(set(normalize_pantry(pantry)))
+        if not terms:
+            return []
+        placeholders = ", ".join("?" * len(terms))
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT r.id, r.name, COUNT(*) AS have, r.ingredient_count AS total "
+                f"FROM ingredients i JOIN recipes r ON r.id = i.recipe WHERE i.term IN ({placeholders}) "
+                "GROUP BY r.id HAVING CAST(have AS REAL) / total >= ? "
+                "ORDER BY CAST(have AS REAL) / total DESC, total - have, r.name LIMIT ?",
+                (*terms, min_coverage, k)).fetchall()
+            matches = []
+            for recipe_id, name, have, total in rows:
+                missing = [term for (term,) in self._db.execute(
+                    f"SELECT term FROM ingredients WHERE recipe = ? AND term NOT IN ({placeholders}) ORDER BY position",
+                    (recipe_id, *terms))]
+                matches.append({"name": name, "coverage": have / total, "have": have, "missing": total - have,
+                                "missing_ingredients": missing})
+        return matches
+
+    def close(self):
+        with self._lock:
+            self._db.close()
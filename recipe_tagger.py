@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Sage Recipe Tagger - Batched LLM tagging of recipes against a taxonomy
+
+Several recipes go into each request, returned tags are validated against the taxonomy locally, and
+results are cached by recipe content hash + prompt version so unchanged recipes are never re-tagged.
+Requests run concurrently through LLMRouter, so several backends share the work.
+
+Usage: python recipe_tagger.py <recipes_dir> [--backend URL ...] [--batch-size N] [--output tags.json]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from llm_router import LLMRouter, LLMUnavailable
+from recipe_paths import cache_path
+
+# Bump when the prompt or response format changes: every cached result becomes stale
+PROMPT_VERSION = "1"
+CACHE_VERSION = 1
+
+DEFAULT_TAXONOMY = {
+    "cuisine": ["american", "chinese", "french", "indian", "italian", "japanese", "mediterranean",
+                "mexican", "middle-eastern", "thai"],
+    "diet": ["vegan", "vegetarian", "gluten-free", "dairy-free", "nut-free", "low-carb"],
+    "course": ["breakfast", "lunch", "dinner", "appetizer", "side", "dessert", "snack", "drink"],
+    "method": ["baked", "roasted", "grilled", "fried", "slow-cooked", "no-cook", "one-pot"],
+    "time": ["quick", "make-ahead"],
+    "flavor": ["creamy", "crispy", "spicy", "sweet", "savory"],
+}
+
+SYSTEM_PROMPT = """You are a culinary librarian. Tag each recipe using ONLY tags from this taxonomy:
+{taxonomy}
+
+Reply with JSON only, in this shape: {{"recipes": [{{"id": "r1", "tags": ["tag", ...]}}, ...]}}
+Include every recipe id exactly once. Use only tags that clearly apply."""
+
+MAX_INGREDIENTS = 25
+MAX_INSTRUCTION_CHARS = 400
+
+
+def normalize_tag(tag: str) -> str:
+    """Lowercase, drop '#' and a "category:" prefix, hyphenate spaces"""
+    tag = str(tag).strip().lower().lstrip("#")
+    if ":" in tag:
+        tag = tag.split(":", 1)[1]
+    return "-".join(tag.replace("_", " ").split())
+
+
+def taxonomy_tags(taxonomy: dict) -> frozenset:
+    """Every allowed tag in a {category: [tags]} taxonomy"""
+    return frozenset(normalize_tag(tag) for tags in taxonomy.values() for tag in tags)
+
+
+def validate_tags(tags, allowed: frozenset):
+    """Split model output into (valid tags in order, rejected tags)"""
+    valid, rejected = [], []
+    if not isinstance(tags, list):
+        tags = [tags] if tags else []
+    for tag in tags:
+        tag = normalize_tag(tag)
+        if tag in allowed:
+            if tag not in valid:
+                valid.append(tag)
+        elif tag:
+            rejected.append(tag)
+    return valid, rejected
+
+
+def recipe_hash(recipe) -> str:
+    """Hash of the parsed content the model sees (independent of the file name)"""
+    components = recipe.to_dict()
+    components.pop("name", None)
+    return hashlib.sha256(json.dumps(components, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def render_recipe(recipe_id: str, recipe) -> str:
+    """Compact prompt text for one recipe"""
+    lines = [f"[{recipe_id}] {recipe.title}"]
+    if recipe.ingredients:
+        lines.append("Ingredients: " + "; ".join(recipe.ingredients[:MAX_INGREDIENTS]))
+    if recipe.instructions:
+        lines.append("Method: " + " ".join(recipe.instructions)[:MAX_INSTRUCTION_CHARS])
+    if recipe.tags:
+        lines.append("Existing tags: " + ", ".join(recipe.tags))
+    return "\n".join(lines)
+
+
+def parse_response(text: str) -> dict:
+    """Map recipe id -> raw tags from a reply; tolerates prose or code fences around the JSON"""
+    decoder = json.JSONDecoder()
+    start = text.find("{")
+    while start != -1:
+        try:
+            data, _ = decoder.raw_decode(text, start)
+        except ValueError:
+            start = text.find("{", start + 1)
+            continue
+        if isinstance(data, dict):
+            items = data.get("recipes")
+            if isinstance(items, list):
+                return {str(item.get("id")): item.get("tags") for item in items if isinstance(item, dict)}
+            return {str(key): value for key, value in data.items() if isinstance(value, list)}
+        start = text.find("{", start + 1)
+    return {}
+
+
+def default_cache_path(recipes_dir: str) -> str:
+    """Per-user cache location for a vault's tags, so read-only and shared vaults work"""
+    return cache_path(recipes_dir, "-tags.json")
+
+
+class TagCache:
+    """Tag results keyed on content hash, prompt version, taxonomy and model, persisted atomically"""
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self.entries = {}
+        self.dirty = 0
+        if path:
+            try:
+                with open(path, "r") as f:
+                    data = json.load(f)
+                if data.get("version") == CACHE_VERSION:
+                    self.entries = data.get("entries", {})
+            except (OSError, ValueError):
+                pass
+
+    def get(self, key: str):
+        entry = self.entries.get(key)
+        return entry["tags"] if entry else None
+
+    def put(self, key: str, tags: list):
+        self.entries[key] = {"tags": tags, "tagged_at": time.time()}
+        self.dirty += 1
+
+    def save(self):
+        """Atomically write the cache"""
+        if not self.path or not self.dirty:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": CACHE_VERSION, "entries": self.entries}, f)
+        os.replace(tmp_path, self.path)
+        self.dirty = 0
+
+
+class RecipeTagger:
+    """Tags recipes in batches over one or more LLM backends"""
+
+    def __init__(self, llm: LLMRouter, taxonomy: dict = None, cache_path: str = None, model: str = "local-model",
+                 batch_size: int = 8, max_batch_chars: int = 6000, per_backend: int = 2,
+                 structured: bool = True):
+        self.llm = llm
+        self.taxonomy = taxonomy or DEFAULT_TAXONOMY
+        self.allowed = taxonomy_tags(self.taxonomy)
+        self.model = model
+        self.batch_size = batch_size
+        self.max_batch_chars = max_batch_chars
+        # LM Studio and most OpenAI-compatible servers honour a JSON schema; turn off for ones that reject it
+        self.structured = structured
+        self.slots = asyncio.Semaphore(per_backend * len(llm.backends))
+        self.cache = TagCache(cache_path)
+        self.system_prompt = SYSTEM_PROMPT.format(taxonomy="\n".join(
+            f"- {category}: {', '.join(tags)}" for category, tags in self.taxonomy.items()))
+        # Cache keys change with the prompt, the taxonomy or the model
+        self._key_prefix = hashlib.sha256(
+            f"{PROMPT_VERSION}\0{self.system_prompt}\0{model}".encode("utf-8")).hexdigest()[:16]
+        self.counts = {"cached": 0, "tagged": 0, "failed": 0, "requests": 0, "rejected_tags": 0}
+
+    def cache_key(self, recipe) -> str:
+        return f"{self._key_prefix}:{recipe_hash(recipe)}"
+
+    def batches(self, recipes: list) -> list:
+        """Group recipes by count and prompt size"""
+        batches, batch, size = [], [], 0
+        for recipe in recipes:
+            length = len(render_recipe("r00", recipe))
+            if batch and (len(batch) >= self.batch_size or size + length > self.max_batch_chars):
+                batches.append(batch)
+                batch, size = [], 0
+            batch.append(recipe)
+            size += length
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _request(self, batch: list) -> dict:
+        """Completion arguments for one batch"""
+        prompt = "\n\n".join(render_recipe(f"r{i}", recipe) for i, recipe in enumerate(batch, 1))
+        kwargs = {
+            "model": self.model,
+            "messages": [{"role": "system", "content": self.system_prompt},
+                         {"role": "user", "content": f"Tag these {len(batch)} recipes:\n\n{prompt}"}],
+            "temperature": 0,
+            "max_tokens": 64 + 48 * len(batch),
+        }
+        if self.structured:
+            kwargs["response_format"] = {"type": "json_schema", "json_schema": {"name": "recipe_tags", "schema": {
+                "type": "object",
+                "properties": {"recipes": {"type": "array", "items": {
+                    "type": "object",
+                    "properties": {"id": {"type": "string"},
+                                   "tags": {"type": "array", "items": {"type": "string", "enum": sorted(self.allowed)}}},
+                    "required": ["id", "tags"]}}},
+                "required": ["recipes"]}}}
+        return kwargs
+
+    async def _tag_batch(self, batch: list, results: dict, retry: bool = True):
+        """Tag one batch; recipes the reply left out are retried once on their own"""
+        async with self.slots:
+            self.counts["requests"] += 1
+            try:
+                response = await self.llm.create(**self._request(batch))
+                replies = parse_response(response.choices[0].message.content or "")
+            except (LLMUnavailable, *self.llm_errors()) as e:
+                print(f"⚠️ Tagging request failed for {len(batch)} recipes: {e}")
+                replies = {}
+
+        missing = []
+        for i, recipe in enumerate(batch, 1):
+            tags = replies.get(f"r{i}")
+            if tags is None:
+                missing.append(recipe)
+                continue
+            valid, rejected = validate_tags(tags, self.allowed)
+            self.counts["rejected_tags"] += len(rejected)
+            self.counts["tagged"] += 1
+            self.cache.put(self.cache_key(recipe), valid)
+            results[recipe.name] = valid
+
+        if missing and retry and len(batch) > 1:
+            await asyncio.gather(*[self._tag_batch([recipe], results, retry=False) for recipe in missing])
+        else:
+            self.counts["failed"] += len(missing)
+
+    @staticmethod
+    def llm_errors() -> tuple:
+        """Errors that fail a batch rather than the whole run"""
+        import openai
+        return (openai.OpenAIError,)
+
+    async def tag_recipes(self, recipes) -> dict:
+        """Return {recipe name: validated tags}, asking the model only about recipes not already cached"""
+        results = {}
+        pending = []
+        for recipe in recipes:
+            tags = self.cache.get(self.cache_key(recipe))
+            if tags is None:
+                pending.append(recipe)
+            else:
+                self.counts["cached"] += 1
+                results[recipe.name] = tags
+        try:
+            await asyncio.gather(*[self._tag_batch(batch, results) for batch in self.batches(pending)])
+        finally:
+            self.cache.save()
+        return results
+
+    async def tag_index(self, index) -> dict:
+        """Tag every recipe in a RecipeIndex or RecipeStore"""
+        index.refresh()
+        return await self.tag_recipes(index.recipes())
+
+    def stats(self) -> dict:
+        return dict(self.counts, llm=self.llm.stats())
+
+
+async def run(args):
+    from recipe_index import RecipeIndex
+    taxonomy = None
+    if args.taxonomy:
+        with open(args.taxonomy, "r") as f:
+            taxonomy = json.load(f)
+    llm = LLMRouter(args.backend or ["http://localhost:1234/v1"], probe_interval=0)
+    tagger = RecipeTagger(llm, taxonomy, args.cache or default_cache_path(args.recipes_dir),
+                          model=args.model, batch_size=args.batch_size, per_backend=args.per_backend,
+                          structured=not args.no_schema)
+    started = time.perf_counter()
+    try:
+        results = await tagger.tag_index(RecipeIndex(args.recipes_dir))
+    finally:
+        await llm.close()
+    counts = tagger.counts
+    print(f"🌿 Tagged {counts['tagged']} recipes ({counts['cached']} cached, {counts['failed']} failed) in "
+          f"{counts['requests']} requests, {time.perf_counter() - started:.1f}s")
+    if counts["rejected_tags"]:
+        print(f"⚠️ Dropped {counts['rejected_tags']} tags outside the taxonomy")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(dict(sorted(results.items())), f, indent=2)
+        print(f"💾 Tags saved to {args.output}")
+    return 1 if counts["failed"] else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tag recipes against a taxonomy with batched LLM requests")
+    parser.add_argument("recipes_dir")
+    parser.add_argument("--backend", action="append", default=None, help="OpenAI-compatible base URL (repeatable)")
+    parser.add_argument("--model", default="local-model")
+    parser.add_argument("--taxonomy", default=None, help='JSON file of {"category": ["tag", ...]}')
+    parser.add_argument("--cache", default=None, help="Tag cache (default: under $XDG_CACHE_HOME/sage, outside the vault)")
+    parser.add_argument("--batch-size", type=int, default=8, help="Recipes per request")
+    parser.add_argument("--per-backend", type=int, default=2, help="Concurrent requests per backend")
+    parser.add_argument("--no-schema", action="store_true", help="Don't send a JSON schema response_format")
+    parser.add_argument("--output", default=None, help="Write {recipe: tags} JSON here")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Sage Recipe Watcher - Pushes filesystem changes into a RecipeIndex in the background
+
+Uses inotify on Linux and falls back to periodic polling elsewhere.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def _load_inotify():
+    """Return libc with inotify bound, or None when unavailable"""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+def parse_events(buffer: bytes):
+    """Yield (mask, name) for each inotify event in a read buffer"""
+    offset = 0
+    while offset + EVENT_HEADER.size <= len(buffer):
+        _, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+        offset += EVENT_HEADER.size
+        name = buffer[offset:offset + length].rstrip(b"\0").decode("utf-8", errors="surrogateescape")
+        offset += length
+        yield mask, name
+
+
+class RecipeWatcher:
+    """Keeps a RecipeIndex current from add/modify/delete/rename events so queries never scan the directory"""
+
+    def __init__(self, index, poll_interval: float = 2.0, use_inotify: bool = True):
+        self.index = index
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.backend = None
+        self.events = 0
+        self._fd = None
+        self._stop = threading.Event()
+        self._wake_r, self._wake_w = os.pipe()
+        self._thread = None
+
+    def start(self):
+        """Sync the index once, then watch in a daemon thread"""
+        self.index.refresh()
+        libc = _load_inotify() if self.use_inotify else None
+        if libc is not None:
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0 and libc.inotify_add_watch(fd, os.fsencode(self.index.recipes_dir), WATCH_MASK) >= 0:
+                self._fd = fd
+            elif fd >= 0:
+                os.close(fd)
+
+        self.backend = "inotify" if self._fd is not None else "polling"
+        target = self._watch_inotify if self._fd is not None else self._watch_polling
+        self._thread = threading.Thread(target=target, name="sage-recipe-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop watching and release the inotify descriptor"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        os.write(self._wake_w, b"x")
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        for fd in (self._wake_r, self._wake_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def _watch_inotify(self):
+        """Apply batches of inotify events; full refresh if the kernel queue overflowed"""
+        while not self._stop.is_set():
+            readable, _, _ = select.select([self._fd, self._wake_r], [], [])
+            if self._stop.is_set():
+                return
+            if self._fd not in readable:
+                continue
+            try:
+                buffer = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+
+            changed = set()
+            rescan = False
+            watch_lost = False
+            for mask, name in parse_events(buffer):
+                self.events += 1
+                if mask & IN_Q_OVERFLOW:
+                    rescan = True
+                elif mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                    watch_lost = True
+                elif name:
+                    changed.add(name)
+
+            if watch_lost:
+                # The watched directory itself was moved or deleted: keep the index current by polling instead
+                self.index.refresh()
+                self.backend = "polling"
+                self._watch_polling()
+                return
+            if rescan:
+                self.index.refresh()
+            elif changed:
+                self.index.apply_changes(changed)
+
+    def _watch_polling(self):
+        """Refresh the index periodically off the query path"""
+        while not self._stop.wait(self.poll_interval):
+            self.index.refresh()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Sage Response Cache - LRU + TTL cache of chat answers with optional disk persistence
+"""
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+
+
+def normalize_message(message: str) -> str:
+    """Normalize a user message so trivially different phrasings share a key"""
+    text = re.sub(r"\s+", " ", message.strip().lower())
+    return text.rstrip("?!. ")
+
+
+def make_key(message: str, corpus_hash: str, system_prompt: str) -> str:
+    """Build a cache key from the normalized message, corpus hash and system prompt"""
+    prompt_hash = hashlib.sha1(system_prompt.encode("utf-8")).hexdigest()
+    raw = "\0".join((normalize_message(message), corpus_hash, prompt_hash))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU cache of responses with per-entry TTL, tagged with the corpus version they came from"""
+
+    def __init__(self, max_entries: int = 256, ttl: float = 24 * 3600, path: str = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        if path:
+            self._load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str):
+        """Return the cached response for key, or None if missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None or time.time() - entry["created"] > self.ttl:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry["response"]
+
+    def put(self, key: str, response: str, corpus_hash: str):
+        """Store a response and evict the least recently used entries over the limit"""
+        self._entries[key] = {"response": response, "corpus": corpus_hash, "created": time.time()}
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._save()
+
+    def invalidate(self, corpus_hash: str) -> int:
+        """Drop entries built from any corpus other than corpus_hash"""
+        stale = [key for key, entry in self._entries.items() if entry["corpus"] != corpus_hash]
+        for key in stale:
+            del self._entries[key]
+        if stale:
+            self._save()
+        return len(stale)
+
+    def clear(self):
+        """Drop every entry"""
+        self._entries.clear()
+        self._save()
+
+    def _load(self):
+        """Load unexpired entries from the persistence file"""
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        # Entries are stored least recently used first
+        for key, entry in list(data.items())[-self.max_entries:]:
+            if now - entry["created"] <= self.ttl:
+                self._entries[key] = entry
+
+    def _save(self):
+        """Atomically write entries (in LRU order) to the persistence file"""
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
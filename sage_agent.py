@@ -4,23 +4,86 @@ Sage Agent - Clean Direct Implementation
 """
 import json
 import asyncio
+import contextlib
 import subprocess
 import os
-from openai import OpenAI
+import time
+from llm_router import LLMRouter
+from recipe_index import RecipeIndex
+from recipe_search import RecipeSearch
+from recipe_store import RecipeStore
+from response_cache import ResponseCache, make_key
+from context_packer import ContextPacker, estimate_tokens
+from intent_router import IntentRouter
+from recipe_watcher import RecipeWatcher
+from metrics import NULL_TRACE, NullRecorder
+from budgets import BudgetPolicy, Deadline, RequestCancelled, stream_until
+from recipe_paths import resolve_in_root
+from recipe_sections import read_section, section_names
+from single_flight import SingleFlight, prompt_key
+
+DEFAULT_RECIPES_DIR = os.environ.get("SAGE_RECIPES_DIR", "/Users/josh/Rose/sage/test-recipes")
+
+SYSTEM_PROMPT = """You are Sage, a culinary AI assistant. 
+
+CRITICAL RULES:
+1. ONLY use information from the Tool Results section below
+2. NEVER invent, make up, or hallucinate any recipes or ingredients
+3. If the user asks about recipes not in the Tool Results, say you don't have that recipe in the collection
+4. For ingredient matching, ONLY check the actual ingredients listed in the recipes shown
+5. Be honest about limitations - don't create content that doesn't exist in the files
+
+The only recipe data you have access to is shown in the Tool Results below."""
+
+_NO_LIMIT = contextlib.nullcontext()
+
 
 class SageAgent:
     """Clean culinary AI agent using direct file operations"""
     
-    def __init__(self):
-        self.client = OpenAI(
-            base_url="http://localhost:1234/v1",
-            api_key="lm-studio"
-        )
-        self.recipes_dir = "/Users/josh/Rose/sage/test-recipes"
+    def __init__(self, recipes_dir: str = DEFAULT_RECIPES_DIR, max_context_recipes: int = 10,
+                 context_budget: int = 3000,
+                 base_url: str = "http://localhost:1234/v1", max_concurrency: int = 4, timeout: float = 900.0,
+                 cache_size: int = 256, cache_ttl: float = 24 * 3600, cache_path: str = None,
+                 fast_path: bool = True, watch: bool = False, metrics=None,
+                 backends: list = None, hedge_after: float = None, store: bool = False, store_path: str = None,
+                 budgets: dict = None, llm: LLMRouter = None, llm_slots: asyncio.Semaphore = None,
+                 max_requests: int = None, pool=None):
+        # One pooled client per backend; each completion goes to the healthy one with the least in flight.
+        # Tenants of one process pass in a shared router and slots (tenants.TenantRegistry)
+        self._owns_llm = llm is None
+        self.llm = llm or LLMRouter(backends or [base_url], timeout=timeout, hedge_after=hedge_after)
+        # Caps in-flight generations to what the backends can serve (max_concurrency each)
+        self.llm_slots = llm_slots or asyncio.Semaphore(max_concurrency * len(self.llm.backends))
+        # This agent's own share of those slots (a tenant's quota), if limited
+        self.request_slots = asyncio.Semaphore(max_requests) if max_requests else None
+        self.recipes_dir = recipes_dir
+        self.max_context_recipes = max_context_recipes
+        # store=True keeps recipes and their full-text index in SQLite instead of memory (large vaults)
+        self.index = RecipeStore(recipes_dir, store_path) if store else RecipeIndex(recipes_dir, pool)
+        # With watch=True a background watcher keeps the index current and queries never scan the directory
+        self.watcher = RecipeWatcher(self.index).start() if watch else None
+        self._index_version = None
+        # BM25 over parsed fields picks the context; rebuilt only when the index changes
+        self.search = self.index if store else RecipeSearch(self.index)
+        # Bounds the Tool Results block so prefill cost stays flat as the collection grows
+        self.packer = ContextPacker(context_budget)
+        # Listing, named-recipe ingredients and "which recipes contain X" are answered without the LLM
+        self.router = IntentRouter(self.index) if fast_path else None
+        # Answers keyed on normalized message + corpus hash + system prompt (cache_size=0 disables)
+        self.cache = ResponseCache(cache_size, cache_ttl, cache_path) if cache_size else None
+        # Concurrent requests with the same assembled prompt share one generation
+        self.flights = SingleFlight()
+        # Per-stage spans for every turn (metrics.build_recorder); the default recorder does nothing
+        self.metrics = metrics or NullRecorder()
+        # max_tokens and deadline per query class (budgets.DEFAULT_BUDGETS, overridable per class)
+        self.budgets = BudgetPolicy(budgets)
         
     def list_directory(self, path: str = None) -> str:
         """List files in directory"""
-        target_path = path or self.recipes_dir
+        target_path = resolve_in_root(self.recipes_dir, path or self.recipes_dir)
+        if target_path is None:
+            return f"Error: {path} is outside the recipes directory"
         try:
             if os.path.exists(target_path):
                 files = os.listdir(target_path)
@@ -30,15 +93,18 @@ class SageAgent:
         except Exception as e:
             return f"Error listing directory: {e}"
             
-    def read_file(self, path: str) -> str:
-        """Read file contents"""
+    def read_file(self, path: str, section: str = None) -> str:
+        """Read file contents, or just one section ("ingredients", "instructions", ...)"""
+        full_path = resolve_in_root(self.recipes_dir, path)
+        if full_path is None:
+            return f"Error: {path} is outside the recipes directory"
         try:
-            # Handle relative paths
-            if not path.startswith('/'):
-                full_path = os.path.join(self.recipes_dir, path)
-            else:
-                full_path = path
-                
+            if section and os.path.exists(full_path):
+                content = self._read_section(full_path, section)
+                if content is None:
+                    return (f"No {section} section in {os.path.basename(full_path)} "
+                            f"(sections: {', '.join(section_names(full_path))})")
+                return f"Content of {os.path.basename(full_path)}:\n{content}"
             if os.path.exists(full_path):
                 with open(full_path, 'r') as f:
                     content = f.read()
@@ -48,51 +114,188 @@ class SageAgent:
         except Exception as e:
             return f"Error reading file: {e}"
             
-    async def chat(self, message: str) -> str:
-        """Process chat message with automatic tool calling"""
+    def _read_section(self, full_path: str, section: str):
+        """Read one section, using the index's byte offsets for indexed recipes"""
+        name = os.path.basename(full_path)
+        in_index = os.path.dirname(full_path) == os.path.realpath(self.recipes_dir)
+        if in_index and hasattr(self.index, "read_section") and self.index.get(name) is not None:
+            return self.index.read_section(name, section)
+        return read_section(full_path, section)
+            
+    def build_context(self, message: str, trace=NULL_TRACE) -> str:
+        """Assemble the Tool Results block for a message from the recipe index"""
+        names = self.index.names()
+        
+        # Ranked recipes relevant to the query, or the first recipe as a sample
+        with trace.span("search"):
+            recipes = self.search.search(message, self.max_context_recipes)
+            if not recipes and names:
+                recipes = [self.index.get(names[0])]
+            
+        with trace.span("pack"):
+            return self.packer.pack(message, os.path.basename(self.recipes_dir), names, recipes)
+        
+    async def chat_stream(self, message: str, deadline: float = None, cancel_event: asyncio.Event = None,
+                          timing: dict = None):
+        """Stream the reply to a chat message token by token
+
+        Generation stops, and the backend stream is closed, when the query class's deadline (or the caller's,
+        if shorter) passes, when cancel_event is set, or when the caller stops reading. Pass a dict as timing
+        to have this call's timings filled in when the stream ends.
+        """
+        started = time.perf_counter()
+        first_token = None
+        timing = {} if timing is None else timing
+        trace = self.metrics.start_trace("sage_agent")
         
-        # Always gather file information for ANY query
-        message_lower = message.lower()
-        tool_results = []
+        # Pick up added, changed or deleted recipes (only changed files are re-parsed)
+        with trace.span("refresh"):
+            if self.watcher is None:
+                self.index.refresh()
+            changed = self.index.version != self._index_version
+            self._index_version = self.index.version
+            corpus_hash = self.index.corpus_hash()
+            if changed and self.cache is not None:
+                self.cache.invalidate(corpus_hash)
         
-        # Always list directory for recipe-related queries
-        dir_result = self.list_directory()
-        tool_results.append(f"Directory listing: {dir_result}")
+        if self.router is not None:
+            with trace.span("route"):
+                answer = self.router.route(message)
+            if answer is not None:
+                timing.update(first_token=0.0, total=time.perf_counter() - started, cached=False, routed=True)
+                trace.finish(routed=True)
+                yield answer
+                return
         
-        # Always read sample recipe for comprehensive context
-        file_result = self.read_file("sample-recipe.md")
-        tool_results.append(f"Sample recipe: {file_result}")
+        cache_key = None
+        if self.cache is not None:
+            with trace.span("cache_lookup"):
+                cache_key = make_key(message, corpus_hash, SYSTEM_PROMPT)
+                cached = self.cache.get(cache_key)
+            trace.set(cache_hit=cached is not None)
+            if cached is not None:
+                timing.update(first_token=0.0, total=time.perf_counter() - started, cached=True, routed=False)
+                trace.finish(routed=False)
+                yield cached
+                return
+        
+        context = self.build_context(message, trace)
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": f"{message}{context}"}
+        ]
+        budget = self.budgets.for_message(message)
+        seconds = budget.deadline if deadline is None else min(deadline, budget.deadline)
+        trace.set(query_class=budget.query_class)
+        tokens = []
+        # Filled in by whichever call generates; a call that joins an identical one gets a copy
+        generation = {}
+        flight_key = prompt_key("local-model", messages, max_tokens=budget.max_tokens)
+        flight = self.flights.stream(flight_key, lambda: self._generate(messages, generation, budget.max_tokens),
+                                     generation)
+        
+        stream = stream_until(flight, Deadline(seconds), cancel_event)
+        try:
+            async for token in stream:
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                tokens.append(token)
+                yield token
+                        
+            if cache_key and tokens:
+                self.cache.put(cache_key, "".join(tokens), corpus_hash)
+                        
+        except RequestCancelled:
+            trace.set(cancelled=True)
+        except Exception as e:
+            trace.set(error=str(e))
+            yield f"Error: {e}"
+        finally:
+            # Closes the flight too, so a joined call's generation has been copied before it is read
+            await stream.aclose()
             
-        context = f"\n\nTool Results:\n" + "\n".join(tool_results)
+        coalesced = generation.get("coalesced", False)
+        self._add_generation_spans(trace, generation)
+        timing.update(
+            first_token=first_token,
+            total=time.perf_counter() - started,
+            cached=False,
+            routed=False,
+            coalesced=coalesced,
+            query_class=budget.query_class
+        )
+        
+        if self.metrics.enabled:
+            decode_seconds = timing["total"] - first_token if first_token is not None else 0.0
+            usage = generation.get("usage")
+            completion_tokens = usage.completion_tokens if usage else len(tokens)
+            trace.finish(
+                routed=False,
+                coalesced=coalesced,
+                first_token=first_token,
+                prompt_tokens=usage.prompt_tokens if usage else sum(estimate_tokens(m["content"]) for m in messages),
+                completion_tokens=completion_tokens,
+                tokens_estimated=usage is None,
+                tokens_per_second=completion_tokens / decode_seconds if decode_seconds > 0 else None
+            )
             
-        system_prompt = """You are Sage, a culinary AI assistant. 
+    async def _generate(self, messages: list, generation: dict, max_tokens: int = None):
+        """Stream one completion under the concurrency limit (shared by every coalesced waiter)
 
-CRITICAL RULES:
-1. ONLY use information from the Tool Results section below
-2. NEVER invent, make up, or hallucinate any recipes or ingredients
-3. If the user asks about recipes not in the Tool Results, say "I only have access to the sample-recipe.md file"
-4. For ingredient matching, ONLY check the actual ingredients listed in the sample recipe
-5. Be honest about limitations - don't create content that doesn't exist in the files
-
-The only recipe data you have access to is shown in the Tool Results below."""
-
-        try:
-            response = self.client.chat.completions.create(
+        Queue, first-token and finish times and the usage report are recorded in generation.
+        """
+        generation["queued"] = time.perf_counter()
+        async with self.request_slots or _NO_LIMIT, self.llm_slots:
+            generation["sent"] = time.perf_counter()
+            # Ask for exact token counts only when someone is recording them
+            extra = {"stream_options": {"include_usage": True}} if self.metrics.enabled else {}
+            if max_tokens is not None:
+                extra["max_tokens"] = max_tokens
+            stream = await self.llm.create(
                 model="local-model",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"{message}{context}"}
-                ]
+                messages=messages,
+                stream=True,
+                **extra
             )
+            try:
+                async for chunk in stream:
+                    if getattr(chunk, "usage", None):
+                        generation["usage"] = chunk.usage
+                    if not chunk.choices:
+                        continue
+                    token = chunk.choices[0].delta.content
+                    if token:
+                        generation.setdefault("first_token_at", time.perf_counter())
+                        yield token
+            finally:
+                # Closing the relay hands the backend back and drops the HTTP stream, even if we stopped early
+                await stream.aclose()
+                generation["finished"] = time.perf_counter()
             
-            return response.choices[0].message.content
-                
-        except Exception as e:
-            return f"Error: {e}"
+    def _add_generation_spans(self, trace, generation: dict):
+        """Queue, prefill and decode spans of the generation this call was answered from"""
+        if "sent" not in generation:
+            return
+        trace.add_span("queue", generation["queued"], generation["sent"])
+        first_token_at = generation.get("first_token_at")
+        if first_token_at is not None:
+            trace.add_span("prefill", generation["sent"], first_token_at)
+            if "finished" in generation:
+                trace.add_span("decode", first_token_at, generation["finished"])
+            
+    async def chat(self, message: str, timing: dict = None) -> str:
+        """Process chat message with automatic tool calling"""
+        return "".join([token async for token in self.chat_stream(message, timing=timing)])
             
     async def cleanup(self):
         """Clean up resources"""
-        pass  # No resources to clean up with direct file operations
+        if self.watcher is not None:
+            self.watcher.stop()
+        if isinstance(self.index, RecipeStore):
+            self.index.close()
+        if self._owns_llm:
+            await self.llm.close()
+        self.metrics.close()
             
     async def run_interactive(self):
         """Run interactive chat loop"""
@@ -107,12 +310,19 @@ The only recipe data you have access to is shown in the Tool Results below."""
                     break
                     
                 print("Sage: ", end="", flush=True)
-                response = await self.chat(user_input)
-                print(response)
+                timing = {}
+                async for token in self.chat_stream(user_input, timing=timing):
+                    print(token, end="", flush=True)
+                print()
+                
+                if timing.get("first_token") is not None:
+                    print(f"⏱️  First token {timing['first_token']:.1f}s, total {timing['total']:.1f}s")
                 
         except KeyboardInterrupt:
             print("\n🌿 Sage Agent stopped")
         finally:
+            if self.router is not None:
+                print(f"📊 Queries by path: {self.router.stats()}")
             await self.cleanup()
 
 async def main():
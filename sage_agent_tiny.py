@@ -4,15 +4,96 @@ Sage Agent - Using Hugging Face tiny-agents with MCP
 """
 import json
 import asyncio
-from huggingface_hub.inference._mcp.agent import Agent
-from huggingface_hub import MCPClient
+import os
+import time
+from tool_cache import ToolResultCache
+from metrics import NULL_TRACE, NullRecorder, build_recorder
+from context_packer import estimate_tokens
+from budgets import BudgetPolicy, Deadline, DeadlineExceeded, RequestCancelled, stream_until
+from recipe_paths import resolve_in_root
+from recipe_sections import read_section, section_names, section_size
+
+DEFAULT_RECIPES_DIR = os.environ.get("SAGE_RECIPES_DIR", "/Users/josh/Rose/sage/test-recipes")
+
+SYSTEM_PROMPT = """You are Sage, a culinary AI assistant with file access tools.
+
+For recipe questions, follow these patterns:
+1. Specific recipe ingredients (like "Cashew Alfredo ingredients"): call read_file with the recipe path
+2. "What recipes are available": call list_directory on {recipes_dir}  
+3. Recipe search (like "find pasta recipes"): call list_directory first, then read_file on relevant files
+4. Complex analysis (like "quick lunch with protein"): 
+   - First call list_directory to see all options
+   - Then call read_multiple_files with the relevant recipes to analyze ingredients, prep time, etc.
+   - Paths may be relative to the recipes directory
+   - Pass "section" (e.g. "ingredients", "instructions", "notes") to read only that part of each recipe
+   - Compare and recommend based on the user's criteria from actual recipe content
+
+Recipe locations:
+- Cashew Alfredo: {recipes_dir}/sample-recipe.md
+- All recipes: {recipes_dir}/
+
+When you need several files or listings that do not depend on each other, request them all in the same turn instead of one per turn.
+
+For complex queries, read multiple recipe files to analyze and compare ingredients, preparation time, and nutritional content. Always end with clear recommendations like "I recommend [Recipe Name] because [specific reasons from the recipe content]"."""
+
+TOOL_CALL_STARTS = ("{", "[", "```")
+
+
+def parse_tool_calls(text: str) -> list:
+    """Extract every JSON tool call in a model turn as (name, parameters) pairs"""
+    decoder = json.JSONDecoder()
+    calls = []
+    position = 0
+    while True:
+        starts = [i for i in (text.find("{", position), text.find("[", position)) if i >= 0]
+        if not starts:
+            return calls
+        start = min(starts)
+        try:
+            value, position = decoder.raw_decode(text, start)
+        except json.JSONDecodeError:
+            position = start + 1
+            continue
+        if isinstance(value, dict) and isinstance(value.get("tool_calls"), list):
+            value = value["tool_calls"]
+        for item in value if isinstance(value, list) else [value]:
+            if not isinstance(item, dict):
+                continue
+            function = item.get("function") if isinstance(item.get("function"), dict) else item
+            name = function.get("name")
+            parameters = function.get("parameters", function.get("arguments", {}))
+            if isinstance(parameters, str):
+                try:
+                    parameters = json.loads(parameters)
+                except json.JSONDecodeError:
+                    parameters = {}
+            if isinstance(name, str) and isinstance(parameters, dict):
+                calls.append((name, parameters))
+
 
 class SageAgent:
     """Sage culinary AI agent using tiny-agents framework"""
     
-    def __init__(self, config_path: str = "sage_agent_config.json"):
+    def __init__(self, config_path: str = "sage_agent_config.json", tool_cache_bytes: int = 32 * 1024 * 1024,
+                 read_budget_bytes: int = 512 * 1024, read_workers: int = 8,
+                 max_steps: int = None, deadline: float = None, metrics=None, budgets: dict = None):
         self.config_path = config_path
+        self.recipes_dir = DEFAULT_RECIPES_DIR
+        self.read_budget_bytes = read_budget_bytes
+        self.read_workers = read_workers
+        # Fixed limits for every query; when None, the query class's budget decides
+        self.max_steps = max_steps
+        self.deadline = deadline
+        # max_tokens, steps and deadline per query class; built from the config's "budgets" when not given
+        self.budgets = BudgetPolicy(budgets)
+        self._budgets_from_config = budgets is None
         self.agent = None
+        self.tools_loaded = False
+        # Repeated reads of unchanged files within and across turns are served from memory
+        self.tool_cache = ToolResultCache(tool_cache_bytes)
+        # Per-stage spans for every turn; built from the config's "metrics" section when not given
+        self.metrics = metrics or NullRecorder()
+        self._metrics_from_config = metrics is None
         
     async def load_config(self):
         """Load agent configuration"""
@@ -23,6 +104,16 @@ class SageAgent:
     async def initialize(self):
         """Initialize the tiny-agents powered agent"""
         config = await self.load_config()
+        self.tools_loaded = False
+        self.recipes_dir = config.get("recipes_dir", DEFAULT_RECIPES_DIR)
+        if self._metrics_from_config and not self.metrics.enabled:
+            metrics_config = config.get("metrics", {})
+            self.metrics = build_recorder(metrics_config.get("jsonl"), metrics_config.get("prometheus_port"))
+        if self._budgets_from_config:
+            self.budgets = BudgetPolicy(config.get("budgets"))
+        
+        # Deferred: huggingface_hub takes about half a second to import
+        from huggingface_hub.inference._mcp.agent import Agent
         
         # Initialize agent with LM Studio configuration
         self.agent = Agent(
@@ -30,44 +121,108 @@ class SageAgent:
             base_url=config["base_url"],
             api_key=config["api_key"],
             servers=[server_config for server_config in config.get("servers", [])],
-            prompt="""You are Sage, a culinary AI assistant with file access tools.
-
-For recipe questions, follow these patterns:
-1. Specific recipe ingredients (like "Cashew Alfredo ingredients"): call read_file with the recipe path
-2. "What recipes are available": call list_directory on /Users/josh/Rose/sage/test-recipes  
-3. Recipe search (like "find pasta recipes"): call list_directory first, then read_file on relevant files
-4. Complex analysis (like "quick lunch with protein"): 
-   - First call list_directory to see all options
-   - Then call read_file individually on 3-5 relevant recipes to analyze ingredients, prep time, etc.
-   - Use multiple separate read_file calls, not read_multiple_files
-   - Compare and recommend based on the user's criteria from actual recipe content
-
-Recipe locations:
-- Cashew Alfredo: /Users/josh/Rose/sage/test-recipes/sample-recipe.md
-- All recipes: /Users/josh/Rose/sage/test-recipes/
-
-For complex queries, read multiple recipe files to analyze and compare ingredients, preparation time, and nutritional content. Always end with clear recommendations like "I recommend [Recipe Name] because [specific reasons from the recipe content]"."""
+            prompt=SYSTEM_PROMPT.format(recipes_dir=self.recipes_dir.rstrip("/"))
         )
         
         print("🌿 Sage Agent initialized with tiny-agents framework")
         
+    def _read_text(self, path: str, section: str = None):
+        """Read a file, or one section of it, through the tool cache
+
+        Returns None if the file does not exist and "" if it has no such section.
+        """
+        def read():
+            try:
+                if section:
+                    # Large files are memory-mapped and only the section's bytes are decoded
+                    return read_section(path, section) or ""
+                with open(path, 'r') as f:
+                    return f.read()
+            except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+                return None
+        return self.tool_cache.get_or_compute(("read_file", path, section), path, read)
+        
+    def _list_names(self, path: str):
+        """List a directory through the tool cache (None if it does not exist)"""
+        def list_names():
+            try:
+                return ", ".join(os.listdir(path))
+            except (FileNotFoundError, NotADirectoryError):
+                return None
+        return self.tool_cache.get_or_compute(("list_directory", path), path, list_names)
+        
+    def _resolve_recipe_path(self, path: str):
+        """Resolve a tool path against the configured recipes root (None if it points outside it)"""
+        return resolve_in_root(self.recipes_dir, path)
+        
+    async def _read_multiple(self, paths: list, section: str = None) -> str:
+        """Read files (or one section of each) concurrently within a total byte budget, reporting missing or skipped files"""
+        planned = []
+        remaining = self.read_budget_bytes
+        for path in paths:
+            full_path = self._resolve_recipe_path(path)
+            if full_path is None:
+                planned.append((path, None, f"\n❌ {path}: Outside the recipes directory"))
+                continue
+            try:
+                size = os.path.getsize(full_path)
+                if section:
+                    # Only the section's bytes count against the budget
+                    size = await asyncio.to_thread(section_size, full_path, section)
+            except OSError:
+                planned.append((path, None, f"\n❌ {path}: Not found"))
+                continue
+            if size > remaining:
+                planned.append((path, None, f"\n⚠️ {path}: Skipped, read budget of {self.read_budget_bytes} bytes reached"))
+                continue
+            remaining -= size
+            planned.append((path, full_path, None))
+        
+        slots = asyncio.Semaphore(self.read_workers)
+        
+        async def read(full_path):
+            if full_path is None:
+                return None
+            async with slots:
+                return await asyncio.to_thread(self._read_text, full_path, section)
+        
+        contents = await asyncio.gather(*[read(full_path) for _, full_path, _ in planned])
+        
+        results = []
+        for (path, full_path, note), content in zip(planned, contents):
+            if content is not None and section and not content:
+                results.append(f"\n⚠️ {path}: No {section} section")
+            elif content is not None:
+                results.append(f"\n📖 {path}:\n{content}")
+            else:
+                results.append(note or f"\n❌ {path}: Not found")
+        
+        return "".join(results)
+        
     async def execute_tool(self, tool_name: str, parameters: dict) -> str:
         """Execute a tool manually"""
-        import os
-        
         if tool_name == "list_directory":
             path = parameters.get("path", "")
-            if os.path.exists(path):
-                files = os.listdir(path)
-                return f"Files in {os.path.basename(path)}: {', '.join(files)}"
+            full_path = self._resolve_recipe_path(path or self.recipes_dir)
+            if full_path is None:
+                return f"Error: {path} is outside the recipes directory"
+            files = await asyncio.to_thread(self._list_names, full_path)
+            if files is not None:
+                return f"Files in {os.path.basename(full_path)}: {files}"
             else:
                 return f"Directory {path} not found"
                 
         elif tool_name == "read_file":
             path = parameters.get("path", "")
-            if os.path.exists(path):
-                with open(path, 'r') as f:
-                    content = f.read()
+            full_path = self._resolve_recipe_path(path)
+            if full_path is None:
+                return f"Error: {path} is outside the recipes directory"
+            section = parameters.get("section")
+            content = await asyncio.to_thread(self._read_text, full_path, section)
+            if content is not None and section and not content:
+                headings = await asyncio.to_thread(section_names, full_path)
+                return f"No {section} section in {os.path.basename(path)} (sections: {', '.join(headings)})"
+            elif content is not None:
                 return f"Content of {os.path.basename(path)}:\n{content}"
             else:
                 return f"File {path} not found"
@@ -83,68 +238,192 @@ For complex queries, read multiple recipe files to analyze and compare ingredien
                 except:
                     paths = [paths]  # Fallback to single file
             
-            results = []
-            for path in paths[:5]:  # Limit to first 5 files
-                full_path = f"/Users/josh/Rose/sage/test-recipes/{path}"
-                if os.path.exists(full_path):
-                    with open(full_path, 'r') as f:
-                        content = f.read()
-                    results.append(f"\n📖 {path}:\n{content}")
-                else:
-                    results.append(f"\n❌ {path}: Not found")
-            
-            return "".join(results)
+            return await self._read_multiple(paths, parameters.get("section"))
         else:
             return f"Unknown tool: {tool_name}"
     
-    async def chat(self, message: str) -> str:
-        """Process a chat message with manual tool execution"""
+    async def _stream_text(self, message: str):
+        """Yield content deltas from one agent run"""
+        run = self.agent.run(message)
+        try:
+            async for chunk in run:
+                if hasattr(chunk, 'choices') and chunk.choices:
+                    choice = chunk.choices[0]
+                    if hasattr(choice, 'delta') and choice.delta and choice.delta.content:
+                        yield choice.delta.content
+        finally:
+            await run.aclose()
+    
+    async def execute_tools(self, calls: list, timeout: float, trace=NULL_TRACE) -> str:
+        """Run one turn's tool calls concurrently and combine their results into one message"""
+        async def run(name, parameters):
+            with trace.span("tool", tool=name):
+                try:
+                    return await self.execute_tool(name, parameters)
+                except Exception as e:
+                    return f"Error: {e}"
+        
+        tasks = [asyncio.ensure_future(run(name, parameters)) for name, parameters in calls]
+        done, pending = await asyncio.wait(tasks, timeout=max(timeout, 0))
+        for task in pending:
+            task.cancel()
+        
+        results = []
+        for (name, parameters), task in zip(calls, tasks):
+            result = task.result() if task in done else "Error: Timed out before the deadline"
+            results.append(f"[{name} {json.dumps(parameters)}]\n{result}")
+        return "\n\n".join(results)
+    
+    async def chat_stream(self, message: str, deadline: float = None, cancel_event: asyncio.Event = None,
+                          timing: dict = None):
+        """Stream a chat reply, running tool calls the model emits until it answers or runs out of steps or time
+
+        The query class sets max_tokens per step, the step count and the deadline (a caller's shorter deadline
+        wins). Running out, cancel_event being set, or the caller closing the stream aborts the model request.
+        A dict passed as timing is filled in with this call's timings when the stream ends.
+        """
         if not self.agent:
             await self.initialize()
             
-        # Load tools if not already loaded
-        await self.agent.load_tools()
-        
-        # Get the model response
-        full_response = ""
-        finish_reason = None
-        
-        async for chunk in self.agent.run(message):
-            if hasattr(chunk, 'choices') and chunk.choices:
-                choice = chunk.choices[0]
-                if hasattr(choice, 'delta') and choice.delta:
-                    if choice.delta.content:
-                        full_response += choice.delta.content
-                    if choice.finish_reason:
-                        finish_reason = choice.finish_reason
-        
-        # Check if the model wants to call a tool
-        if full_response.strip().startswith('{') and 'function' in full_response:
+        trace = self.metrics.start_trace("sage_agent_tiny")
+        
+        # Load tools once; the MCP servers stay warm for the life of the agent
+        if not self.tools_loaded:
+            with trace.span("load_tools"):
+                await self.agent.load_tools()
+            self.tools_loaded = True
+        
+        cache_before = self.tool_cache.stats() if self.metrics.enabled else None
+        prompt_tokens = 0
+        completion_tokens = 0
+        decode_seconds = 0.0
+        started = time.perf_counter()
+        budget = self.budgets.for_message(message)
+        max_steps = self.max_steps or budget.max_steps
+        seconds = self.deadline or budget.deadline
+        request_deadline = Deadline(seconds if deadline is None else min(deadline, seconds))
+        trace.set(query_class=budget.query_class)
+        first_token = None
+        timing = {} if timing is None else timing
+        prompt = message
+        tool_results = ""
+        steps = 0
+        answered = False
+        stopped = None
+        
+        while steps < max_steps:
+            steps += 1
+            # Hold back output only while it might still be a JSON tool call
+            buffered = ""
+            is_tool_call = None
+            sent = time.perf_counter()
+            step_first = None
+            prompt_tokens += estimate_tokens(prompt)
+            
+            step_tokens = 0
+            stream = stream_until(self._stream_text(prompt), request_deadline, cancel_event)
             try:
-                import json
-                tool_call = json.loads(full_response.strip())
-                tool_name = tool_call.get("name")
-                parameters = tool_call.get("parameters", {})
-                
-                # Execute the tool
-                tool_result = await self.execute_tool(tool_name, parameters)
-                
-                # Generate a follow-up response with the tool result
-                follow_up = f"Based on the tool result: {tool_result}\n\nProvide a helpful response to the user's original question: {message}"
-                
-                final_response = ""
-                async for chunk in self.agent.run(follow_up):
-                    if hasattr(chunk, 'choices') and chunk.choices:
-                        choice = chunk.choices[0]
-                        if hasattr(choice, 'delta') and choice.delta and choice.delta.content:
-                            final_response += choice.delta.content
-                
-                return final_response if final_response else tool_result
-                
-            except (json.JSONDecodeError, KeyError):
-                pass
+                async for token in stream:
+                    if step_first is None:
+                        step_first = time.perf_counter()
+                    completion_tokens += 1
+                    step_tokens += 1
+                    if is_tool_call is None:
+                        buffered += token
+                        if buffered.strip():
+                            is_tool_call = buffered.lstrip().startswith(TOOL_CALL_STARTS)
+                            if not is_tool_call:
+                                token = buffered
+                    elif is_tool_call:
+                        buffered += token
+                    if is_tool_call is False:
+                        if first_token is None:
+                            first_token = time.perf_counter() - started
+                        answered = True
+                        yield token
+                    # tiny-agents does not forward max_tokens, so the budget is enforced by closing the stream
+                    if step_tokens >= budget.max_tokens:
+                        stopped = "max_tokens"
+                        break
+            except DeadlineExceeded:
+                stopped = "deadline"
+            except RequestCancelled:
+                stopped = "cancelled"
+            finally:
+                await stream.aclose()
+            
+            step_end = time.perf_counter()
+            trace.add_span("prefill", sent, step_first or step_end, step=steps)
+            if step_first is not None:
+                trace.add_span("decode", step_first, step_end, step=steps)
+                decode_seconds += step_end - step_first
+            
+            if stopped in ("deadline", "cancelled"):
+                break
+            calls = parse_tool_calls(buffered) if is_tool_call else []
+            if not calls:
+                if is_tool_call and buffered:
+                    answered = True
+                    yield buffered
+                break
+            
+            remaining = request_deadline.remaining()
+            if remaining <= 0:
+                stopped = "deadline"
+                break
+            with trace.span("tools", calls=len(calls)):
+                tool_results = await self.execute_tools(calls, remaining, trace)
+            
+            # Every result from this turn goes back in a single message
+            if steps + 1 < max_steps:
+                prompt = f"Tool results:\n{tool_results}\n\nCall more tools if you still need information, otherwise answer the user's original question: {message}"
+            else:
+                prompt = f"Tool results:\n{tool_results}\n\nDo not call any more tools. Provide a helpful response to the user's original question: {message}"
+        
+        if stopped == "cancelled":
+            pass
+        elif not answered:
+            if tool_results:
+                yield tool_results
+            elif stopped == "deadline":
+                yield f"Error: {request_deadline.error()}"
+            else:
+                yield "No response received"
+            
+        timing.update(
+            first_token=first_token,
+            total=time.perf_counter() - started,
+            steps=steps,
+            query_class=budget.query_class,
+            stopped=stopped
+        )
         
-        return full_response if full_response else "No response received"
+        if self.metrics.enabled:
+            cache_after = self.tool_cache.stats()
+            hits = cache_after["hits"] - cache_before["hits"]
+            misses = cache_after["misses"] - cache_before["misses"]
+            trace.finish(
+                steps=steps,
+                stopped=stopped,
+                first_token=first_token,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                tokens_estimated=True,
+                tokens_per_second=completion_tokens / decode_seconds if decode_seconds > 0 else None,
+                tool_cache_hits=hits,
+                tool_cache_misses=misses,
+                **({"cache_hit": misses == 0} if hits or misses else {})
+            )
+    
+    async def chat(self, message: str, timing: dict = None) -> str:
+        """Process a chat message with manual tool execution"""
+        return "".join([token async for token in self.chat_stream(message, timing=timing)])
+
+    async def cleanup(self):
+        """Shut the MCP servers down and close the metrics sinks"""
+        if self.agent is not None:
+            await self.agent.cleanup()
+        self.metrics.close()
         
     async def run_interactive(self):
         """Run interactive chat loop"""
@@ -161,13 +440,20 @@ For complex queries, read multiple recipe files to analyze and compare ingredien
                     break
                     
                 print("Sage: ", end="", flush=True)
-                response = await self.chat(user_input)
-                print(response)
+                timing = {}
+                async for token in self.chat_stream(user_input, timing=timing):
+                    print(token, end="", flush=True)
+                print()
+                
+                if timing.get("first_token") is not None:
+                    print(f"⏱️  First token {timing['first_token']:.1f}s, total {timing['total']:.1f}s, {timing['steps']} step(s)")
                 
         except KeyboardInterrupt:
             print("\n🌿 Sage Agent stopped")
         except Exception as e:
             print(f"Error: {e}")
+        finally:
+            await self.cleanup()
             
     async def test_functionality(self):
         """Test basic agent functionality"""
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Sage Client - Thin command-line client for the Sage daemon (imports only the standard library basics)
+
+Usage: python sage_client.py "what can I make with chickpeas?"
+       python sage_client.py               (interactive)
+       python sage_client.py --stats | --ping | --shutdown
+"""
+import json
+import os
+import socket
+import sys
+
+
+def default_socket_path() -> str:
+    """Same default as sage_daemon.py, without importing it"""
+    return os.environ.get("SAGE_SOCKET") or os.path.join(
+        os.environ.get("XDG_RUNTIME_DIR") or "/tmp", f"sage-{os.getuid()}.sock")
+
+
+class SageClient:
+    """Line-delimited JSON over the daemon's Unix socket"""
+
+    def __init__(self, socket_path: str = None):
+        self.socket_path = socket_path or default_socket_path()
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+        self.lines = self.sock.makefile("r", encoding="utf-8")
+
+    def request(self, payload: dict):
+        """Send a request and yield response objects until the answer is complete"""
+        self.sock.sendall(json.dumps(payload).encode() + b"\n")
+        for line in self.lines:
+            response = json.loads(line)
+            yield response
+            if "token" not in response:
+                return
+
+    def chat(self, message: str):
+        """Yield answer tokens; the final timing is kept in last_timing"""
+        self.last_timing = None
+        for response in self.request({"message": message}):
+            if "token" in response:
+                yield response["token"]
+            elif "error" in response:
+                yield f"Error: {response['error']}"
+            else:
+                self.last_timing = response.get("timing")
+
+    def command(self, name: str) -> dict:
+        return next(self.request({"command": name}))
+
+    def close(self):
+        self.lines.close()
+        self.sock.close()
+
+
+def main():
+    args = sys.argv[1:]
+    socket_path = None
+    if "--socket" in args:
+        i = args.index("--socket")
+        socket_path = args[i + 1]
+        del args[i:i + 2]
+
+    try:
+        client = SageClient(socket_path)
+    except OSError:
+        print(f"❌ No Sage daemon on {socket_path or default_socket_path()}. Start one with: python sage_daemon.py &")
+        sys.exit(2)
+
+    try:
+        if args and args[0] in ("--stats", "--ping", "--shutdown"):
+            print(json.dumps(client.command(args[0][2:]), indent=2))
+            return
+        if args:
+            for token in client.chat(" ".join(args)):
+                sys.stdout.write(token)
+                sys.stdout.flush()
+            print()
+            return
+
+        print("🌿 Sage (daemon client) - type 'quit' to exit")
+        while True:
+            try:
+                user_input = input("\nUser: ")
+            except EOFError:
+                break
+            if user_input.lower() in ("quit", "exit"):
+                break
+            sys.stdout.write("Sage: ")
+            for token in client.chat(user_input):
+                sys.stdout.write(token)
+                sys.stdout.flush()
+            print()
+            timing = client.last_timing
+            if timing and timing.get("first_token") is not None:
+                print(f"⏱️  First token {timing['first_token']:.1f}s, total {timing['total']:.1f}s")
+    except KeyboardInterrupt:
+        print()
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Sage Daemon - Keeps an agent warm (imports, config, MCP servers, tools, recipe index) behind a Unix socket
+
+Usage: python sage_daemon.py [--agent tiny|direct] [--socket PATH]
+Query it with sage_client.py.
+
+Protocol: one JSON object per line. A client sends {"message": "..."} (optionally with "deadline": seconds)
+and receives {"token": "..."} lines followed by {"done": true, "timing": {...}}, or {"error": "..."}.
+{"command": "ping" | "stats" | "shutdown"} returns a single line.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import sys
+import time
+
+
+def default_socket_path() -> str:
+    """Per-user socket path (SAGE_SOCKET overrides)"""
+    return os.environ.get("SAGE_SOCKET") or os.path.join(
+        os.environ.get("XDG_RUNTIME_DIR") or "/tmp", f"sage-{os.getuid()}.sock")
+
+
+class SageDaemon:
+    """Serves chat requests from a single warm agent over a Unix socket"""
+
+    def __init__(self, agent, socket_path: str = None, serialize: bool = True):
+        self.agent = agent
+        self.socket_path = socket_path or default_socket_path()
+        # The tiny agent keeps one conversation, so its turns must not interleave
+        self.lock = asyncio.Lock() if serialize else None
+        self.started = time.time()
+        self.requests = 0
+        self.stopped = asyncio.Event()
+        self._server = None
+
+    async def warm_up(self):
+        """Pay every startup cost now instead of on the first question"""
+        if hasattr(self.agent, "initialize"):
+            await self.agent.initialize()
+            await self.agent.agent.load_tools()
+            self.agent.tools_loaded = True
+        if hasattr(self.agent, "index"):
+            self.agent.index.refresh()
+            self.agent.search.top_k("warm up")
+
+    async def start(self):
+        """Listen on the socket, replacing a stale one left by a crashed daemon"""
+        if os.path.exists(self.socket_path):
+            if _socket_alive(self.socket_path):
+                raise RuntimeError(f"A Sage daemon is already listening on {self.socket_path}")
+            os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._handle, self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        return self
+
+    async def stop(self):
+        """Stop accepting, release the socket and shut the agent down"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+        await self.agent.cleanup()
+
+    def stats(self) -> dict:
+        stats = {"pid": os.getpid(), "uptime": time.time() - self.started, "requests": self.requests,
+                 "agent": type(self.agent).__module__}
+        if hasattr(self.agent, "tool_cache"):
+            stats["tool_cache"] = self.agent.tool_cache.stats()
+        if getattr(self.agent, "router", None) is not None:
+            stats["queries_by_path"] = self.agent.router.stats()
+        return stats
+
+    async def _handle(self, reader, writer):
+        """Answer requests on one connection until the client hangs up"""
+        # A line read while an answer streamed (a pipelined request, or EOF) is handled next
+        next_line = None
+        try:
+            while True:
+                line = await (next_line if next_line is not None else reader.readline())
+                next_line = None
+                if not line:
+                    return
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    await _send(writer, {"error": "Expected one JSON object per line"})
+                    continue
+
+                command = request.get("command")
+                if command == "ping":
+                    await _send(writer, {"ok": True})
+                elif command == "stats":
+                    await _send(writer, self.stats())
+                elif command == "shutdown":
+                    await _send(writer, {"ok": True})
+                    self.stopped.set()
+                    return
+                elif isinstance(request.get("message"), str):
+                    next_line = await self._chat(reader, writer, request["message"], request.get("deadline"))
+                else:
+                    await _send(writer, {"error": 'Expected {"message": "..."} or {"command": "..."}'})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if next_line is not None:
+                next_line.cancel()
+            writer.close()
+
+    async def _chat(self, reader, writer, message: str, deadline: float = None):
+        """Stream one answer back to the client; a client that hangs up stops the generation
+
+        The connection is watched while the answer is produced, so a hang-up during a long prefill (when
+        nothing is written yet) is noticed straight away. Returns the task reading the next request line.
+        """
+        self.requests += 1
+        started = time.perf_counter()
+        hung_up = asyncio.Event()
+        next_line = asyncio.ensure_future(reader.readline())
+
+        def watch(task):
+            if task.cancelled() or task.exception() is not None or not task.result():
+                hung_up.set()
+
+        next_line.add_done_callback(watch)
+        if self.lock is not None:
+            await self.lock.acquire()
+        timing = {}
+        stream = self.agent.chat_stream(message, deadline=deadline, cancel_event=hung_up, timing=timing)
+        try:
+            async for token in stream:
+                await _send(writer, {"token": token})
+        except ConnectionError:
+            next_line.cancel()
+            raise
+        except Exception as e:
+            if not hung_up.is_set():
+                await _send(writer, {"error": str(e)})
+            return next_line
+        finally:
+            await stream.aclose()
+            if self.lock is not None:
+                self.lock.release()
+        if not hung_up.is_set():
+            timing["daemon_total"] = time.perf_counter() - started
+            await _send(writer, {"done": True, "timing": timing})
+        return next_line
+
+
+async def _send(writer, payload: dict):
+    writer.write(json.dumps(payload).encode() + b"\n")
+    await writer.drain()
+
+
+def _socket_alive(path: str) -> bool:
+    """True if something accepts connections on the socket"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+            return True
+        except OSError:
+            return False
+
+
+def build_agent(kind: str, config_path: str, recipes_dir: str = None):
+    """Create the agent the daemon keeps warm"""
+    if kind == "tiny":
+        from sage_agent_tiny import SageAgent
+        return SageAgent(config_path)
+    from sage_agent import SageAgent
+    with open(config_path, "r") as f:
+        config = json.load(f)
+    return SageAgent(recipes_dir=recipes_dir or config.get("recipes_dir"), backends=config.get("backends"),
+                     base_url=config.get("base_url", "http://localhost:1234/v1"), watch=True,
+                     store=config.get("recipe_store", False), budgets=config.get("budgets"))
+
+
+async def run(args):
+    agent = build_agent(args.agent, args.config, args.recipes_dir)
+    daemon = SageDaemon(agent, args.socket, serialize=args.agent == "tiny")
+    try:
+        await daemon.start()
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    try:
+        await daemon.warm_up()
+    except Exception as e:
+        print(f"⚠️ Warm-up failed, will retry on first request: {e}")
+        if hasattr(agent, "tools_loaded"):
+            agent.tools_loaded = False
+    print(f"🌿 Sage daemon ({args.agent} agent) ready on {daemon.socket_path} in {time.perf_counter() - started:.1f}s")
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, daemon.stopped.set)
+    await daemon.stopped.wait()
+    await daemon.stop()
+    print("🌿 Sage daemon stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep Sage warm behind a Unix socket")
+    parser.add_argument("--agent", choices=("tiny", "direct"), default="tiny",
+                        help="tiny: MCP tool agent (sage_agent_tiny); direct: index-backed agent (sage_agent)")
+    parser.add_argument("--config", default="sage_agent_config.json")
+    parser.add_argument("--recipes-dir", default=None, help="Override recipes_dir from the config (direct agent)")
+    parser.add_argument("--socket", default=None, help="Socket path (default: $SAGE_SOCKET or /tmp/sage-<uid>.sock)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""
+Sage Server - Chat over HTTP with a bounded queue, per-client limits and graceful drain
+
+Usage: python sage_server.py [--port 8080] [--recipes-dir DIR] [--queue-size 32] [--per-client 2]
+
+POST /chat {"message": "...", "stream": true}   → text/event-stream of {"token": ...} events, then {"timing": ...}
+POST /chat {"message": "..."}                   → {"response": "...", "timing": {...}}
+GET  /health                                    → queue depth, active requests, draining flag
+
+With --tenants FILE each request names its tenant in an X-Sage-Tenant header (or a "tenant" field) and is
+answered from that tenant's recipe root, within its quotas.
+"""
+import argparse
+import asyncio
+import json
+import math
+import signal
+import time
+from collections import defaultdict
+from budgets import BudgetPolicy
+from sage_agent import DEFAULT_RECIPES_DIR, SageAgent
+from tenants import TenantRegistry
+
+MAX_BODY_BYTES = 64 * 1024
+MAX_HEADERS = 100
+TOKEN_BUFFER = 256
+_END = object()
+_HUNG_UP = object()
+
+STATUS_TEXT = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+    429: "Too Many Requests", 503: "Service Unavailable", 504: "Gateway Timeout",
+}
+
+
+class ChatJob:
+    """One admitted chat request and the bounded buffer its tokens flow through"""
+
+    def __init__(self, message: str, client: str, agent: SageAgent = None):
+        self.message = message
+        self.client = client
+        self.agent = agent
+        self.enqueued = time.monotonic()
+        self.started = None
+        # Bounded so a slow reader pauses generation instead of growing memory
+        self.tokens = asyncio.Queue(TOKEN_BUFFER)
+        self.task = None
+        self.cancelled = False
+        # Filled in by the agent when the answer is complete
+        self.timing = {}
+
+    def cancel(self):
+        self.cancelled = True
+        if self.task is not None:
+            self.task.cancel()
+
+    def hang_up(self):
+        """The client disconnected: stop generating and wake whoever is waiting for tokens"""
+        self.cancel()
+        if self.tokens.full():
+            self.tokens.get_nowait()
+        self.tokens.put_nowait(_HUNG_UP)
+
+
+class BadRequest(Exception):
+    """A request the server refuses before routing it"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class SageServer:
+    """Admission control in front of one SageAgent (or one per tenant): a bounded queue drained by a fixed
+    pool of workers"""
+
+    def __init__(self, agent: SageAgent = None, host: str = "127.0.0.1", port: int = 8080, workers: int = 4,
+                 queue_size: int = 32, per_client: int = 2, queue_timeout: float = None,
+                 request_timeout: float = 600.0, write_timeout: float = 30.0, drain_timeout: float = None,
+                 tenants: TenantRegistry = None, expected_generation: float = 300.0, read_timeout: float = 30.0):
+        self.agent = agent
+        self.tenants = tenants
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.queue_size = queue_size
+        self.per_client = per_client
+        # Local answers take 5-10 minutes; the request timeout counts from when generation starts
+        self.request_timeout = request_timeout
+        # By default a request may wait as long as a full queue takes to drain through the workers
+        self.expected_generation = expected_generation
+        if queue_timeout is None:
+            queue_timeout = math.ceil(queue_size / workers) * expected_generation
+        self.queue_timeout = queue_timeout
+        self.write_timeout = write_timeout
+        # A client gets this long to send each request, so slow or idle connections cannot pile up
+        self.read_timeout = read_timeout
+        if drain_timeout is None:
+            # Let admitted requests run to their deadline; the request timeout caps every budget
+            policy = agent.budgets if agent is not None else BudgetPolicy(tenants.budgets if tenants else None)
+            drain_timeout = min(request_timeout, policy.longest_deadline())
+        self.drain_timeout = drain_timeout
+        self.queue = asyncio.Queue(queue_size)
+        self.active = 0
+        self.draining = False
+        self.counts = defaultdict(int)
+        self._clients = defaultdict(int)
+        self._tenant_jobs = defaultdict(int)
+        self._server = None
+        self._worker_tasks = []
+        self._handlers = set()
+
+    async def start(self):
+        """Start the workers and begin accepting connections"""
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def drain(self):
+        """Stop accepting, let admitted requests finish within drain_timeout, then cancel the rest"""
+        self.draining = True
+        if self._server is not None:
+            self._server.close()
+        deadline = time.monotonic() + self.drain_timeout
+        while (self.queue.qsize() or self.active) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        if self._handlers:
+            # Handlers still writing get write_timeout to finish; idle keep-alive connections are closed
+            _, pending = await asyncio.wait(list(self._handlers), timeout=self.write_timeout)
+            for task in pending:
+                task.cancel()
+        await (self.tenants or self.agent).cleanup()
+
+    def stats(self) -> dict:
+        return {
+            "status": "draining" if self.draining else "ok",
+            "queued": self.queue.qsize(),
+            "queue_size": self.queue_size,
+            "active": self.active,
+            "workers": self.workers,
+            "responses": dict(self.counts),
+            **(self.tenants.stats() if self.tenants is not None else {}),
+        }
+
+    async def _worker(self):
+        """Run queued jobs one at a time; the agent's own semaphore still caps LLM concurrency"""
+        while True:
+            job = await self.queue.get()
+            try:
+                if not job.cancelled:
+                    await self._run(job)
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, job: ChatJob):
+        """Generate one answer within the request deadline"""
+        waited = time.monotonic() - job.enqueued
+        if waited > self.queue_timeout:
+            await self._finish(job, TimeoutError(f"Waited {waited:.0f}s in the queue"))
+            return
+
+        self.active += 1
+        job.started = time.monotonic()
+        job.task = asyncio.create_task(self._produce(job))
+        try:
+            done, _ = await asyncio.wait({job.task}, timeout=self.request_timeout)
+            if not done:
+                job.task.cancel()
+                await self._finish(job, TimeoutError(f"No answer within {self.request_timeout:.0f}s"))
+            elif not job.task.cancelled():
+                await self._finish(job, job.task.exception())
+        except asyncio.CancelledError:
+            # Drain gave up on this request: stop generating and tell the reader
+            job.task.cancel()
+            for item in (ConnectionAbortedError("Server is shutting down"), _END):
+                if not job.tokens.full():
+                    job.tokens.put_nowait(item)
+            raise
+        finally:
+            self.active -= 1
+
+    async def _produce(self, job: ChatJob):
+        """Stream the agent's answer into the job's buffer, within what is left of the request deadline"""
+        remaining = self.request_timeout - (time.monotonic() - job.started)
+        async for token in job.agent.chat_stream(job.message, deadline=remaining, timing=job.timing):
+            await job.tokens.put(token)
+
+    async def _finish(self, job: ChatJob, error: BaseException = None):
+        """Deliver the final error (if any) and end-of-answer marker"""
+        for item in ([error] if error else []) + [_END]:
+            try:
+                await asyncio.wait_for(job.tokens.put(item), self.write_timeout)
+            except asyncio.TimeoutError:
+                # The reader stalled; its own write timeout will close the connection
+                return
+
+    async def _handle(self, reader, writer):
+        """Serve keep-alive HTTP/1.1 requests on one connection"""
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        peer = writer.get_extra_info("peername")
+        # Read while a request is answered, so a hang-up is noticed before anything is written
+        next_line = None
+        try:
+            while not self.draining:
+                request = await self._read_request(reader, next_line)
+                next_line = None
+                if request is None:
+                    return
+                method, path, headers, body = request
+                client = headers.get("x-client-id") or (peer[0] if peer else "unknown")
+                next_line = asyncio.ensure_future(reader.readline())
+                keep_alive = await self._route(writer, method, path, headers, body, client, next_line)
+                if not keep_alive or headers.get("connection", "").lower() == "close":
+                    return
+        except BadRequest as e:
+            await self._send_json(writer, e.status, {"error": str(e)}, close=True)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            if next_line is not None:
+                next_line.cancel()
+            self._handlers.discard(task)
+            writer.close()
+
+    async def _read_request(self, reader, request_line=None):
+        """Parse one request within read_timeout; None when the connection closes
+
+        request_line is the task already reading the request line, if any.
+        """
+        line = await asyncio.wait_for(request_line or reader.readline(), self.read_timeout)
+        if not line:
+            return None
+        try:
+            method, path, _ = line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            return None
+        headers, body = await asyncio.wait_for(self._read_head(reader), self.read_timeout)
+        return method, path, headers, body
+
+    async def _read_head(self, reader) -> tuple:
+        """Headers and body of a request whose request line has been read"""
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise BadRequest(400, f"More than {MAX_HEADERS} headers")
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise BadRequest(400, "Invalid Content-Length") from None
+        if length < 0:
+            raise BadRequest(400, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise BadRequest(413, f"Body larger than {MAX_BODY_BYTES} bytes")
+        body = await reader.readexactly(length) if length else b""
+        return headers, body
+
+    async def _route(self, writer, method, path, headers, body, client, next_line) -> bool:
+        """Dispatch a request; returns whether the connection can be reused"""
+        path = path.split("?")[0].rstrip("/") or "/"
+        if path == "/health" and method == "GET":
+            await self._send_json(writer, 200, self.stats())
+            return True
+        if path != "/chat":
+            await self._send_json(writer, 404, {"error": f"Unknown route {path}"})
+            return True
+        if method != "POST":
+            await self._send_json(writer, 405, {"error": "Use POST"})
+            return True
+        try:
+            payload = json.loads(body or b"{}")
+            message = payload["message"]
+            if not isinstance(message, str) or not message.strip():
+                raise ValueError
+        except (ValueError, KeyError, TypeError):
+            await self._send_json(writer, 400, {"error": 'Expected JSON body {"message": "..."}'})
+            return True
+        stream = bool(payload.get("stream")) or "text/event-stream" in headers.get("accept", "")
+        tenant = None
+        if self.tenants is not None:
+            tenant = headers.get("x-sage-tenant") or payload.get("tenant")
+            if tenant not in self.tenants:
+                await self._send_json(writer, 404, {"error": f"Unknown tenant {tenant!r}"})
+                return True
+        return await self._chat(writer, message, client, stream, tenant, next_line)
+
+    async def _chat(self, writer, message: str, client: str, stream: bool, tenant: str = None,
+                    next_line: asyncio.Future = None) -> bool:
+        """Admit, queue and answer one chat request; a client that hangs up (next_line hits EOF) cancels it"""
+        if self.draining:
+            await self._send_json(writer, 503, {"error": "Server is shutting down"}, close=True)
+            return False
+        if self._clients[client] >= self.per_client:
+            await self._send_json(writer, 429, {"error": f"At most {self.per_client} concurrent requests per client"},
+                                  retry_after=1)
+            return True
+        if tenant is not None:
+            # A tenant may have twice its generation quota admitted, so it cannot fill the shared queue
+            limit = 2 * self.tenants.max_requests(tenant)
+            if self._tenant_jobs[tenant] >= limit:
+                await self._send_json(writer, 429, {"error": f"At most {limit} concurrent requests for this tenant"},
+                                      retry_after=1)
+                return True
+
+        job = ChatJob(message, client, self.tenants.agent(tenant) if tenant is not None else self.agent)
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            await self._send_json(writer, 429, {"error": "Server busy, try again shortly"}, retry_after=5)
+            return True
+
+        def watch(task):
+            if task.cancelled() or task.exception() is not None or not task.result():
+                job.hang_up()
+
+        if next_line is not None:
+            next_line.add_done_callback(watch)
+        self._clients[client] += 1
+        if tenant is not None:
+            self._tenant_jobs[tenant] += 1
+        try:
+            if stream:
+                return await self._stream_response(writer, job)
+            return await self._full_response(writer, job)
+        except (ConnectionError, asyncio.TimeoutError):
+            job.cancel()
+            return False
+        finally:
+            if next_line is not None:
+                next_line.remove_done_callback(watch)
+            self._clients[client] -= 1
+            if not self._clients[client]:
+                del self._clients[client]
+            if tenant is not None:
+                self._tenant_jobs[tenant] -= 1
+                if not self._tenant_jobs[tenant]:
+                    del self._tenant_jobs[tenant]
+
+    async def _stream_response(self, writer, job: ChatJob) -> bool:
+        """Relay tokens as server-sent events while they are generated"""
+        await self._write(writer, b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                                  b"Cache-Control: no-cache\r\nTransfer-Encoding: chunked\r\n\r\n")
+        status = 200
+        while True:
+            item = await job.tokens.get()
+            if item is _HUNG_UP:
+                return False
+            if item is _END:
+                break
+            if isinstance(item, BaseException):
+                status = 504 if isinstance(item, TimeoutError) else 503
+                event = {"error": str(item)}
+            else:
+                event = {"token": item}
+            data = f"data: {json.dumps(event)}\n\n".encode()
+            await self._write(writer, b"%x\r\n%s\r\n" % (len(data), data))
+        data = f"data: {json.dumps({'timing': job.timing})}\n\ndata: [DONE]\n\n".encode()
+        await self._write(writer, b"%x\r\n%s\r\n0\r\n\r\n" % (len(data), data))
+        self.counts[status] += 1
+        return True
+
+    async def _full_response(self, writer, job: ChatJob) -> bool:
+        """Collect the whole answer and send it as one JSON body"""
+        tokens = []
+        while True:
+            item = await job.tokens.get()
+            if item is _HUNG_UP:
+                return False
+            if item is _END:
+                break
+            if isinstance(item, BaseException):
+                status = 504 if isinstance(item, TimeoutError) else 503
+                await self._send_json(writer, status, {"error": str(item)})
+                return True
+            tokens.append(item)
+        await self._send_json(writer, 200, {"response": "".join(tokens), "timing": job.timing})
+        return True
+
+    async def _write(self, writer, data: bytes):
+        """Write with a timeout so a stalled client cannot pin a worker"""
+        writer.write(data)
+        await asyncio.wait_for(writer.drain(), self.write_timeout)
+
+    async def _send_json(self, writer, status: int, payload: dict, retry_after: int = None, close: bool = False):
+        self.counts[status] += 1
+        data = json.dumps(payload).encode()
+        head = f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+        if retry_after is not None:
+            head += f"Retry-After: {retry_after}\r\n"
+        if close:
+            head += "Connection: close\r\n"
+        await self._write(writer, (head + "\r\n").encode() + data)
+
+
+async def serve(args):
+    """Run until SIGINT/SIGTERM, then drain"""
+    agent = tenants = None
+    if args.tenants:
+        with open(args.tenants, "r") as f:
+            tenants = TenantRegistry.from_config(json.load(f), max_concurrency=args.workers, watch=True)
+    else:
+        agent = SageAgent(recipes_dir=args.recipes_dir, base_url=args.base_url, max_concurrency=args.workers,
+                          watch=True, backends=args.backend, hedge_after=args.hedge_after, store=args.store)
+    server = SageServer(agent, args.host, args.port, workers=args.workers, queue_size=args.queue_size,
+                        per_client=args.per_client, queue_timeout=args.queue_timeout,
+                        request_timeout=args.request_timeout, drain_timeout=args.drain_timeout, tenants=tenants,
+                        expected_generation=args.expected_generation)
+    await server.start()
+    print(f"🌿 Sage server on http://{server.host}:{server.port} "
+          f"({args.workers} workers, queue {args.queue_size}, {args.per_client} per client)")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    print(f"\n🌿 Draining {server.queue.qsize()} queued and {server.active} active requests...")
+    await server.drain()
+    print("🌿 Sage server stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Sage chat over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--recipes-dir", default=DEFAULT_RECIPES_DIR)
+    parser.add_argument("--tenants", default=None,
+                        help='JSON config with "tenants" {name: {"recipes_dir", "cache_size", "max_concurrency"}} '
+                             'and/or "tenants_root"; serves each tenant from its own root')
+    parser.add_argument("--base-url", default="http://localhost:1234/v1", help="OpenAI-compatible LLM endpoint")
+    parser.add_argument("--backend", action="append", default=None,
+                        help="OpenAI-compatible endpoint to balance across (repeat for several; overrides --base-url)")
+    parser.add_argument("--hedge-after", type=float, default=None,
+                        help="Seconds without a first token before a short prompt is also sent to another backend")
+    parser.add_argument("--store", action="store_true",
+                        help="Keep recipes in a SQLite full-text store instead of memory (large vaults)")
+    parser.add_argument("--workers", type=int, default=4, help="Requests generated at once")
+    parser.add_argument("--queue-size", type=int, default=32, help="Requests waiting before 429s are returned")
+    parser.add_argument("--per-client", type=int, default=2, help="Concurrent requests per client")
+    parser.add_argument("--request-timeout", type=float, default=600.0,
+                        help="Seconds a request may spend generating before it gives up")
+    parser.add_argument("--expected-generation", type=float, default=300.0,
+                        help="Typical seconds per answer, used to size the default queue timeout")
+    parser.add_argument("--queue-timeout", type=float, default=None,
+                        help="Seconds a request may wait for a worker (default: queue size / workers x expected generation)")
+    parser.add_argument("--drain-timeout", type=float, default=None,
+                        help="Seconds to finish requests on shutdown (default: the longest budget deadline, "
+                             "capped by --request-timeout)")
+    asyncio.run(serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,7 @@ Simple demo showing components working individually
 import asyncio
 import json
 from huggingface_hub import MCPClient
-from openai import OpenAI
+from llm_router import LLMRouter
 
 async def demo_components():
     """Demo each component separately"""
@@ -14,13 +14,11 @@ async def demo_components():
     
     # Test 1: LM Studio direct
     print("📡 Test 1: LM Studio Direct Call")
-    client = OpenAI(
-        base_url="http://localhost:1234/v1",
-        api_key="lm-studio"
-    )
+    with open("sage_agent_config.json", "r") as f:
+        router = LLMRouter.from_config(json.load(f))
     
     try:
-        response = client.chat.completions.create(
+        response = await router.create(
             model="local-model",
             messages=[{"role": "user", "content": "You are Sage, a culinary AI. Say hello in exactly 10 words."}],
             max_tokens=50
@@ -28,6 +26,8 @@ async def demo_components():
         print(f"✅ LM Studio: {response.choices[0].message.content}")
     except Exception as e:
         print(f"❌ LM Studio error: {e}")
+    finally:
+        await router.close()
     
     # Test 2: MCP Client direct  
     print("\n📁 Test 2: MCP File System Direct")
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Sage Single Flight - Shares one in-flight token stream between concurrent identical requests
+"""
+import asyncio
+import hashlib
+import json
+
+
+def prompt_key(model: str, messages: list, **params) -> str:
+    """Key identical requests on the fully assembled prompt and generation parameters"""
+    payload = json.dumps({"model": model, "messages": messages, **params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Flight:
+    """One running producer; its tokens are kept so late joiners can replay from the start"""
+
+    def __init__(self, result: dict = None):
+        self.tokens = []
+        # What the producer records about the generation (timings, usage), shared with every waiter
+        self.result = {} if result is None else result
+        self.done = False
+        self.error = None
+        self.waiters = 0
+        self.task = None
+        self._changed = asyncio.Event()
+
+    def notify(self):
+        """Wake every waiter and arm a fresh event for the next change"""
+        changed = self._changed
+        self._changed = asyncio.Event()
+        changed.set()
+
+    async def wait(self):
+        await self._changed.wait()
+
+
+class SingleFlight:
+    """Coalesces concurrent streams with the same key onto a single producer task
+
+    The producer runs independently of any one waiter, so a waiter that cancels or stops reading does not
+    affect the others. It is cancelled only when its last waiter leaves before it finishes.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self.started = 0
+        self.joined = 0
+
+    def __contains__(self, key) -> bool:
+        return key in self._flights
+
+    def __len__(self):
+        return len(self._flights)
+
+    async def stream(self, key, factory, result: dict = None):
+        """Yield the tokens of the flight for key, starting factory() as its producer if none is running
+
+        A leader's result dict becomes the flight's result, for its producer to fill in. When the stream ends,
+        a joiner's result dict gets a copy of it, and every result gets "coalesced" (whether this waiter joined
+        a flight already running).
+        """
+        flight = self._flights.get(key)
+        coalesced = flight is not None
+        if flight is None:
+            flight = Flight(result)
+            flight.task = asyncio.create_task(self._produce(key, flight, factory()))
+            self._flights[key] = flight
+            self.started += 1
+        else:
+            self.joined += 1
+
+        flight.waiters += 1
+        position = 0
+        try:
+            while True:
+                while position < len(flight.tokens):
+                    yield flight.tokens[position]
+                    position += 1
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await flight.wait()
+        finally:
+            if result is not None:
+                if result is not flight.result:
+                    result.update(flight.result)
+                result["coalesced"] = coalesced
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.done:
+                flight.task.cancel()
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    async def _produce(self, key, flight: Flight, source):
+        """Drain the source async iterator into the flight, then retire it"""
+        try:
+            async for token in source:
+                flight.tokens.append(token)
+                flight.notify()
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            flight.notify()
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
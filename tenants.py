@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Sage Tenants - One process serving many users, each with their own recipe root and quotas
+
+Every tenant gets its own SageAgent (index, response cache, concurrency limit) confined to its recipe root.
+Agents share the LLM backends, a global generation limit and a RecipePool, so recipe content that several
+vaults contain (under any file name) is parsed and held in memory once.
+"""
+import asyncio
+import os
+import re
+from llm_router import LLMRouter
+from recipe_index import RecipePool
+
+TENANT_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+DEFAULT_QUOTA = {"cache_size": 64, "max_concurrency": 1}
+
+
+class UnknownTenant(KeyError):
+    """No such tenant is configured"""
+
+
+class TenantRegistry:
+    """Creates and keeps one agent per tenant over shared backends and shared parsed recipes"""
+
+    def __init__(self, tenants: dict = None, tenants_root: str = None, llm: LLMRouter = None,
+                 max_concurrency: int = 4, quota: dict = None, watch: bool = False, budgets: dict = None):
+        # {"name": {"recipes_dir": ..., "cache_size": ..., "max_concurrency": ...}}
+        self.tenants = dict(tenants or {})
+        # With a tenants root, every sub-directory is a tenant with the default quota
+        self.tenants_root = tenants_root
+        self.quota = dict(DEFAULT_QUOTA, **(quota or {}))
+        self.llm = llm or LLMRouter([])
+        # Caps generations across all tenants to what the backends can serve
+        self.llm_slots = asyncio.Semaphore(max_concurrency * len(self.llm.backends))
+        self.pool = RecipePool()
+        self.watch = watch
+        self.budgets = budgets
+        self._agents = {}
+
+    @classmethod
+    def from_config(cls, config: dict, **kwargs):
+        """Build from a config with "tenants" and/or "tenants_root", "tenant_quota" and the LLM backends"""
+        return cls(config.get("tenants"), config.get("tenants_root"), LLMRouter.from_config(config),
+                   quota=config.get("tenant_quota"), budgets=config.get("budgets"), **kwargs)
+
+    def settings(self, name: str) -> dict:
+        """Recipe root and quota for a tenant"""
+        if not isinstance(name, str) or not TENANT_NAME.match(name):
+            raise UnknownTenant(name)
+        if name in self.tenants:
+            settings = dict(self.quota, **self.tenants[name])
+        elif self.tenants_root and os.path.isdir(os.path.join(self.tenants_root, name)):
+            settings = dict(self.quota, recipes_dir=os.path.join(self.tenants_root, name))
+        else:
+            raise UnknownTenant(name)
+        return settings
+
+    def __contains__(self, name) -> bool:
+        try:
+            self.settings(name)
+            return True
+        except UnknownTenant:
+            return False
+
+    def agent(self, name: str):
+        """The tenant's agent, created on first use"""
+        agent = self._agents.get(name)
+        if agent is None:
+            from sage_agent import SageAgent
+            settings = self.settings(name)
+            agent = SageAgent(recipes_dir=settings["recipes_dir"], cache_size=settings["cache_size"],
+                              llm=self.llm, llm_slots=self.llm_slots, max_requests=settings["max_concurrency"],
+                              pool=self.pool, watch=self.watch, budgets=self.budgets)
+            self._agents[name] = agent
+        return agent
+
+    def max_requests(self, name: str) -> int:
+        return self.settings(name)["max_concurrency"]
+
+    def stats(self) -> dict:
+        tenants = {}
+        for name, agent in self._agents.items():
+            tenants[name] = {
+                "recipes": len(agent.index),
+                "cache_entries": len(agent.cache) if agent.cache is not None else 0,
+                "max_concurrency": self.max_requests(name),
+                "queries_by_path": agent.router.stats() if agent.router is not None else {},
+            }
+        return {"tenants": tenants, "shared_recipes": self.pool.stats()}
+
+    async def cleanup(self):
+        """Shut every tenant's agent down, then the shared backends"""
+        for agent in self._agents.values():
+            await agent.cleanup()
+        self._agents.clear()
+        await self.llm.close()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test deadlines, cancellation and per-query-class generation budgets against the mock LLM server
+"""
+import asyncio
+from budgets import BudgetPolicy, classify_query
+from mock_openai_server import MockOpenAIServer
+from sage_agent import SageAgent
+
+LONG_REPLY = " ".join(f"word{i}" for i in range(400))
+
+
+def long_responder(messages: list) -> str:
+    return LONG_REPLY
+
+
+async def collect(agent, message: str, **kwargs) -> str:
+    return "".join([token async for token in agent.chat_stream(message, **kwargs)])
+
+
+def test_query_classes_and_overrides():
+    """Messages map to lookup/chat/plan budgets and config overrides merge per class"""
+    assert classify_query("What's in the cashew alfredo?") == "lookup"
+    assert classify_query("Plan my dinners for the week") == "plan"
+    assert classify_query("I'd love something warming with lentils tonight") == "chat"
+    # Queries from the README
+    assert classify_query("What recipes are available?") == "lookup"
+    assert classify_query("What's the prep time for cashew alfredo?") == "lookup"
+    assert classify_query("What can I make with cashews and nutritional yeast?") == "chat"
+    assert classify_query("what can I make with chickpeas?") == "chat"
+    assert classify_query("quick lunch with protein") == "chat"
+    assert classify_query("Make me a shopping list for this week's meal plan") == "plan"
+    assert all(limits["deadline"] >= 600 for limits in BudgetPolicy().budgets.values())
+    policy = BudgetPolicy({"plan": {"max_tokens": 4096}})
+    budget = policy.for_message("make me a weekly menu")
+    assert (budget.query_class, budget.max_tokens, budget.max_steps) == ("plan", 4096, 6)
+    print("✅ Query classes and budget overrides")
+
+
+def test_max_tokens_per_query_class():
+    """The class's max_tokens goes to the backend, which stops decoding there"""
+    mock = MockOpenAIServer(latency=0.01, tokens_per_second=0, responder=long_responder).start()
+
+    async def run():
+        agent = SageAgent(recipes_dir="test-recipes", base_url=mock.base_url, cache_size=0, fast_path=False,
+                          budgets={"chat": {"max_tokens": 5}})
+        try:
+            timing = {}
+            reply = await agent.chat("Something warming with lentils tonight", timing=timing)
+            assert reply.split() == LONG_REPLY.split()[:5]
+            assert timing["query_class"] == "chat"
+            print("✅ max_tokens applied per query class")
+        finally:
+            await agent.cleanup()
+
+    try:
+        asyncio.run(run())
+    finally:
+        mock.stop()
+
+
+def test_deadline_and_cancel_release_the_backend():
+    """Running out of time or cancelling closes the backend stream straight away"""
+    mock = MockOpenAIServer(latency=0.05, tokens_per_second=20, responder=long_responder).start()
+
+    async def run():
+        agent = SageAgent(recipes_dir="test-recipes", base_url=mock.base_url, cache_size=0, fast_path=False)
+        try:
+            reply = await asyncio.wait_for(collect(agent, "Something with lentils", deadline=0.5), 5)
+            assert reply.endswith("Error: No answer within 0.5s") and "word0" in reply
+            await asyncio.sleep(0.3)
+            assert mock.aborted == 1 and mock.in_flight == 0
+            assert agent.llm.backends[0].outstanding == 0
+
+            cancel = asyncio.Event()
+            asyncio.get_running_loop().call_later(0.3, cancel.set)
+            reply = await asyncio.wait_for(collect(agent, "Something with beans", cancel_event=cancel), 5)
+            assert "Error" not in reply
+            await asyncio.sleep(0.3)
+            assert mock.aborted == 2 and mock.in_flight == 0
+            print("✅ Deadline and cancellation released the backend")
+        finally:
+            await agent.cleanup()
+
+    try:
+        asyncio.run(run())
+    finally:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    test_query_classes_and_overrides()
+    test_max_tokens_per_query_class()
+    test_deadline_and_cancel_release_the_backend()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Test token-budgeted packing of the Tool Results block
+"""
+from context_packer import ContextPacker, estimate_tokens, sections_for_query
+from recipe_index import parse_recipe
+
+
+def make_recipe(i: int, steps: int = 3):
+    method = "\n".join(f"{n}. Stir pot {i} for {n} minutes" for n in range(1, steps + 1))
+    return parse_recipe(f"stew-{i}.md", f"# Stew {i}\n\n## Ingredients\n- {i} cups lentils\n- 1 onion\n\n"
+                                        f"## Method\n{method}\n\n## Notes\nFreezes well\n")
+
+
+def test_budget_holds_as_the_collection_grows():
+    """The block stays within budget however many recipes and files there are; lower-ranked recipes are dropped"""
+    packer = ContextPacker(budget=300)
+    names = [f"stew-{i}.md" for i in range(1000)]
+    recipes = [make_recipe(i) for i in range(50)]
+    block = packer.pack("tell me about stews", "recipes", names, recipes)
+    assert estimate_tokens(block) <= 300 + 10
+    assert "Recipe stew-0.md" in block and "Recipe stew-49.md" not in block
+    # The listing gets its share of the budget and summarizes the rest
+    listing = block.splitlines()[3]
+    assert estimate_tokens(listing) <= 60 + 10 and "more)" in listing
+    print("✅ Packed block stays within the token budget")
+
+
+def test_sections_follow_the_query():
+    """Only the sections a query needs are packed"""
+    assert sections_for_query("what can I make with lentils") == ("ingredients",)
+    assert sections_for_query("how do I cook the stew") == ("instructions",)
+    assert sections_for_query("surprise me") == ("ingredients", "instructions", "notes")
+    block = ContextPacker().pack("what can I make with lentils", "recipes", ["stew-1.md"], [make_recipe(1)])
+    assert "1 cups lentils" in block and "Stir pot" not in block and "Freezes" not in block
+    print("✅ Sections chosen from the query")
+
+
+def test_only_the_top_recipe_is_truncated():
+    """A top recipe larger than the budget is cut at a line boundary; nothing after it is packed"""
+    packer = ContextPacker(budget=120)
+    block = packer.pack("how do I cook it", "recipes", ["stew-1.md"], [make_recipe(1, steps=40), make_recipe(2)])
+    assert block.endswith("[truncated]") and "Recipe stew-2.md" not in block
+    assert estimate_tokens(block) <= 120 + 10
+    print("✅ Only the top-ranked recipe is truncated")
+
+
+if __name__ == "__main__":
+    test_budget_holds_as_the_collection_grows()
+    test_sections_follow_the_query()
+    test_only_the_top_recipe_is_truncated()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Test checkpointed vault ingestion: resume, incremental saves and the default checkpoint location
+"""
+import os
+import tempfile
+from ingest_vault import IngestCheckpoint, default_checkpoint_path, ingest_vault
+
+
+def make_vault(count: int = 3) -> str:
+    vault = tempfile.mkdtemp()
+    for i in range(count):
+        with open(os.path.join(vault, f"stew-{i}.md"), "w") as f:
+            f.write(f"# Stew {i}\n\n## Ingredients\n- {i} cups lentils\n")
+    return vault
+
+
+def log_lines(path: str) -> int:
+    with open(path) as f:
+        return sum(1 for _ in f)
+
+
+def test_resume_and_append_only_log():
+    """Re-runs skip unchanged files, and saves append only the changed entries"""
+    os.environ["XDG_CACHE_HOME"] = tempfile.mkdtemp()
+    vault = make_vault()
+    stats = ingest_vault(vault, workers=1)
+    assert stats["processed"] == 3
+    checkpoint_path = default_checkpoint_path(vault)
+    # The checkpoint lives in the per-user cache, not in the vault
+    assert checkpoint_path.startswith(os.environ["XDG_CACHE_HOME"]) and os.path.exists(checkpoint_path)
+    assert sorted(os.listdir(vault)) == ["stew-0.md", "stew-1.md", "stew-2.md"]
+    assert log_lines(checkpoint_path) == 4
+
+    assert ingest_vault(vault, workers=1)["skipped"] == 3
+    with open(os.path.join(vault, "stew-0.md"), "a") as f:
+        f.write("- 1 onion\n")
+    os.remove(os.path.join(vault, "stew-1.md"))
+    stats = ingest_vault(vault, workers=1)
+    assert stats["processed"] == 1 and stats["removed"] == 1 and stats["skipped"] == 1
+    # One appended line per change; the existing lines are not rewritten
+    assert log_lines(checkpoint_path) == 6
+
+    checkpoint = IngestCheckpoint(checkpoint_path)
+    assert sorted(checkpoint.files) == ["stew-0.md", "stew-2.md"]
+    assert checkpoint.files["stew-0.md"]["components"]["ingredients"] == ["0 cups lentils", "1 onion"]
+    print("✅ Resumed ingestion with an append-only checkpoint")
+
+
+def test_truncated_log_is_recovered():
+    """A line cut short by a crash is dropped and the log is rewritten on the next save"""
+    path = os.path.join(tempfile.mkdtemp(), "ingest.jsonl")
+    vault = make_vault(2)
+    ingest_vault(vault, checkpoint_path=path, workers=1)
+    with open(path, "a") as f:
+        f.write('{"path": "stew-9.md", "sta')
+
+    checkpoint = IngestCheckpoint(path)
+    assert sorted(checkpoint.files) == ["stew-0.md", "stew-1.md"]
+    assert ingest_vault(vault, checkpoint_path=path, workers=1)["skipped"] == 2
+    os.remove(os.path.join(vault, "stew-1.md"))
+    ingest_vault(vault, checkpoint_path=path, workers=1)
+    assert log_lines(path) == 2 and sorted(IngestCheckpoint(path).files) == ["stew-0.md"]
+    print("✅ Truncated checkpoint recovered")
+
+
+if __name__ == "__main__":
+    test_resume_and_append_only_log()
+    test_truncated_log_is_recovered()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Test the fast-path intent router: which phrasings it answers and which it hands to the LLM
+"""
+from intent_router import IntentRouter
+from recipe_index import RecipeIndex
+
+
+def make_router() -> IntentRouter:
+    index = RecipeIndex("test-recipes")
+    index.refresh()
+    return IntentRouter(index)
+
+
+def test_contains_queries():
+    """Quantifiers are dropped, items are normalized like pantry items, and negation goes to the LLM"""
+    router = make_router()
+    assert "Cashew Alfredo" in router.route("Which recipes contain both garlic and lemon?")
+    assert "Cashew Alfredo" in router.route("which recipes contain lemon juice")
+    assert "Cashew Alfredo" in router.route("find recipes with nooch")
+    assert router.route("which recipes contain garlic and lentils").startswith("None of the recipes")
+    assert router.route("which recipes have no nuts") is None
+    assert router.route("which recipes contain garlic but not lemon") is None
+    assert router.route("show me recipes with nut-free sauces") is None
+    print("✅ Contains queries normalized, negation handed to the LLM")
+
+
+def test_pantry_queries_need_a_plain_item_list():
+    """Plain ingredient lists are ranked directly; qualifiers and constraints go to the LLM"""
+    router = make_router()
+    answer = router.route("What can I make with cashews and nutritional yeast?")
+    assert answer.startswith("Best matches") and "Cashew Alfredo" in answer
+    assert router.route("I have garlic, lemon and cashews, what can I make?").startswith("Best matches")
+    for message in ("what can I make with cashews and nutritional yeast that is quick and high protein?",
+                    "what can I make with lentils in under 20 minutes",
+                    "what can I cook with rice for dinner tonight",
+                    "what can I make with more garlic than lemon",
+                    "what can I make with cashews, without garlic"):
+        assert router.route(message) is None, message
+    assert router.stats()["llm"] == 5
+    print("✅ Pantry fast path only takes fully parsed item lists")
+
+
+if __name__ == "__main__":
+    test_contains_queries()
+    test_pantry_queries_need_a_plain_item_list()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Test multi-backend routing, failover and hedging against mock servers on different ports
+"""
+import asyncio
+import socket
+import time
+from llm_router import LLMRouter
+from mock_openai_server import MockOpenAIServer
+
+MESSAGES = [{"role": "user", "content": "Suggest a quick lunch"}]
+
+
+def closed_port_url() -> str:
+    """URL of a port nothing listens on"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}/v1"
+
+
+async def stream_text(router) -> str:
+    stream = await router.create(model="local-model", messages=MESSAGES, stream=True)
+    return "".join([chunk.choices[0].delta.content or "" async for chunk in stream if chunk.choices])
+
+
+def test_least_outstanding_spreads_load():
+    """Concurrent requests split evenly across equal backends"""
+    servers = [MockOpenAIServer(latency=0.2, tokens_per_second=500).start() for _ in range(2)]
+
+    async def run():
+        router = LLMRouter([server.base_url for server in servers], probe_interval=0)
+        try:
+            replies = await asyncio.gather(*[stream_text(router) for _ in range(6)])
+            assert all("Cashew Alfredo" in reply for reply in replies)
+            assert [server.requests for server in servers] == [3, 3]
+            assert all(backend.outstanding == 0 for backend in router.backends)
+            print("✅ Load spread by outstanding requests")
+        finally:
+            await router.close()
+
+    try:
+        asyncio.run(run())
+    finally:
+        for server in servers:
+            server.stop()
+
+
+def test_failover_and_health_probe():
+    """A dead backend is skipped after its first failure and marked unhealthy by probes"""
+    server = MockOpenAIServer(latency=0.05, tokens_per_second=500).start()
+
+    async def run():
+        router = LLMRouter([closed_port_url(), server.base_url], probe_interval=0)
+        try:
+            for _ in range(3):
+                assert "Cashew Alfredo" in await stream_text(router)
+            response = await router.create(model="local-model", messages=MESSAGES)
+            assert "Cashew Alfredo" in response.choices[0].message.content
+            dead, live = router.backends
+            assert dead.requests == 1 and not dead.healthy and router.failovers == 1
+            await router.probe()
+            assert not dead.healthy and live.healthy
+            print("✅ Failover and health probing")
+        finally:
+            await router.close()
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.stop()
+
+
+def test_hedging_short_prompts():
+    """A slow first token on one backend is raced against another"""
+    slow = MockOpenAIServer(latency=2.0, tokens_per_second=500).start()
+    fast = MockOpenAIServer(latency=0.05, tokens_per_second=500).start()
+
+    async def run():
+        router = LLMRouter([slow.base_url, fast.base_url], probe_interval=0, hedge_after=0.1)
+        try:
+            router.backends[1].requests = 1  # make the slow backend the first pick
+            started = time.perf_counter()
+            assert "Cashew Alfredo" in await stream_text(router)
+            assert time.perf_counter() - started < 1.0
+            assert router.hedges == 1
+            assert all(backend.outstanding == 0 for backend in router.backends)
+            print("✅ Hedged request won on the fast backend")
+        finally:
+            await router.close()
+
+    try:
+        asyncio.run(run())
+    finally:
+        slow.stop()
+        fast.stop()
+
+
+if __name__ == "__main__":
+    test_least_outstanding_spreads_load()
+    test_failover_and_health_probe()
+    test_hedging_short_prompts()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Test the trace recorder's output formats: JSONL lines and Prometheus text
+"""
+import json
+import os
+import tempfile
+import time
+import urllib.request
+from metrics import NULL_TRACE, STAGE_BUCKETS, JsonlSink, MetricsRecorder, PrometheusSink, build_recorder
+
+
+def record_turn(recorder, **attributes):
+    """One chat turn with a timed span, a measured span and token attributes"""
+    trace = recorder.start_trace("tiny", query_class="lookup")
+    with trace.span("search", hits=2):
+        time.sleep(0.01)
+    start = time.perf_counter()
+    trace.add_span("decode", start, start + 0.2)
+    trace.set(prompt_tokens=120, completion_tokens=30)
+    trace.finish(**attributes)
+
+
+def test_jsonl_lines():
+    """Each finished turn is one JSON line with ids, timings, spans and attributes"""
+    path = os.path.join(tempfile.mkdtemp(), "trace.jsonl")
+    recorder = MetricsRecorder([JsonlSink(path)])
+    record_turn(recorder, cache_hit=False)
+    record_turn(recorder, cache_hit=True)
+    recorder.close()
+    with open(path) as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 2
+    first, second = (json.loads(line) for line in lines)
+    assert first["trace_id"] != second["trace_id"] and len(first["trace_id"]) == 16
+    assert first["agent"] == "tiny" and first["query_class"] == "lookup" and first["cache_hit"] is False
+    assert (first["prompt_tokens"], first["completion_tokens"]) == (120, 30)
+    assert abs(first["timestamp"] - time.time()) < 60 and first["total_seconds"] >= 0.01
+    search, decode = first["spans"]
+    assert search["stage"] == "search" and search["hits"] == 2 and search["seconds"] >= 0.01
+    assert decode["stage"] == "decode" and abs(decode["seconds"] - 0.2) < 1e-6 and decode["start"] >= search["start"]
+    print("✅ JSONL traces written one per line")
+
+
+def test_prometheus_text():
+    """Counters, gauges and cumulative histograms render in the text exposition format"""
+    sink = PrometheusSink()
+    recorder = MetricsRecorder([sink])
+    record_turn(recorder, cache_hit=False, first_token=0.3, tokens_per_second=42.0)
+    record_turn(recorder, cache_hit=True)
+    text = sink.render()
+    lines = text.splitlines()
+    assert text.endswith("\n")
+    assert 'sage_turns_total{agent="tiny"} 2' in lines
+    assert 'sage_tokens_total{agent="tiny",kind="prompt"} 240' in lines
+    assert 'sage_tokens_total{agent="tiny",kind="completion"} 60' in lines
+    assert 'sage_cache_lookups_total{agent="tiny",result="hit"} 1' in lines
+    assert 'sage_cache_lookups_total{agent="tiny",result="miss"} 1' in lines
+    assert "# TYPE sage_decode_tokens_per_second gauge" in lines
+    assert 'sage_decode_tokens_per_second{agent="tiny"} 42' in lines
+    assert "# TYPE sage_stage_seconds histogram" in lines
+    assert sum(line.startswith("# TYPE sage_stage_seconds ") for line in lines) == 1
+
+    # Buckets are cumulative: a 0.2s decode falls in le=0.25 and every bucket above it
+    prefix = 'sage_stage_seconds_bucket{agent="tiny",stage="decode",le='
+    buckets = {line[len(prefix):].split('"')[1]: int(line.rsplit(" ", 1)[1])
+               for line in lines if line.startswith(prefix)}
+    assert list(buckets) == [f"{bound:g}" for bound in STAGE_BUCKETS] + ["+Inf"]
+    assert buckets["0.1"] == 0 and buckets["0.25"] == 2 and buckets["+Inf"] == 2
+    assert 'sage_stage_seconds_count{agent="tiny",stage="decode"} 2' in lines
+    assert 'sage_first_token_seconds_count{agent="tiny"} 1' in lines
+    sum_line = next(line for line in lines if line.startswith('sage_stage_seconds_sum{agent="tiny",stage="decode"}'))
+    assert abs(float(sum_line.rsplit(" ", 1)[1]) - 0.4) < 1e-6
+    print("✅ Prometheus text rendered")
+
+
+def test_served_and_disabled():
+    """/metrics serves the rendered text; with no sinks the recorder is a no-op"""
+    sink = PrometheusSink()
+    port = sink.serve(0)
+    try:
+        MetricsRecorder([sink]).start_trace("direct").finish()
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert response.read().decode() == sink.render()
+    finally:
+        sink.close()
+    sink.close()
+
+    recorder = build_recorder()
+    assert not recorder.enabled and recorder.start_trace("tiny") is NULL_TRACE
+    recorder.close()
+    print("✅ Metrics served over HTTP; disabled recorder is a no-op")
+
+
+if __name__ == "__main__":
+    test_jsonl_lines()
+    test_prometheus_text()
+    test_served_and_disabled()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test recipe parsing and the index's incremental refresh
+"""
+import base64
+import os
+import tempfile
+from recipe_index import RecipeIndex, parse_recipe
+from recipe_sections import read_section
+
+NESTED_RECIPE = """# Lentil Bolognese
+
+## Ingredients
+- 1 cup lentils
+- 1 onion
+
+### For the sauce
+- 1 can tomatoes
+- 2 cloves garlic
+
+## Method
+1. Simmer the lentils
+
+### Serving
+2. Spoon over pasta
+
+## Nutrition
+### Per serving
+- 420 kcal
+
+## Notes
+Keeps for 3 days
+"""
+
+
+def write(path: str, text: str, mtime_ns: int = None):
+    with open(path, "w") as f:
+        f.write(text)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_nested_headings_stay_in_their_section():
+    """Deeper headings keep the section they are nested in; a heading at the same level ends it"""
+    recipe = parse_recipe("lentil-bolognese.md", NESTED_RECIPE)
+    assert recipe.ingredients == ("1 cup lentils", "1 onion", "1 can tomatoes", "2 cloves garlic")
+    assert recipe.instructions == ("Simmer the lentils", "Spoon over pasta")
+    assert recipe.notes == "Keeps for 3 days"
+
+    # Large (memory-mapped) files are parsed from their known sections only, with the same result
+    vault = tempfile.mkdtemp()
+    photo = base64.b64encode(os.urandom(100 * 1024)).decode()
+    big = NESTED_RECIPE.replace("## Notes", f"## Photo\n{photo}\n\n## Notes")
+    write(os.path.join(vault, "lentil-bolognese.md"), big)
+    index = RecipeIndex(vault)
+    index.refresh()
+    assert index.get("lentil-bolognese.md").to_dict() == parse_recipe("lentil-bolognese.md", big).to_dict()
+    section = index.read_section("lentil-bolognese.md", "ingredients")
+    assert section.startswith("## Ingredients") and section.endswith("- 2 cloves garlic")
+    assert read_section(os.path.join(vault, "lentil-bolognese.md"), "instructions").endswith("Spoon over pasta")
+    print("✅ Nested headings stay in their section")
+
+
+def test_refresh_reparses_only_changed_files():
+    """A file is re-parsed when its mtime or size changes, and dropped when deleted"""
+    vault = tempfile.mkdtemp()
+    stew = os.path.join(vault, "stew.md")
+    write(stew, "# Stew\n\n## Ingredients\n- lentils\n", mtime_ns=1_000_000_000)
+    write(os.path.join(vault, "salad.md"), "# Salad\n\n## Ingredients\n- lettuce\n")
+    write(os.path.join(vault, "notes.txt"), "not a recipe")
+    index = RecipeIndex(vault)
+    assert index.refresh() == 2 and index.names() == ["salad.md", "stew.md"]
+    version, corpus_hash = index.version, index.corpus_hash()
+    assert index.refresh() == 0 and index.version == version
+
+    # Same size, new mtime
+    write(stew, "# Stew\n\n## Ingredients\n- carrots\n", mtime_ns=2_000_000_000)
+    assert index.refresh() == 1 and index.get("stew.md").ingredients == ("carrots",)
+    assert index.version == version + 1 and index.corpus_hash() != corpus_hash
+
+    # Same mtime, new size
+    write(stew, "# Stew\n\n## Ingredients\n- red lentils\n", mtime_ns=2_000_000_000)
+    assert index.refresh() == 1 and index.get("stew.md").ingredients == ("red lentils",)
+
+    os.remove(stew)
+    assert index.refresh() == 1 and index.names() == ["salad.md"] and index.get("stew.md") is None
+    print("✅ Refresh re-parses changed files only")
+
+
+if __name__ == "__main__":
+    test_nested_headings_stay_in_their_section()
+    test_refresh_reparses_only_changed_files()
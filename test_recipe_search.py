@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test BM25 recipe retrieval: scores, field weights, ranking and rebuilds on index changes
+"""
+import math
+import os
+import tempfile
+from collections import Counter
+from recipe_index import RecipeIndex
+from recipe_search import FIELD_WEIGHTS, RecipeSearch, recipe_fields, tokenize
+
+RECIPES = {
+    "lemon-pasta.md": "# Lemon Pasta\n\n## Ingredients\n- pasta\n- 1 lemon\n- parmesan\n",
+    "tomato-soup.md": "# Tomato Soup\n\n## Ingredients\n- 6 tomatoes\n- basil\n\n## Notes\nA squeeze of lemon helps\n",
+    "chickpea-curry.md": "# Chickpea Curry\n\n## Ingredients\n- chickpeas\n- tomatoes\n- coconut milk\n",
+    "banana-bread.md": "# Banana Bread\n\n## Ingredients\n- 3 bananas\n- flour\n",
+}
+
+
+def make_index() -> RecipeIndex:
+    vault = tempfile.mkdtemp()
+    for name, text in RECIPES.items():
+        with open(os.path.join(vault, name), "w") as f:
+            f.write(text)
+    index = RecipeIndex(vault)
+    index.refresh()
+    return index
+
+
+def reference_scores(recipes: list, query: str, k1: float = 1.2, b: float = 0.75) -> dict:
+    """Plain-Python BM25 over the same field-weighted term frequencies"""
+    counts = {}
+    for recipe in recipes:
+        counts[recipe.name] = Counter()
+        for field, text in recipe_fields(recipe).items():
+            for token in tokenize(text):
+                counts[recipe.name][token] += FIELD_WEIGHTS[field]
+    avg_length = sum(sum(c.values()) for c in counts.values()) / len(counts)
+    scores = {}
+    for name, tf in counts.items():
+        length = sum(tf.values())
+        score = 0.0
+        for token in set(tokenize(query)):
+            if token not in tf:
+                continue
+            df = sum(1 for c in counts.values() if token in c)
+            idf = math.log1p((len(counts) - df + 0.5) / (df + 0.5))
+            score += idf * tf[token] * (k1 + 1) / (tf[token] + k1 * (1 - b + b * length / avg_length))
+        if score > 0:
+            scores[name] = score
+    return scores
+
+
+def test_scores_match_bm25():
+    """Vectorized scores equal a straightforward BM25, and title matches outrank notes matches"""
+    index = make_index()
+    search = RecipeSearch(index)
+    for query in ("lemon", "tomato soup", "chickpeas with tomatoes", "bananas"):
+        expected = reference_scores(index.recipes(), query)
+        results = search.top_k(query, k=10)
+        assert [name for name, _ in results] == sorted(expected, key=lambda name: (-expected[name], name))
+        for name, score in results:
+            assert math.isclose(score, expected[name], rel_tol=1e-4), (query, name)
+    assert search.top_k("lemon")[0][0] == "lemon-pasta.md"
+    assert search.top_k("what can you make") == [] and search.top_k("saffron") == []
+    assert len(search.top_k("tomatoes lemon", k=2)) == 2
+    print("✅ BM25 scores and field weights")
+
+
+def test_rebuilds_when_the_index_changes():
+    """Added and removed recipes are searchable (or gone) on the next query"""
+    index = make_index()
+    search = RecipeSearch(index)
+    assert search.top_k("lentils") == []
+    with open(os.path.join(index.recipes_dir, "lentil-stew.md"), "w") as f:
+        f.write("# Lentil Stew\n\n## Ingredients\n- lentils\n")
+    os.remove(os.path.join(index.recipes_dir, "banana-bread.md"))
+    index.refresh()
+    assert search.top_k("lentils")[0][0] == "lentil-stew.md"
+    assert search.top_k("bananas") == []
+    assert [recipe.name for recipe in search.search("lentil stew", 1)] == ["lentil-stew.md"]
+    print("✅ Search rebuilt after index changes")
+
+
+if __name__ == "__main__":
+    test_scores_match_bm25()
+    test_rebuilds_when_the_index_changes()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Test the section byte-offset index, memory-mapped section reads and section-level tool reads
+"""
+import asyncio
+import base64
+import mmap
+import os
+import tempfile
+from recipe_index import RecipeIndex, parse_recipe
+from recipe_sections import MMAP_MIN_BYTES, open_buffer, read_section, scan_sections
+from sage_agent import SageAgent as DirectAgent
+from sage_agent_tiny import SageAgent as TinyAgent
+
+PHOTO = base64.b64encode(os.urandom(300 * 1024)).decode()
+
+BIG_RECIPE = f"""---
+tags: [dinner, vegan]
+---
+# Smoky Lentil Stew
+
+Intro paragraph that is not part of any section.
+
+## Ingredients
+- 1 cup lentils
+- 2 carrots
+
+## Photo
+![stew](data:image/png;base64,{PHOTO})
+
+## Method
+1. Simmer the lentils
+2. Add the carrots
+
+## Notes
+Freezes well #batch-cooking
+"""
+
+
+def make_vault() -> str:
+    """A vault with one large recipe carrying an embedded photo and one small recipe"""
+    vault = tempfile.mkdtemp()
+    with open(os.path.join(vault, "smoky-lentil-stew.md"), "w") as f:
+        f.write(BIG_RECIPE)
+    with open(os.path.join("test-recipes", "sample-recipe.md")) as src, \
+            open(os.path.join(vault, "sample-recipe.md"), "w") as dst:
+        dst.write(src.read())
+    return vault
+
+
+def test_offsets_and_mapped_section_reads():
+    """Headings map to byte ranges and large files are read through a memory map"""
+    vault = make_vault()
+    path = os.path.join(vault, "smoky-lentil-stew.md")
+    assert os.path.getsize(path) > MMAP_MIN_BYTES
+    with open_buffer(path) as buf:
+        assert isinstance(buf, mmap.mmap)
+        sections = scan_sections(buf)
+        assert [s.heading for s in sections] == ["Smoky Lentil Stew", "Ingredients", "Photo", "Method", "Notes"]
+        ingredients = sections[1]
+        assert buf[ingredients.start:ingredients.body_start] == b"## Ingredients\n"
+        assert buf[ingredients.body_start:ingredients.end].strip() == b"- 1 cup lentils\n- 2 carrots"
+
+    assert read_section(path, "ingredients") == "## Ingredients\n- 1 cup lentils\n- 2 carrots"
+    assert read_section(path, "instructions").startswith("## Method\n1. Simmer")
+    assert read_section(path, "title") == "Smoky Lentil Stew"
+    assert read_section(path, "nutrition") is None
+    print("✅ Section offsets and memory-mapped section reads")
+
+
+def test_index_parses_only_needed_sections():
+    """The index parses the same Recipe as a full read and serves sections from its offsets"""
+    vault = make_vault()
+    index = RecipeIndex(vault)
+    index.refresh()
+    for name in index.names():
+        with open(os.path.join(vault, name)) as f:
+            assert index.get(name).to_dict() == parse_recipe(name, f.read()).to_dict()
+    assert index.get("smoky-lentil-stew.md").tags == ("dinner", "vegan", "batch-cooking")
+    assert index.sections("smoky-lentil-stew.md")[2] == "Photo"
+    assert PHOTO[:64] in index.read_section("smoky-lentil-stew.md", "photo")
+
+    # Offsets from before an edit are not reused
+    with open(os.path.join(vault, "smoky-lentil-stew.md"), "w") as f:
+        f.write("# Smoky Lentil Stew\n\n## Ingredients\n- 1 cup red lentils\n")
+    os.utime(os.path.join(vault, "smoky-lentil-stew.md"), ns=(1, 1))
+    assert index.read_section("smoky-lentil-stew.md", "ingredients") == "## Ingredients\n- 1 cup red lentils"
+    print("✅ Index parsed from needed sections only")
+
+
+def test_read_file_section_tools():
+    """Both agents' read_file tools return just the requested section"""
+    vault = make_vault()
+    direct = DirectAgent(recipes_dir=vault, cache_size=0)
+    content = direct.read_file("smoky-lentil-stew.md", section="ingredients")
+    assert "1 cup lentils" in content and PHOTO[:64] not in content
+    assert direct.read_file("smoky-lentil-stew.md", section="nutrition").startswith("No nutrition section")
+
+    async def run():
+        tiny = TinyAgent()
+        tiny.recipes_dir = vault
+        content = await tiny.execute_tool("read_file", {"path": "smoky-lentil-stew.md", "section": "method"})
+        assert "Simmer the lentils" in content and PHOTO[:64] not in content
+        content = await tiny.execute_tool("read_multiple_files", {"paths": ["smoky-lentil-stew.md", "sample-recipe.md"],
+                                                                  "section": "ingredients"})
+        assert "2 carrots" in content and PHOTO[:64] not in content
+        full = await tiny.execute_tool("read_file", {"path": "smoky-lentil-stew.md"})
+        assert PHOTO[:64] in full
+
+    asyncio.run(run())
+    print("✅ read_file tools return single sections")
+
+
+def test_section_reads_count_against_the_read_budget():
+    """Section bytes use up the read budget and later files are skipped, as with whole files"""
+    vault = tempfile.mkdtemp()
+    photo = base64.b64encode(os.urandom(30 * 1024)).decode()
+    paths = []
+    for i in range(5):
+        paths.append(f"stew-{i}.md")
+        with open(os.path.join(vault, paths[-1]), "w") as f:
+            f.write(f"# Stew {i}\n\n## Ingredients\n- lentils\n\n## Photo\n{photo}\n")
+
+    async def run():
+        tiny = TinyAgent(read_budget_bytes=100_000)
+        tiny.recipes_dir = vault
+        content = await tiny.execute_tool("read_multiple_files", {"paths": paths, "section": "photo"})
+        assert content.count("📖") == 2 and content.count("Skipped, read budget") == 3
+        assert len(content) < 100_000
+        content = await tiny.execute_tool("read_multiple_files", {"paths": paths, "section": "ingredients"})
+        assert content.count("📖") == 5
+
+    asyncio.run(run())
+    print("✅ Section reads stay within the read budget")
+
+
+if __name__ == "__main__":
+    test_offsets_and_mapped_section_reads()
+    test_index_parses_only_needed_sections()
+    test_read_file_section_tools()
+    test_section_reads_count_against_the_read_budget()
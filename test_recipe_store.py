@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test the disk-backed SQLite recipe store against the in-memory index
+"""
+import base64
+import os
+import tempfile
+from intent_router import IntentRouter
+from recipe_index import RecipeIndex
+from recipe_store import RecipeStore
+
+# Keep the test databases out of the real per-user cache
+os.environ["XDG_CACHE_HOME"] = tempfile.mkdtemp()
+
+RECIPES = {
+    "chickpea-curry.md": "# Chickpea Curry\n\n## Ingredients\n- 2 cans chickpeas\n- 1 onion\n- coconut milk\n\n"
+                         "## Instructions\n1. Simmer everything.\n\nTags: #vegan #dinner\n",
+    "tomato-soup.md": "# Tomato Soup\n\n## Ingredients\n- 6 tomatoes\n- 1 onion\n- basil\n\n"
+                      "## Instructions\n1. Roast the tomatoes.\n2. Blend.\n",
+    "banana-bread.md": "# Banana Bread\n\n## Ingredients\n- 3 bananas\n- flour\n- butter\n\n"
+                       "## Instructions\n1. Bake for an hour.\n",
+}
+
+
+def write_vault(recipes: dict) -> str:
+    vault = tempfile.mkdtemp()
+    for name, text in recipes.items():
+        with open(os.path.join(vault, name), "w") as f:
+            f.write(text)
+    return vault
+
+
+def test_store_matches_index_and_syncs_incrementally():
+    """Same recipes and corpus hash as RecipeIndex; only changed files are re-parsed"""
+    vault = write_vault(RECIPES)
+    index = RecipeIndex(vault)
+    index.refresh()
+    store = RecipeStore(vault)
+    assert store.refresh() == 3 and store.refresh() == 0
+    # The database and its WAL files stay out of the vault
+    assert sorted(os.listdir(vault)) == sorted(RECIPES)
+    assert store.names() == index.names()
+    assert store.corpus_hash() == index.corpus_hash()
+    for name in index.names():
+        assert store.get(name).to_dict() == index.get(name).to_dict()
+
+    with open(os.path.join(vault, "tomato-soup.md"), "a") as f:
+        f.write("\nNotes: great with grilled cheese\n")
+    os.unlink(os.path.join(vault, "banana-bread.md"))
+    version = store.version
+    assert store.apply_changes(["tomato-soup.md", "banana-bread.md"]) == 2
+    assert store.version == version + 1
+    assert store.names() == ["chickpea-curry.md", "tomato-soup.md"]
+    index.refresh()
+    assert store.corpus_hash() == index.corpus_hash()
+    store.close()
+
+    # Reopening skips parsing entirely: the database already matches the directory
+    reopened = RecipeStore(vault)
+    assert reopened.refresh() == 0 and len(reopened) == 2
+    assert reopened.read_text("tomato-soup.md").endswith("grilled cheese\n")
+    # Pages seek past the last name, so every recipe comes back once, in order
+    reopened.batch_size = 1
+    assert [recipe.name for recipe in reopened.recipes()] == reopened.names()
+    reopened.close()
+    print("✅ Store matches the index and syncs incrementally")
+
+
+def test_store_search_and_fast_path():
+    """Full-text ranking, title lookup and ingredient queries come from FTS5"""
+    store = RecipeStore(write_vault(RECIPES))
+    store.refresh()
+    assert store.top_k("tomato soup", 2)[0][0] == "tomato-soup.md"
+    assert [recipe.name for recipe in store.search("vegan chickpeas", 1)] == ["chickpea-curry.md"]
+    assert store.top_k("the and of") == []
+
+    router = IntentRouter(store)
+    assert store.find_recipe("banana bread").name == "banana-bread.md"
+    assert "Chickpea Curry" in router.route("which recipes contain onion")
+    assert "Tomato Soup" in router.route("which recipes contain onion")
+    assert "None of the recipes" in router.route("which recipes contain bananas and onion")
+    store.close()
+    print("✅ Store search and fast path work")
+
+
+class CountingStore(RecipeStore):
+    """Counts recipe loads so tests can check queries stay in SQL"""
+
+    gets = 0
+
+    def get(self, name: str):
+        self.gets += 1
+        return super().get(name)
+
+
+def test_store_pantry_queries_stay_in_sql():
+    """Pantry ranking matches the in-memory matcher without loading every recipe"""
+    recipes = dict(RECIPES)
+    for i in range(200):
+        recipes[f"filler-{i:03d}.md"] = f"# Filler {i}\n\n## Ingredients\n- {i} cups rice\n- salt\n"
+    vault = write_vault(recipes)
+    index = RecipeIndex(vault)
+    index.refresh()
+    store = CountingStore(vault)
+    store.refresh()
+    router = IntentRouter(store)
+    assert router.pantry is None
+
+    store.gets = 0
+    answer = router.route("what can i make with onions, chickpeas and coconut milk")
+    assert answer.splitlines()[1].startswith("- Chickpea Curry (chickpea-curry.md): 3/3 ingredients")
+    assert store.gets <= 5
+
+    pantry = ["onion", "tomatoes", "basil", "rice"]
+    expected = IntentRouter(index).pantry.best_matches(pantry, 5)
+    matches = store.pantry_matches(pantry, 5)
+    assert [(m["name"], m["have"], m["missing"]) for m in matches] == \
+        [(m["name"], m["have"], m["missing"]) for m in expected]
+    assert matches[1]["missing_ingredients"] == ["salt"]
+    store.close()
+    print("✅ Store pantry queries answered in SQL")
+
+
+def test_store_keeps_parsed_fields_only():
+    """Embedded images stay in the files; the database holds only parsed fields"""
+    photo = base64.b64encode(os.urandom(512 * 1024)).decode()
+    vault = write_vault({"stew.md": f"# Stew\n\n## Ingredients\n- lentils\n\n## Photo\n{photo}\n"})
+    store = RecipeStore(vault)
+    store.refresh()
+    store.close()
+    assert os.path.getsize(store.db_path) < 128 * 1024
+    reopened = RecipeStore(vault)
+    assert photo in reopened.read_text("stew.md")
+    reopened.close()
+    print("✅ Store keeps raw text out of the database")
+
+
+if __name__ == "__main__":
+    test_store_matches_index_and_syncs_incrementally()
+    test_store_search_and_fast_path()
+    test_store_pantry_queries_stay_in_sql()
+    test_store_keeps_parsed_fields_only()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test batched recipe tagging against mock OpenAI-compatible servers
+"""
+import asyncio
+import json
+import os
+import re
+import tempfile
+from llm_router import LLMRouter
+from mock_openai_server import MockOpenAIServer
+from recipe_index import parse_recipe
+from recipe_tagger import (DEFAULT_TAXONOMY, RecipeTagger, default_cache_path, parse_response, taxonomy_tags,
+                           validate_tags)
+
+RECIPE_LINE = re.compile(r"^\[(r\d+)\] (.+)$", re.MULTILINE)
+
+
+def tagging_responder(messages: list) -> str:
+    """Tag by title words, add one tag outside the taxonomy, and leave out any recipe titled 'Skipped'"""
+    prompt = messages[-1]["content"]
+    batch = RECIPE_LINE.findall(prompt)
+    items = []
+    for recipe_id, title in batch:
+        if title.startswith("Skipped") and len(batch) > 1:
+            continue
+        tags = ["#Vegan", "Dinner", "yummy"] if "Curry" in title else ["course:dessert", "baked"]
+        items.append({"id": recipe_id, "tags": tags})
+    return "```json\n" + json.dumps({"recipes": items}) + "\n```"
+
+
+def make_recipes(count: int) -> list:
+    recipes = [parse_recipe("skipped.md", "# Skipped Pie\n\n## Ingredients\n- apples\n")]
+    for i in range(count):
+        title = f"Curry {i}" if i % 2 else f"Cake {i}"
+        recipes.append(parse_recipe(f"recipe-{i}.md", f"# {title}\n\n## Ingredients\n- item {i}\n"))
+    return recipes
+
+
+def test_parse_and_validate():
+    """Replies are decoded around prose and tags outside the taxonomy are dropped"""
+    assert parse_response('Sure! {"recipes": [{"id": "r1", "tags": ["vegan"]}]} Done.') == {"r1": ["vegan"]}
+    assert parse_response('{"r2": ["quick"]}') == {"r2": ["quick"]}
+    assert parse_response("no json here") == {}
+    valid, rejected = validate_tags(["#Vegan", "Gluten Free", "diet:vegan", "yummy"], taxonomy_tags(DEFAULT_TAXONOMY))
+    assert valid == ["vegan", "gluten-free"] and rejected == ["yummy"]
+    print("✅ Replies parsed and tags validated")
+
+
+def test_batched_tagging_with_cache_across_backends():
+    """Batches are spread over backends, omissions are retried, and a second run is served from cache"""
+    servers = [MockOpenAIServer(latency=0.1, tokens_per_second=0, responder=tagging_responder).start()
+               for _ in range(2)]
+    # The default cache lives in the per-user cache dir, which may not exist yet
+    os.environ["XDG_CACHE_HOME"] = tempfile.mkdtemp()
+    cache_path = default_cache_path("test-recipes")
+    assert cache_path.startswith(os.environ["XDG_CACHE_HOME"]) and not os.path.exists(os.path.dirname(cache_path))
+
+    async def run():
+        llm = LLMRouter([server.base_url for server in servers], probe_interval=0)
+        try:
+            recipes = make_recipes(16)
+            tagger = RecipeTagger(llm, cache_path=cache_path, batch_size=4)
+            results = await tagger.tag_recipes(recipes)
+            assert results["recipe-1.md"] == ["vegan", "dinner"]
+            assert results["recipe-0.md"] == ["dessert", "baked"]
+            assert results["skipped.md"] == ["dessert", "baked"]
+            # 17 recipes in 5 batches, plus one retry for the recipe the batch reply left out
+            assert tagger.counts["requests"] == 6 and tagger.counts["tagged"] == 17
+            assert tagger.counts["rejected_tags"] == 8 and tagger.counts["failed"] == 0
+            assert all(server.requests > 0 for server in servers)
+
+            # Fresh tagger, same cache file: only the edited recipe goes to the model
+            recipes[4] = parse_recipe("recipe-3.md", "# Curry 3\n\n## Ingredients\n- chickpeas\n")
+            again = RecipeTagger(llm, cache_path=cache_path, batch_size=4)
+            assert await again.tag_recipes(recipes) == results
+            assert again.counts["cached"] == 16 and again.counts["requests"] == 1
+            print("✅ Batched tagging spread over backends and cached by content hash")
+        finally:
+            await llm.close()
+
+    try:
+        asyncio.run(run())
+    finally:
+        for server in servers:
+            server.stop()
+
+
+if __name__ == "__main__":
+    test_parse_and_validate()
+    test_batched_tagging_with_cache_across_backends()
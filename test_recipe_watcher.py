@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test that the background watcher keeps a RecipeIndex current from filesystem events
+"""
+import os
+import struct
+import tempfile
+import time
+from recipe_index import RecipeIndex
+from recipe_watcher import IN_CREATE, IN_Q_OVERFLOW, RecipeWatcher, parse_events
+
+
+def wait_for(condition, timeout: float = 3.0) -> bool:
+    """Poll until condition() holds or the timeout passes"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def write(path: str, text: str):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def check_watcher_applies_changes(watcher: RecipeWatcher):
+    """Added, edited, renamed and deleted recipes reach the index without anyone calling refresh"""
+    index = watcher.index
+    vault = index.recipes_dir
+    assert index.names() == ["stew.md"]
+    write(os.path.join(vault, "salad.md"), "# Salad\n\n## Ingredients\n- lettuce\n")
+    assert wait_for(lambda: index.get("salad.md") is not None)
+    write(os.path.join(vault, "stew.md"), "# Stew\n\n## Ingredients\n- red lentils\n- carrots\n")
+    assert wait_for(lambda: index.get("stew.md").ingredients == ("red lentils", "carrots"))
+    os.rename(os.path.join(vault, "salad.md"), os.path.join(vault, "green-salad.md"))
+    assert wait_for(lambda: index.names() == ["green-salad.md", "stew.md"])
+    os.remove(os.path.join(vault, "stew.md"))
+    assert wait_for(lambda: index.names() == ["green-salad.md"])
+
+
+def make_watcher(**options) -> RecipeWatcher:
+    vault = tempfile.mkdtemp()
+    write(os.path.join(vault, "stew.md"), "# Stew\n\n## Ingredients\n- lentils\n")
+    return RecipeWatcher(RecipeIndex(vault), **options).start()
+
+
+def test_parse_events():
+    """inotify records are split into (mask, name) pairs, padding stripped"""
+    buffer = b""
+    for mask, name in ((IN_CREATE, b"stew.md"), (IN_Q_OVERFLOW, b"")):
+        padded = name + b"\0" * (-len(name) % 16) if name else b""
+        buffer += struct.pack("iIII", 1, mask, 0, len(padded)) + padded
+    assert list(parse_events(buffer)) == [(IN_CREATE, "stew.md"), (IN_Q_OVERFLOW, "")]
+    print("✅ inotify events parsed")
+
+
+def test_inotify_watcher():
+    """With inotify, changes are applied per file; losing the directory falls back to polling"""
+    watcher = make_watcher(poll_interval=0.05)
+    try:
+        if watcher.backend != "inotify":
+            print("⚠️  inotify unavailable, skipped")
+            return
+        check_watcher_applies_changes(watcher)
+        assert watcher.events > 0
+        os.rename(watcher.index.recipes_dir, watcher.index.recipes_dir + "-moved")
+        assert wait_for(lambda: watcher.backend == "polling")
+        print("✅ inotify watcher kept the index current")
+    finally:
+        watcher.stop()
+
+
+def test_polling_watcher():
+    """Without inotify the index is refreshed in the background"""
+    watcher = make_watcher(poll_interval=0.05, use_inotify=False)
+    try:
+        assert watcher.backend == "polling"
+        check_watcher_applies_changes(watcher)
+        print("✅ Polling watcher kept the index current")
+    finally:
+        watcher.stop()
+
+
+if __name__ == "__main__":
+    test_parse_events()
+    test_inotify_watcher()
+    test_polling_watcher()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Test the answer cache: keys, hits, LRU eviction, TTL expiry, corpus invalidation and persistence
+"""
+import os
+import tempfile
+import time
+from response_cache import ResponseCache, make_key
+
+PROMPT = "You are Sage."
+
+
+def test_keys_hits_and_eviction():
+    """Trivially different phrasings share a key; the least recently used entry is evicted first"""
+    assert make_key("Pasta ideas?", "c1", PROMPT) == make_key("  pasta   IDEAS ", "c1", PROMPT)
+    assert make_key("pasta ideas", "c1", PROMPT) != make_key("pasta ideas", "c2", PROMPT)
+    assert make_key("pasta ideas", "c1", PROMPT) != make_key("pasta ideas", "c1", "You are Basil.")
+
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", "answer a", "c1")
+    cache.put("b", "answer b", "c1")
+    assert cache.get("a") == "answer a"
+    cache.put("c", "answer c", "c1")
+    assert cache.get("b") is None and cache.get("a") == "answer a" and cache.get("c") == "answer c"
+    assert (cache.hits, cache.misses) == (3, 1)
+    print("✅ Keys normalized, hits counted, LRU entry evicted")
+
+
+def test_expiry_and_invalidation():
+    """Entries expire after the TTL and are dropped when the corpus changes"""
+    cache = ResponseCache(ttl=0.1)
+    cache.put("old", "answer", "c1")
+    time.sleep(0.15)
+    assert cache.get("old") is None and len(cache) == 0
+
+    cache = ResponseCache()
+    cache.put("a", "answer a", "c1")
+    cache.put("b", "answer b", "c2")
+    assert cache.invalidate("c2") == 1
+    assert cache.get("a") is None and cache.get("b") == "answer b"
+    print("✅ Expired and stale-corpus entries dropped")
+
+
+def test_persistence():
+    """Entries survive a restart in LRU order; expired ones are not loaded"""
+    path = os.path.join(tempfile.mkdtemp(), "cache.json")
+    cache = ResponseCache(max_entries=2, path=path)
+    cache.put("a", "answer a", "c1")
+    cache.put("b", "answer b", "c1")
+    cache.get("a")
+    cache.put("c", "answer c", "c1")
+
+    reloaded = ResponseCache(max_entries=2, path=path)
+    assert reloaded.get("a") == "answer a" and reloaded.get("c") == "answer c" and reloaded.get("b") is None
+    assert ResponseCache(ttl=0, path=path).get("a") is None
+    print("✅ Cache persisted across restarts")
+
+
+if __name__ == "__main__":
+    test_keys_hits_and_eviction()
+    test_expiry_and_invalidation()
+    test_persistence()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test the warm daemon and thin client over a Unix socket
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+from mock_openai_server import MockOpenAIServer
+from sage_agent import SageAgent
+from sage_client import SageClient
+from sage_daemon import SageDaemon
+
+
+def test_client_round_trips_through_daemon():
+    """Streamed answers, commands and socket cleanup"""
+    mock = MockOpenAIServer(latency=0.05, tokens_per_second=500).start()
+    socket_path = os.path.join(tempfile.mkdtemp(), "sage.sock")
+
+    def use_client():
+        client = SageClient(socket_path)
+        try:
+            answer = "".join(client.chat("creamy pasta"))
+            assert "Cashew Alfredo" in answer and client.last_timing["daemon_total"] > 0
+            assert "sample-recipe.md" in "".join(client.chat("list recipes"))
+            assert client.command("stats")["requests"] == 2
+            assert client.command("ping") == {"ok": True}
+        finally:
+            client.close()
+
+    async def run():
+        agent = SageAgent(recipes_dir="test-recipes", base_url=mock.base_url, cache_size=0)
+        daemon = await SageDaemon(agent, socket_path, serialize=False).start()
+        await daemon.warm_up()
+        try:
+            await asyncio.to_thread(use_client)
+        finally:
+            await daemon.stop()
+        assert not os.path.exists(socket_path)
+        print("✅ Daemon answered the thin client")
+
+    try:
+        asyncio.run(run())
+    finally:
+        mock.stop()
+
+
+def test_hang_up_before_first_token_stops_generation():
+    """A client that disconnects during the prefill releases the backend before any token is written"""
+    mock = MockOpenAIServer(latency=1.5, tokens_per_second=500).start()
+    socket_path = os.path.join(tempfile.mkdtemp(), "sage.sock")
+
+    async def run():
+        agent = SageAgent(recipes_dir="test-recipes", base_url=mock.base_url, cache_size=0, fast_path=False)
+        daemon = await SageDaemon(agent, socket_path, serialize=False).start()
+        try:
+            reader, writer = await asyncio.open_unix_connection(socket_path)
+            writer.write(b'{"message": "something warming with lentils"}\n')
+            await writer.drain()
+            await asyncio.sleep(0.3)
+            assert mock.in_flight == 1
+            writer.close()
+            await asyncio.sleep(0.3)
+            # Still inside the mock's prefill, but the agent has already closed the backend request
+            assert agent.llm.backends[0].outstanding == 0
+            await asyncio.sleep(1.5)
+            assert mock.aborted == 1 and mock.in_flight == 0
+            print("✅ Hang-up during prefill stopped the generation")
+        finally:
+            await daemon.stop()
+
+    try:
+        asyncio.run(run())
+    finally:
+        mock.stop()
+
+
+def test_client_imports_stay_light():
+    """The client must not pull in the agent stack"""
+    code = "import sys, sage_client; heavy = {'openai', 'huggingface_hub', 'numpy', 'asyncio'} & set(sys.modules); print(sorted(heavy))"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "[]", output
+    print("✅ Client imports only the basics")
+
+
+if __name__ == "__main__":
+    test_client_round_trips_through_daemon()
+    test_hang_up_before_first_token_stops_generation()
+    test_client_imports_stay_light()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Test the HTTP server's streaming, admission control and drain against the mock LLM
+"""
+import asyncio
+import json
+import os
+import tempfile
+from metrics import build_recorder
+from mock_openai_server import MockOpenAIServer
+from sage_agent import SageAgent
+from sage_server import SageServer
+
+
+async def raw_request(port: int, data: bytes) -> bytes:
+    """Send raw bytes and return everything the server answers before closing"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response
+
+
+async def request(port: int, payload: dict, client: str = "cook") -> tuple:
+    """POST /chat and return (status, body text)"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode()
+    writer.write(f"POST /chat HTTP/1.1\r\nHost: sage\r\nX-Client-Id: {client}\r\nConnection: close\r\n"
+                 f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, text = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), text.decode()
+
+
+def run_with_server(check, latency=0.3, metrics=None, **options):
+    """Run an async check against a SageServer backed by the mock LLM"""
+    mock = MockOpenAIServer(latency=latency, tokens_per_second=200).start()
+
+    async def run():
+        agent = SageAgent(recipes_dir="test-recipes", base_url=mock.base_url, cache_size=0, fast_path=False,
+                          metrics=metrics)
+        server = await SageServer(agent, port=0, **options).start()
+        try:
+            await check(server)
+        finally:
+            if not server.draining:
+                await server.drain()
+
+    try:
+        asyncio.run(run())
+    finally:
+        mock.stop()
+
+
+def test_streaming_and_plain_responses():
+    """Streamed answers arrive as SSE events; plain answers as one JSON body"""
+    async def check(server):
+        status, text = await request(server.port, {"message": "pasta ideas", "stream": True})
+        assert status == 200
+        assert '"token"' in text and '"timing"' in text and "data: [DONE]" in text
+        status, text = await request(server.port, {"message": "pasta ideas"})
+        assert status == 200
+        body = json.loads(text)
+        assert "Cashew Alfredo" in body["response"] and body["timing"]["first_token"] > 0
+        status, _ = await request(server.port, {"nope": 1})
+        assert status == 400
+        print("✅ Streaming and plain responses")
+
+    run_with_server(check)
+
+
+def test_queue_full_and_per_client_limits_return_429():
+    """Requests beyond the queue or a client's share are rejected immediately"""
+    async def check(server):
+        # One request generating, one waiting in the queue, the rest turned away
+        first = asyncio.create_task(request(server.port, {"message": "q0"}, client="cook0"))
+        await asyncio.sleep(0.1)
+        statuses = await asyncio.gather(first, *[
+            request(server.port, {"message": f"q{i}"}, client=f"cook{i}") for i in range(1, 5)
+        ])
+        codes = sorted(status for status, _ in statuses)
+        assert codes.count(200) == 2 and codes.count(429) == 3, codes
+
+        statuses = await asyncio.gather(*[request(server.port, {"message": "same"}, client="greedy") for _ in range(2)])
+        assert sorted(status for status, _ in statuses) == [200, 429]
+        print("✅ 429 once the queue or a client's limit is full")
+
+    run_with_server(check, workers=1, queue_size=1, per_client=1)
+
+
+def test_drain_finishes_admitted_requests():
+    """Shutdown lets in-flight requests complete, refuses new connections and closes the metrics sinks"""
+    metrics_path = os.path.join(tempfile.mkdtemp(), "trace.jsonl")
+    metrics = build_recorder(metrics_path)
+
+    async def check(server):
+        in_flight = asyncio.create_task(request(server.port, {"message": "slow one"}))
+        await asyncio.sleep(0.1)
+        await server.drain()
+        status, _ = await in_flight
+        assert status == 200
+        try:
+            await request(server.port, {"message": "too late"})
+            assert False, "server still accepting"
+        except ConnectionError:
+            pass
+        assert all(sink._file.closed for sink in metrics.sinks)
+        with open(metrics_path) as f:
+            assert len(f.readlines()) == 1
+        print("✅ Drain completed in-flight work")
+
+    run_with_server(check, metrics=metrics)
+
+
+def test_timeouts_allow_slow_local_answers():
+    """Defaults allow 10-minute answers, and time spent queued does not count against the request timeout"""
+    server = SageServer(None, workers=4, queue_size=32)
+    assert server.request_timeout >= 600 and server.queue_timeout == 8 * server.expected_generation
+    # Shutdown waits as long as an admitted request may run, not a fixed 30 seconds
+    assert server.drain_timeout == server.request_timeout
+    assert SageServer(None, request_timeout=1200).drain_timeout == 900
+
+    async def check(server):
+        results = await asyncio.gather(request(server.port, {"message": "first"}, "a"),
+                                       request(server.port, {"message": "second"}, "b"))
+        assert [status for status, _ in results] == [200, 200]
+        print("✅ Queued requests get their full request timeout")
+
+    run_with_server(check, latency=0.6, workers=1, request_timeout=1.0)
+
+
+def test_hang_up_before_first_token_stops_generation():
+    """A client that disconnects during the prefill releases the backend before any token is written"""
+    mock = MockOpenAIServer(latency=1.5, tokens_per_second=500).start()
+
+    async def run():
+        agent = SageAgent(recipes_dir="test-recipes", base_url=mock.base_url, cache_size=0, fast_path=False)
+        server = await SageServer(agent, port=0).start()
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+            body = b'{"message": "something warming with lentils", "stream": true}'
+            writer.write(b"POST /chat HTTP/1.1\r\nHost: sage\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+            await writer.drain()
+            while not mock.in_flight:
+                await asyncio.sleep(0.05)
+            assert server.active == 1
+            writer.close()
+            await asyncio.sleep(0.3)
+            # Still inside the mock's prefill, but the request has already been cancelled
+            assert agent.llm.backends[0].outstanding == 0 and server.active == 0
+            await asyncio.sleep(1.5)
+            assert mock.aborted == 1 and mock.in_flight == 0
+            print("✅ Hang-up during prefill stopped the generation")
+        finally:
+            await server.drain()
+
+    try:
+        asyncio.run(run())
+    finally:
+        mock.stop()
+
+
+def test_malformed_and_slow_requests_are_refused():
+    """Bad or oversized bodies get 400/413, and a client that stops sending is disconnected"""
+    async def check(server):
+        response = await raw_request(server.port, b"POST /chat HTTP/1.1\r\nContent-Length: lots\r\n\r\n")
+        assert response.startswith(b"HTTP/1.1 400 ")
+        response = await raw_request(server.port, b"POST /chat HTTP/1.1\r\nContent-Length: 99999999\r\n\r\n")
+        assert response.startswith(b"HTTP/1.1 413 ")
+        started = asyncio.get_running_loop().time()
+        response = await raw_request(server.port, b"POST /chat HTTP/1.1\r\nContent-Length: 20\r\n\r\n{")
+        assert response == b"" and asyncio.get_running_loop().time() - started < 2
+        status, _ = await request(server.port, {"message": "still serving"})
+        assert status == 200
+        print("✅ Malformed and stalled requests are refused")
+
+    run_with_server(check, read_timeout=0.5)
+
+
+if __name__ == "__main__":
+    test_streaming_and_plain_responses()
+    test_queue_full_and_per_client_limits_return_429()
+    test_drain_finishes_admitted_requests()
+    test_timeouts_allow_slow_local_answers()
+    test_hang_up_before_first_token_stops_generation()
+    test_malformed_and_slow_requests_are_refused()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test single-flight coalescing of identical in-flight requests
+"""
+import asyncio
+import json
+import os
+import tempfile
+from metrics import build_recorder
+from mock_openai_server import MockOpenAIServer
+from sage_agent import SageAgent
+from single_flight import SingleFlight
+
+
+async def slow_tokens(started: list, count: int = 5, delay: float = 0.05):
+    started.append(1)
+    for i in range(count):
+        await asyncio.sleep(delay)
+        yield f"t{i} "
+
+
+async def collect(flights, key, factory):
+    return "".join([token async for token in flights.stream(key, factory)])
+
+
+def test_waiters_share_one_producer_and_survive_cancellation():
+    """Late joiners replay earlier tokens; one cancelled waiter does not stop the others"""
+    async def run():
+        flights = SingleFlight()
+        started = []
+        first = asyncio.create_task(collect(flights, "k", lambda: slow_tokens(started)))
+        await asyncio.sleep(0.12)
+        second = asyncio.create_task(collect(flights, "k", lambda: slow_tokens(started)))
+        third = asyncio.create_task(collect(flights, "k", lambda: slow_tokens(started)))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        results = await asyncio.gather(second, third)
+        assert results == ["t0 t1 t2 t3 t4 "] * 2
+        assert len(started) == 1 and len(flights) == 0
+        print("✅ One producer shared, cancellation isolated")
+
+    asyncio.run(run())
+
+
+def test_producer_cancelled_when_every_waiter_leaves():
+    """Nobody listening means the generation is abandoned and the key is free again"""
+    async def run():
+        flights = SingleFlight()
+        started = []
+        waiter = asyncio.create_task(collect(flights, "k", lambda: slow_tokens(started, 100)))
+        await asyncio.sleep(0.1)
+        waiter.cancel()
+        await asyncio.sleep(0.01)
+        assert len(flights) == 0
+        assert await collect(flights, "k", lambda: slow_tokens(started, 2)) == "t0 t1 "
+        assert len(started) == 2
+        print("✅ Abandoned producer cancelled")
+
+    asyncio.run(run())
+
+
+def test_agent_coalesces_identical_chats():
+    """Identical concurrent questions reach the LLM once; different ones do not coalesce"""
+    mock = MockOpenAIServer(latency=0.3, tokens_per_second=100).start()
+
+    metrics_path = os.path.join(tempfile.mkdtemp(), "metrics.jsonl")
+
+    async def run():
+        agent = SageAgent(recipes_dir="test-recipes", base_url=mock.base_url, cache_size=0, fast_path=False,
+                          metrics=build_recorder(metrics_path))
+        try:
+            timings = [{} for _ in range(4)]
+            replies = await asyncio.gather(*[agent.chat("creamy pasta please", timing=t) for t in timings])
+            assert len(set(replies)) == 1 and "Cashew Alfredo" in replies[0]
+            assert mock.requests == 1
+            # One call generated; the others are marked coalesced and still get the generation's spans
+            assert sorted(t["coalesced"] for t in timings) == [False, True, True, True]
+            with open(metrics_path) as f:
+                traces = [json.loads(line) for line in f]
+            assert sorted(trace["coalesced"] for trace in traces) == [False, True, True, True]
+            for trace in traces:
+                assert {"queue", "prefill", "decode"} <= {span["stage"] for span in trace["spans"]}
+                assert trace["completion_tokens"] == traces[0]["completion_tokens"]
+            await asyncio.gather(agent.chat("creamy pasta please"), agent.chat("something with lemon"))
+            assert mock.requests == 3
+            print("✅ Four identical chats, one completion")
+        finally:
+            await agent.cleanup()
+
+    try:
+        asyncio.run(run())
+    finally:
+        mock.stop()
+
+
+def test_concurrent_chats_get_their_own_timing():
+    """Each call's timing describes that call, however the calls overlap"""
+    mock = MockOpenAIServer(latency=0.3, tokens_per_second=100).start()
+
+    async def run():
+        agent = SageAgent(recipes_dir="test-recipes", base_url=mock.base_url, cache_size=0)
+        try:
+            slow, routed = {}, {}
+            await asyncio.gather(agent.chat("creamy pasta please", timing=slow),
+                                 agent.chat("list recipes", timing=routed))
+            assert slow["routed"] is False and slow["first_token"] >= 0.3
+            assert routed["routed"] is True and routed["total"] < slow["total"]
+            print("✅ Overlapping chats keep separate timings")
+        finally:
+            await agent.cleanup()
+
+    try:
+        asyncio.run(run())
+    finally:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    test_waiters_share_one_producer_and_survive_cancellation()
+    test_producer_cancelled_when_every_waiter_leaves()
+    test_agent_coalesces_identical_chats()
+    test_concurrent_chats_get_their_own_timing()
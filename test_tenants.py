@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Test per-tenant recipe roots: path isolation, shared parsed recipes and concurrency quotas
+"""
+import asyncio
+import gc
+import json
+import os
+import tempfile
+from llm_router import LLMRouter
+from mock_openai_server import MockOpenAIServer
+from sage_server import SageServer
+from recipe_paths import resolve_in_root
+from tenants import TenantRegistry
+
+SHARED = "# Cashew Alfredo\n\n## Ingredients\n- cashews\n- garlic\n- pasta\n"
+
+
+def make_tenants_root() -> str:
+    """Two tenant vaults holding one identical recipe and one of their own"""
+    root = tempfile.mkdtemp()
+    for tenant, own in (("alice", "# Lentil Soup\n\n## Ingredients\n- lentils\n"),
+                        ("bob", "# Bean Chili\n\n## Ingredients\n- beans\n")):
+        os.makedirs(os.path.join(root, tenant))
+        with open(os.path.join(root, tenant, "cashew-alfredo.md"), "w") as f:
+            f.write(SHARED)
+        with open(os.path.join(root, tenant, "own.md"), "w") as f:
+            f.write(own)
+    return root
+
+
+def test_paths_stay_inside_the_tenant_root():
+    """Relative, absolute and symlinked paths cannot leave the root"""
+    root = make_tenants_root()
+    alice = os.path.join(root, "alice")
+    os.symlink(os.path.join(root, "bob", "own.md"), os.path.join(alice, "escape.md"))
+    assert resolve_in_root(alice, "own.md") == os.path.realpath(os.path.join(alice, "own.md"))
+    assert resolve_in_root(alice, os.path.join(alice, "own.md")) is not None
+    assert resolve_in_root(alice, "../bob/own.md") is None
+    assert resolve_in_root(alice, os.path.join(root, "bob", "own.md")) is None
+    assert resolve_in_root(alice, "escape.md") is None
+
+    registry = TenantRegistry(tenants_root=root)
+    assert "alice" in registry and "carol" not in registry and ".." not in registry
+    agent = registry.agent("alice")
+    assert "Lentil" in agent.read_file("own.md")
+    assert agent.read_file("../bob/own.md").startswith("Error:")
+    assert agent.list_directory("/etc").startswith("Error:")
+    print("✅ Paths confined to the tenant root")
+
+
+def test_identical_recipes_are_parsed_once():
+    """Identical content is parsed and held once, whatever each vault names the file"""
+    root = make_tenants_root()
+    os.rename(os.path.join(root, "bob", "cashew-alfredo.md"), os.path.join(root, "bob", "alfredo.md"))
+    for tenant in ("alice", "bob"):
+        with open(os.path.join(root, tenant, f"{tenant}-untitled.md"), "w") as f:
+            f.write("## Ingredients\n- rice\n")
+    registry = TenantRegistry(tenants_root=root)
+    alice, bob = registry.agent("alice"), registry.agent("bob")
+    alice.index.refresh()
+    bob.index.refresh()
+    shared, renamed = alice.index.get("cashew-alfredo.md"), bob.index.get("alfredo.md")
+    assert shared.content is renamed.content and shared.ingredients is renamed.ingredients
+    assert (shared.name, renamed.name) == ("cashew-alfredo.md", "alfredo.md")
+    assert alice.index.get("own.md").title == "Lentil Soup" and bob.index.get("own.md").title == "Bean Chili"
+    # Titles that fall back to the file name stay per file
+    assert alice.index.get("alice-untitled.md").title == "Alice Untitled"
+    assert bob.index.get("bob-untitled.md").title == "Bob Untitled"
+    assert registry.pool.stats() == {"recipes": 4, "parsed": 4, "shared": 2}
+
+    os.unlink(os.path.join(root, "alice", "own.md"))
+    alice.index.refresh()
+    gc.collect()
+    assert len(registry.pool) == 3
+    print("✅ Identical recipes parsed and held once")
+
+
+def test_tenant_concurrency_quota():
+    """A tenant's generations are capped by its quota while other tenants keep their own share"""
+    mock = MockOpenAIServer(latency=0.3, tokens_per_second=200).start()
+    root = make_tenants_root()
+
+    async def run():
+        registry = TenantRegistry(tenants_root=root, llm=LLMRouter([mock.base_url], probe_interval=0),
+                                  quota={"cache_size": 0, "max_concurrency": 1})
+        try:
+            alice, bob = registry.agent("alice"), registry.agent("bob")
+            alice.router = bob.router = None
+            await asyncio.gather(alice.chat("creamy pasta"), alice.chat("something with lentils"),
+                                 bob.chat("spicy beans"))
+            assert mock.requests == 3 and mock.peak_in_flight == 2
+            print("✅ Per-tenant concurrency quota enforced")
+        finally:
+            await registry.cleanup()
+
+    try:
+        asyncio.run(run())
+    finally:
+        mock.stop()
+
+
+def test_server_routes_requests_by_tenant():
+    """The X-Sage-Tenant header picks the tenant; unknown tenants get a 404"""
+    mock = MockOpenAIServer(latency=0.05, tokens_per_second=500).start()
+    root = make_tenants_root()
+
+    async def request(port, tenant):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        body = json.dumps({"message": "which recipes contain lentils"}).encode()
+        writer.write(f"POST /chat HTTP/1.1\r\nHost: sage\r\nX-Sage-Tenant: {tenant}\r\nConnection: close\r\n"
+                     f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        head, _, text = response.partition(b"\r\n\r\n")
+        return int(head.split()[1]), text.decode()
+
+    async def run():
+        registry = TenantRegistry(tenants_root=root, llm=LLMRouter([mock.base_url], probe_interval=0))
+        server = await SageServer(port=0, tenants=registry).start()
+        try:
+            status, text = await request(server.port, "alice")
+            assert status == 200 and "Lentil Soup" in json.loads(text)["response"]
+            status, text = await request(server.port, "bob")
+            assert status == 200 and "None of the recipes" in json.loads(text)["response"]
+            status, _ = await request(server.port, "mallory")
+            assert status == 404
+            assert set(server.stats()["tenants"]) == {"alice", "bob"}
+            print("✅ Server routed requests by tenant")
+        finally:
+            await server.drain()
+
+    try:
+        asyncio.run(run())
+    finally:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    test_paths_stay_inside_the_tenant_root()
+    test_identical_recipes_are_parsed_once()
+    test_tenant_concurrency_quota()
+    test_server_routes_requests_by_tenant()
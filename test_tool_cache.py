@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test the stat-validated file tool result cache
+"""
+import os
+import tempfile
+from tool_cache import ENTRY_OVERHEAD, ToolResultCache
+
+
+def read(path: str, calls: list):
+    """A read_file stand-in that counts how often it really runs"""
+    def compute():
+        calls.append(path)
+        try:
+            with open(path) as f:
+                return f.read()
+        except OSError:
+            return None
+    return compute
+
+
+def test_memoized_until_the_file_changes():
+    """Repeated reads are served from memory; editing, replacing or deleting the file invalidates them"""
+    path = os.path.join(tempfile.mkdtemp(), "stew.md")
+    with open(path, "w") as f:
+        f.write("lentils")
+    cache = ToolResultCache()
+    calls = []
+    key = ("read_file", path)
+    assert cache.get_or_compute(key, path, read(path, calls)) == "lentils"
+    assert cache.get_or_compute(key, path, read(path, calls)) == "lentils"
+    assert len(calls) == 1 and cache.stats()["hits"] == 1
+
+    with open(path, "w") as f:
+        f.write("red lentils")
+    assert cache.get_or_compute(key, path, read(path, calls)) == "red lentils" and len(calls) == 2
+
+    # Same size and mtime, different file (an atomic replace)
+    replacement = path + ".tmp"
+    with open(replacement, "w") as f:
+        f.write("big lentils")
+    stat = os.stat(path)
+    os.utime(replacement, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.replace(replacement, path)
+    assert cache.get_or_compute(key, path, read(path, calls)) == "big lentils" and len(calls) == 3
+
+    os.remove(path)
+    assert cache.get_or_compute(key, path, read(path, calls)) is None and len(calls) == 4
+    assert cache.get_or_compute(key, path, read(path, calls)) is None and len(calls) == 4
+    print("✅ Results memoized until the file changes")
+
+
+def test_memory_cap_evicts_least_recently_used():
+    """The cache stays under its byte cap by evicting the least recently used results"""
+    folder = tempfile.mkdtemp()
+    paths = []
+    for i in range(3):
+        paths.append(os.path.join(folder, f"stew-{i}.md"))
+        with open(paths[-1], "w") as f:
+            f.write(str(i) * 100)
+    cache = ToolResultCache(max_bytes=2 * (100 + ENTRY_OVERHEAD))
+    calls = []
+    for path in paths[:2]:
+        cache.get_or_compute(("read_file", path), path, read(path, calls))
+    # Touch the first result so the second is the least recently used
+    cache.get_or_compute(("read_file", paths[0]), paths[0], read(paths[0], calls))
+    cache.get_or_compute(("read_file", paths[2]), paths[2], read(paths[2], calls))
+    assert cache.size <= cache.max_bytes and cache.stats()["evictions"] == 1
+    cache.get_or_compute(("read_file", paths[0]), paths[0], read(paths[0], calls))
+    assert len(calls) == 3
+    cache.get_or_compute(("read_file", paths[1]), paths[1], read(paths[1], calls))
+    assert len(calls) == 4
+    print("✅ Memory cap evicts least recently used results")
+
+
+if __name__ == "__main__":
+    test_memoized_until_the_file_changes()
+    test_memory_cap_evicts_least_recently_used()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test the tiny agent's multi-step tool loop against a scripted model
+"""
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+from sage_agent_tiny import SageAgent, parse_tool_calls
+
+
+class ScriptedAgent:
+    """Stands in for the tiny-agents Agent, replying with one scripted turn per run"""
+
+    def __init__(self, turns, delay=0.0):
+        self.turns = list(turns)
+        self.delay = delay
+        self.prompts = []
+
+    async def load_tools(self):
+        pass
+
+    async def run(self, message, abort_event=None):
+        self.prompts.append(message)
+        reply = self.turns.pop(0) if self.turns else "Done."
+        for i in range(0, len(reply), 8):
+            if abort_event and abort_event.is_set():
+                return
+            await asyncio.sleep(self.delay)
+            delta = SimpleNamespace(content=reply[i:i + 8])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+def make_agent(turns, **kwargs):
+    """SageAgent wired to a scripted model over test-recipes"""
+    agent = SageAgent(**kwargs)
+    agent.recipes_dir = "test-recipes"
+    agent.agent = ScriptedAgent(turns)
+    agent.tools_loaded = True
+    return agent
+
+
+def test_parse_tool_calls():
+    """Single calls, arrays, fenced blocks and OpenAI-style calls are all recognised"""
+    text = '```json\n[{"name": "read_file", "parameters": {"path": "a.md"}}, {"name": "list_directory", "parameters": {"path": "."}}]\n```'
+    assert parse_tool_calls(text) == [("read_file", {"path": "a.md"}), ("list_directory", {"path": "."})]
+    text = '{"type": "function", "function": {"name": "read_file", "arguments": "{\\"path\\": \\"b.md\\"}"}}'
+    assert parse_tool_calls(text) == [("read_file", {"path": "b.md"})]
+    text = '{"name": "read_file", "parameters": {"path": "a.md"}}\n{"name": "read_file", "parameters": {"path": "c.md"}}'
+    assert len(parse_tool_calls(text)) == 2
+    assert parse_tool_calls("The Cashew Alfredo needs cashews.") == []
+    print("✅ Tool calls parsed")
+
+
+def test_batched_calls_run_concurrently_and_return_in_one_message():
+    """All calls from one turn run together and their results go back in a single follow-up"""
+    calls = [{"name": "read_file", "parameters": {"path": "test-recipes/sample-recipe.md"}},
+             {"name": "list_directory", "parameters": {"path": "test-recipes"}}]
+    agent = make_agent([json.dumps(calls), "I recommend Cashew Alfredo."])
+
+    running = 0
+    peak = 0
+    execute_tool = agent.execute_tool
+
+    async def slow_tool(name, parameters):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.2)
+        running -= 1
+        return await execute_tool(name, parameters)
+
+    agent.execute_tool = slow_tool
+    timing = {}
+    reply = asyncio.run(agent.chat("Tell me about my recipes", timing=timing))
+
+    assert reply == "I recommend Cashew Alfredo."
+    assert peak == 2
+    assert timing["steps"] == 2
+    follow_up = agent.agent.prompts[1]
+    assert "Cashew Alfredo" in follow_up and "sample-recipe.md" in follow_up
+    print("✅ Independent calls ran together in one round-trip")
+
+
+def test_step_limit_and_deadline():
+    """The loop stops after max_steps and gives up at the deadline"""
+    call = json.dumps({"name": "list_directory", "parameters": {"path": "test-recipes"}})
+    agent = make_agent([call] * 10, max_steps=3)
+    timing = {}
+    reply = asyncio.run(agent.chat("List recipes forever", timing=timing))
+    assert timing["steps"] == 3
+    assert "Do not call any more tools" in agent.agent.prompts[-1]
+    assert "sample-recipe.md" in reply
+
+    agent = make_agent(["x" * 400], deadline=0.2)
+    agent.agent.delay = 0.05
+    started = time.perf_counter()
+    asyncio.run(agent.chat("Slow answer"))
+    assert time.perf_counter() - started < 1.0
+    print("✅ Step limit and deadline enforced")
+
+
+def test_max_tokens_budget_closes_the_stream():
+    """The query class's max_tokens cuts the answer off and closes the model's stream"""
+    agent = make_agent(["abcdefgh" * 50], budgets={"chat": {"max_tokens": 3}})
+    timing = {}
+    reply = asyncio.run(agent.chat("Something warming with lentils tonight", timing=timing))
+    assert reply == "abcdefgh" * 3
+    assert timing["stopped"] == "max_tokens" and timing["query_class"] == "chat"
+    print("✅ max_tokens budget enforced")
+
+
+if __name__ == "__main__":
+    test_parse_tool_calls()
+    test_batched_calls_run_concurrently_and_return_in_one_message()
+    test_step_limit_and_deadline()
+    test_max_tokens_budget_closes_the_stream()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Sage Tool Cache - Memoizes file tool results keyed by path and stat signature
+"""
+import os
+import threading
+from collections import OrderedDict
+
+# Approximate bookkeeping cost per entry, so cached "not found" results still count against the cap
+ENTRY_OVERHEAD = 64
+
+
+def stat_signature(path: str):
+    """Return a signature that changes whenever the file or directory changes (None if missing)"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns)
+
+
+class ToolResultCache:
+    """Thread-safe LRU cache of tool results with a memory cap, validated against the current stat signature"""
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_compute(self, key: tuple, path: str, compute):
+        """Return the cached result for key if path is unchanged, else compute and store it"""
+        signature = stat_signature(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        result = compute()
+        # Re-stat so a file that changed while it was being read is not cached under the old signature
+        unchanged = stat_signature(path) == signature
+        with self._lock:
+            if unchanged:
+                self._store(key, signature, result)
+            else:
+                self._discard(key)
+        return result
+
+    def _store(self, key: tuple, signature, result: str):
+        """Insert an entry and evict least recently used entries over the memory cap"""
+        self._discard(key)
+        size = ENTRY_OVERHEAD + (len(result) if result is not None else 0)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (signature, result, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+            self.evictions += 1
+
+    def _discard(self, key: tuple):
+        """Remove an entry if present"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and memory use"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+            "bytes": self.size,
+        }